@@ -3,7 +3,7 @@ Script for exporting courseware from Mongo to a tar.gz file
 """
 import os
 
-from django.core.management.base import BaseCommand, CommandError
+from django.core.management.base import BaseCommand, CommandError, make_option
 from xmodule.modulestore.xml_exporter import export_to_xml
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore
@@ -16,6 +16,13 @@ class Command(BaseCommand):
     """
     help = 'Export the specified data directory into the default ModuleStore'
 
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+                    type='int',
+                    default=1,
+                    help='How many static assets to copy concurrently'),
+    )
+
     def handle(self, *args, **options):
         "Execute the command"
         if len(args) != 2:
@@ -31,4 +38,7 @@ class Command(BaseCommand):
         root_dir = os.path.dirname(output_path)
         course_dir = os.path.splitext(os.path.basename(output_path))[0]
 
-        export_to_xml(modulestore('direct'), contentstore(), location, root_dir, course_dir, modulestore())
+        export_to_xml(
+            modulestore('direct'), contentstore(), location, root_dir, course_dir, modulestore(),
+            workers=options.get('workers', 1)
+        )
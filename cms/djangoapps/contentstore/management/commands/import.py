@@ -5,10 +5,17 @@ Script for importing courseware from XML format
 from django.core.management.base import BaseCommand, CommandError, make_option
 from django_comment_common.utils import (seed_permissions_roles,
                                          are_permissions_roles_seeded)
-from xmodule.modulestore.xml_importer import import_from_xml
+from xmodule.modulestore.xml_importer import import_from_xml, ImportTimings
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore
 
+# This command is shared with the LMS, which can also cache the imported problems' max scores
+try:
+    from courseware.grades import fill_max_scores
+    HAS_COURSEWARE = True
+except ImportError:
+    HAS_COURSEWARE = False
+
 
 class Command(BaseCommand):
     """
@@ -20,6 +27,13 @@ class Command(BaseCommand):
         make_option('--nostatic',
                     action='store_true',
                     help='Skip import of static content'),
+        make_option('--incremental',
+                    action='store_true',
+                    help="Don't re-save static content which hasn't changed, and insert new modules in batches"),
+        make_option('--workers',
+                    type='int',
+                    default=1,
+                    help='How many static files to save concurrently'),
     )
 
     def handle(self, *args, **options):
@@ -44,14 +58,21 @@ class Command(BaseCommand):
                               'default\n')
             mstore = modulestore('default')
 
+        timings = ImportTimings()
         _, course_items = import_from_xml(
             mstore, data_dir, course_dirs, load_error_modules=False,
             static_content_store=contentstore(), verbose=True,
-            do_import_static=do_import_static
+            do_import_static=do_import_static,
+            incremental=options.get('incremental', False),
+            workers=options.get('workers', 1),
+            timings=timings
         )
+        self.stdout.write(u'Import timings: {0}\n'.format(unicode(timings)))
 
         for module in course_items:
             course_id = module.location.course_id
             if not are_permissions_roles_seeded(course_id):
                 self.stdout.write('Seeding forum roles for course {0}'.format(course_id))
                 seed_permissions_roles(course_id)
+            if HAS_COURSEWARE:
+                self.stdout.write('Filled {0} max scores for course {1}\n'.format(fill_max_scores(course_id), course_id))
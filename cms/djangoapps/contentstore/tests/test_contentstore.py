@@ -3,7 +3,9 @@
 
 import json
 import mock
+import os
 import shutil
+import tarfile
 
 from textwrap import dedent
 
@@ -31,7 +33,7 @@ from xmodule.modulestore.store_utilities import clone_course
 from xmodule.modulestore.store_utilities import delete_course
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore, _CONTENTSTORE
-from xmodule.modulestore.xml_exporter import export_to_xml
+from xmodule.modulestore.xml_exporter import export_to_xml, export_to_tarball
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
 from xmodule.modulestore.inheritance import own_metadata
 from xmodule.contentstore.content import StaticContent
@@ -1334,6 +1336,41 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         self.assertFalse(Location(['i4x', 'edX', 'toy', 'vertical', 'vertical_test', None])
                          in course.system.module_data)
 
+    def test_export_course_to_tarball(self):
+        """
+        A tarball export has the same files as an export to disk, and imports the same
+        """
+        module_store = modulestore('direct')
+        content_store = contentstore()
+
+        import_from_xml(module_store, 'common/test/data/', ['toy'], static_content_store=content_store)
+        location = CourseDescriptor.id_to_location('edX/toy/2012_Fall')
+
+        root_dir = path(mkdtemp_clean())
+        self.addCleanup(shutil.rmtree, root_dir)
+        export_to_xml(module_store, content_store, location, root_dir, 'test_export', workers=4)
+        exported_files = set(
+            (dirpath / filename).relpath(root_dir) for dirpath, __, filenames in os.walk(root_dir)
+            for filename in filenames
+        )
+
+        tarball_path = root_dir / 'test_export.tar.gz'
+        with open(tarball_path, 'wb') as tarball:
+            export_to_tarball(module_store, content_store, location, tarball, 'test_export', workers=4)
+        with tarfile.open(tarball_path) as tar_file:
+            self.assertEqual(set(tar_file.getnames()), exported_files)
+            tar_file.extractall(root_dir / 'from_tarball')
+
+        delete_course(module_store, content_store, location, commit=True)
+        import_from_xml(
+            module_store, root_dir / 'from_tarball', ['test_export'],
+            static_content_store=content_store, target_location_namespace=location
+        )
+        self.assertIsNotNone(module_store.get_item(location))
+        self.assertIsNotNone(content_store.find(
+            StaticContent.compute_location('edX', 'toy', 'sample_static.txt'), throw_on_not_found=False
+        ))
+
     def test_export_course_without_content_store(self):
         module_store = modulestore('direct')
         content_store = contentstore()
@@ -8,7 +8,10 @@ from django.test.client import Client
 from django.test.utils import override_settings
 from django.conf import settings
 from path import path
+from mock import patch
 import copy
+import shutil
+import tempfile
 
 from django.contrib.auth.models import User
 
@@ -18,7 +21,7 @@ from contentstore.tests.modulestore_config import TEST_MODULESTORE
 from xmodule.modulestore import Location
 from xmodule.modulestore.django import modulestore
 from xmodule.contentstore.django import contentstore
-from xmodule.modulestore.xml_importer import import_from_xml
+from xmodule.modulestore.xml_importer import import_from_xml, ImportTimings
 from xmodule.contentstore.content import StaticContent
 from xmodule.contentstore.django import _CONTENTSTORE
 
@@ -220,3 +223,106 @@ class ContentStoreImportTest(ModuleStoreTestCase):
             },
             split_test_module.group_id_to_child,
         )
+
+    def test_incremental_import(self):
+        '''
+        An incremental import of an unchanged course doesn't save its assets again
+        '''
+        content_store = contentstore()
+        module_store = modulestore('direct')
+        import_from_xml(module_store, 'common/test/data/', ['toy'], static_content_store=content_store, verbose=True)
+        course_location = CourseDescriptor.id_to_location('edX/toy/2012_Fall')
+        assets, count = content_store.get_all_content_for_course(course_location)
+        upload_dates = dict((asset['_id']['name'], asset['uploadDate']) for asset in assets)
+
+        timings = ImportTimings()
+        import_from_xml(
+            module_store, 'common/test/data/', ['toy'], static_content_store=content_store, verbose=True,
+            incremental=True, workers=4, timings=timings
+        )
+
+        assets, new_count = content_store.get_all_content_for_course(course_location)
+        self.assertEqual(new_count, count)
+        for asset in assets:
+            self.assertEqual(asset['uploadDate'], upload_dates[asset['_id']['name']])
+        self.assertIn('static', timings.phases)
+        self.assertIn('modules', timings.phases)
+
+        handouts = module_store.get_item(Location(['i4x', 'edX', 'toy', 'course_info', 'handouts', None]))
+        self.assertIsNotNone(handouts)
+
+    def _copy_of_toy(self):
+        """
+        A temporary copy of the toy course's data directory, for tests to change
+        """
+        data_dir = path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, data_dir)
+        shutil.copytree('common/test/data/toy', data_dir / 'toy')
+        return data_dir
+
+    def test_incremental_import_changed_asset(self):
+        '''
+        An incremental import saves the assets whose content changed, and only those
+        '''
+        content_store = contentstore()
+        module_store = modulestore('direct')
+        data_dir = self._copy_of_toy()
+        import_from_xml(module_store, data_dir, ['toy'], static_content_store=content_store, verbose=True)
+        course_location = CourseDescriptor.id_to_location('edX/toy/2012_Fall')
+        assets, __ = content_store.get_all_content_for_course(course_location)
+        upload_dates = dict((asset['_id']['name'], asset['uploadDate']) for asset in assets)
+
+        with open(data_dir / 'toy/static/sample_static.txt', 'wb') as static_file:
+            static_file.write('changed content')
+        import_from_xml(
+            module_store, data_dir, ['toy'], static_content_store=content_store, verbose=True, incremental=True
+        )
+
+        changed_location = StaticContent.compute_location('edX', 'toy', 'sample_static.txt')
+        self.assertEqual(content_store.find(changed_location).data, 'changed content')
+        assets, __ = content_store.get_all_content_for_course(course_location)
+        for asset in assets:
+            if asset['_id']['name'] == changed_location.name:
+                self.assertNotEqual(asset['uploadDate'], upload_dates[asset['_id']['name']])
+            else:
+                self.assertEqual(asset['uploadDate'], upload_dates[asset['_id']['name']])
+
+    @patch('xmodule.modulestore.xml_importer.STREAM_FILE_SIZE', 1)
+    @patch('xmodule.modulestore.xml_importer.STREAM_CHUNK_SIZE', 7)
+    def test_incremental_import_streams_files(self):
+        '''
+        An incremental import streams files of at least STREAM_FILE_SIZE into the contentstore
+        '''
+        content_store = contentstore()
+        data_dir = path('common/test/data')
+        import_from_xml(
+            modulestore('direct'), data_dir, ['toy'], static_content_store=content_store, verbose=True,
+            incremental=True, workers=2
+        )
+
+        for name in ('sample_static.txt', 'textbook.pdf'):
+            with open(data_dir / 'toy/static' / name, 'rb') as static_file:
+                expected = static_file.read()
+            content = content_store.find(StaticContent.compute_location('edX', 'toy', name))
+            self.assertEqual(content.data, expected)
+
+    def test_incremental_import_inserts_new_modules(self):
+        '''
+        An incremental import inserts the modules which aren't in the store yet in bulk
+        '''
+        module_store = modulestore('direct')
+        with patch.object(module_store, 'update_item', wraps=module_store.update_item) as mock_update_item:
+            import_from_xml(
+                module_store, 'common/test/data/', ['toy'], static_content_store=contentstore(), verbose=True,
+                incremental=True
+            )
+        # only the course and its static tabs are saved one at a time
+        for call in mock_update_item.call_args_list:
+            self.assertIn(call[0][0].category, ('course', 'static_tab'))
+
+        html = module_store.get_item(Location(['i4x', 'edX', 'toy', 'html', 'toyhtml', None]))
+        self.assertIn('sample_handout.txt', html.data)
+        chapter = module_store.get_item(Location(['i4x', 'edX', 'toy', 'chapter', 'Overview', None]))
+        self.assertTrue(chapter.children)
+        for child in chapter.children:
+            self.assertIsNotNone(module_store.get_item(Location(child)))
@@ -228,6 +228,12 @@ MIDDLEWARE_CLASSES = (
 # Clickjacking protection can be enabled by setting this to 'DENY'
 X_FRAME_OPTIONS = 'ALLOW'
 
+# How many seconds a user's course and org roles are cached for (0 to only remember them for a request)
+ROLE_CACHE_TIMEOUT = 300
+
+# How many threads a course export copies the course's static assets with
+COURSE_EXPORT_WORKERS = 4
+
 ############# XBlock Configuration ##########
 
 # Import after sys.path fixup
@@ -153,6 +153,9 @@ CACHES = {
 
 }
 
+# The test databases reuse user ids, so don't let roles outlive a request
+ROLE_CACHE_TIMEOUT = 0
+
 # Add external_auth to Installed apps for testing
 INSTALLED_APPS += ('external_auth', )
 
@@ -1,5 +1,10 @@
+import calendar
+import re
+
+from django.conf import settings
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
+from django.utils.http import http_date, parse_http_date_safe
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
@@ -8,6 +13,39 @@ from xmodule.modulestore import InvalidLocationError
 from cache_toolbox.core import get_cached_content, set_cached_content
 from xmodule.exceptions import NotFoundError
 
+# only a single byte range is honored; multipart/byteranges responses aren't worth the complexity for assets
+SINGLE_BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_byte_range(range_header, length):
+    """
+    Parse an HTTP Range header against a resource of the given length.
+
+    Returns a tuple (first_byte, last_byte) of inclusive offsets, None if the header
+    should be ignored (malformed or asking for more than one range) in which case the
+    whole content should be served, or raises ValueError if the range can't be satisfied.
+    """
+    match = SINGLE_BYTE_RANGE_RE.match(range_header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # a suffix range: the final N bytes
+        suffix_length = int(last)
+        if suffix_length == 0:
+            raise ValueError(range_header)
+        return max(length - suffix_length, 0), length - 1
+    first = int(first)
+    if first >= length:
+        raise ValueError(range_header)
+    last = length - 1 if last == '' else int(last)
+    if last < first:
+        # syntactically invalid, so ignored
+        return None
+    return first, min(last, length - 1)
+
 
 class StaticContentServer(object):
     def process_request(self, request):
@@ -52,18 +90,85 @@ class StaticContentServer(object):
                         request.user, course_partial_id):
                     return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
+            # convert over the DB persistent last modified timestamp to a HTTP compatible timestamp
+            last_modified_at = calendar.timegm(content.last_modified_at.utctimetuple())
+            last_modified_at_str = http_date(last_modified_at)
+            # gridfs keeps the md5 of each file, which makes a strong validator
+            content_digest = getattr(content, 'content_digest', None)
+            etag = '"{}"'.format(content_digest) if content_digest else None
 
             # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            # validators, if they are the same then just return a 304 (Not Modified)
+            if self._is_not_modified(request, etag, last_modified_at):
+                response = HttpResponseNotModified()
+                self._set_caching_headers(response, content, etag, last_modified_at_str)
+                return response
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
-            response['Last-Modified'] = last_modified_at_str
+            length = content.length
+            byte_range = None
+            if 'HTTP_RANGE' in request.META and length and self._if_range_matches(request, etag, last_modified_at_str):
+                try:
+                    byte_range = parse_byte_range(request.META['HTTP_RANGE'], length)
+                except ValueError:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = 'bytes */{}'.format(length)
+                    return response
+
+            if byte_range is not None:
+                first_byte, last_byte = byte_range
+                # seeks in the gridfs file (or slices the cached data) so only the requested bytes are read
+                response = HttpResponse(
+                    content.stream_data_in_range(first_byte, last_byte), content_type=content.content_type
+                )
+                response.status_code = 206
+                response['Content-Range'] = 'bytes {}-{}/{}'.format(first_byte, last_byte, length)
+                response['Content-Length'] = str(last_byte - first_byte + 1)
+            else:
+                # content that wasn't cached is still a gridfs stream; the generator is handed to the
+                # wsgi server so the file is sent chunk by chunk rather than read into memory
+                response = HttpResponse(content.stream_data(), content_type=content.content_type)
+                if length is not None:
+                    response['Content-Length'] = str(length)
+            self._set_caching_headers(response, content, etag, last_modified_at_str)
 
             return response
+
+    @staticmethod
+    def _is_not_modified(request, etag, last_modified_at):
+        """
+        Whether the client's cached copy is still current. If-None-Match takes precedence
+        over If-Modified-Since when both are sent.
+        """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            if etag is None:
+                return False
+            if_none_match = request.META['HTTP_IF_NONE_MATCH']
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            if_modified_since = parse_http_date_safe(request.META['HTTP_IF_MODIFIED_SINCE'])
+            return if_modified_since is not None and last_modified_at <= if_modified_since
+        return False
+
+    @staticmethod
+    def _if_range_matches(request, etag, last_modified_at_str):
+        """
+        A range request with an If-Range validator which no longer matches gets the whole content
+        """
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None:
+            return True
+        return if_range == etag or if_range == last_modified_at_str
+
+    @staticmethod
+    def _set_caching_headers(response, content, etag, last_modified_at_str):
+        """
+        Add the validators and Cache-Control to the response. Locked assets must not be
+        kept by shared caches since they're only visible to enrolled students.
+        """
+        response['Last-Modified'] = last_modified_at_str
+        if etag is not None:
+            response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        max_age = getattr(settings, 'STATIC_CONTENT_MAX_AGE', 3600)
+        visibility = 'private' if getattr(content, 'locked', False) else 'public'
+        response['Cache-Control'] = '{}, max-age={}'.format(visibility, max_age)
@@ -134,3 +134,29 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) # pylint: disable=E1103
 
+
+    def test_range_request(self):
+        """
+        Test that a single byte range is served as partial content.
+        """
+        full = self.client.get(self.url_unlocked)
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(resp.status_code, 206) # pylint: disable=E1103
+        self.assertEqual(resp.content, full.content[:10]) # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes 0-9/{}'.format(len(full.content))) # pylint: disable=E1103
+
+    def test_unsatisfiable_range_request(self):
+        """
+        Test that a range starting past the end of the content is rejected.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=100000-')
+        self.assertEqual(resp.status_code, 416) # pylint: disable=E1103
+
+    def test_etag_revalidation(self):
+        """
+        Test that a client holding the current ETag gets a 304.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertIn('public', resp['Cache-Control']) # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=resp['ETag']) # pylint: disable=E1103
+        self.assertEqual(resp.status_code, 304) # pylint: disable=E1103
@@ -52,3 +52,15 @@ class MidcourseReverificationWindow(ValidateOnSaveMixin, models.Model):
             return cls.objects.get(course_id=course_id, start_date__lte=date, end_date__gte=date)
         except cls.DoesNotExist:
             return None
+
+    @classmethod
+    def get_windows(cls, course_ids, date):
+        """
+        Returns a dict of course_id -> the window that get_window would return
+        for that course and date, for all the given course ids at once.
+        Courses with no open window are left out.
+        """
+        windows = {}
+        for window in cls.objects.filter(course_id__in=course_ids, start_date__lte=date, end_date__gte=date):
+            windows.setdefault(window.course_id, []).append(window)
+        return {course_id: found[0] for course_id, found in windows.iteritems() if len(found) == 1}
@@ -1,5 +1,7 @@
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from staticfiles.storage import staticfiles_storage
 from staticfiles import finders
@@ -11,6 +13,11 @@ from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 
+# How many static urls each UrlRewriter remembers the lookup of
+STATIC_URL_CACHE_SIZE = 5000
+# How many UrlRewriters get_url_rewriter keeps, i.e. roughly how many courses
+URL_REWRITERS_CACHE_SIZE = 100
+
 
 def _url_replace_regex(prefix):
     """
@@ -28,6 +35,29 @@ def _url_replace_regex(prefix):
         """.format(prefix=prefix)
 
 
+_COMPILED_REGEXES = {}
+
+
+def _compiled_url_replace_regex(prefix):
+    """
+    The compiled _url_replace_regex for prefix, compiling each prefix only once
+    """
+    regex = _COMPILED_REGEXES.get(prefix)
+    if regex is None:
+        regex = _COMPILED_REGEXES[prefix] = re.compile(_url_replace_regex(prefix))
+    return regex
+
+
+def _static_url_prefix_regex(data_directory, static_asset_path):
+    """
+    The regex matching the prefix of the static urls that replace_static_urls rewrites
+    """
+    return u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=static_asset_path or data_directory
+    )
+
+
 def try_staticfiles_lookup(path):
     """
     Try to lookup a path in staticfiles_storage.  If it fails, return
@@ -69,7 +99,7 @@ def replace_jump_to_id_urls(text, course_id, jump_to_id_base_url):
         rest = match.group('rest')
         return "".join([quote, jump_to_id_base_url + rest, quote])
 
-    return re.sub(_url_replace_regex('/jump_to_id/'), replace_jump_to_id_url, text)
+    return _compiled_url_replace_regex('/jump_to_id/').sub(replace_jump_to_id_url, text)
 
 
 def replace_course_urls(text, course_id):
@@ -87,7 +117,7 @@ def replace_course_urls(text, course_id):
         rest = match.group('rest')
         return "".join([quote, '/courses/' + course_id + '/', rest, quote])
 
-    return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
+    return _compiled_url_replace_regex('/course/').sub(replace_course_url, text)
 
 
 def replace_static_urls(text, data_directory, course_id=None, static_asset_path=''):
@@ -104,58 +134,165 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
     """
 
     def replace_static_url(match):
-        original = match.group(0)
-        prefix = match.group('prefix')
         quote = match.group('quote')
-        rest = match.group('rest')
+        url = _static_url(match.group('prefix'), match.group('rest'), data_directory, course_id, static_asset_path)
+        if url is None:
+            return match.group(0)
+        return "".join([quote, url, quote])
+
+    return _compiled_url_replace_regex(_static_url_prefix_regex(data_directory, static_asset_path)).sub(
+        replace_static_url,
+        text
+    )
+
 
-        # Don't mess with things that end in '?raw'
-        if rest.endswith('?raw'):
-            return original
-
-        # In debug mode, if we can find the url as is,
-        if settings.DEBUG and finders.find(rest, True):
-            return original
-        # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
-            # first look in the static file pipeline and see if we are trying to reference
-            # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
-
-            exists_in_staticfiles_storage = False
-            try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-
-            if exists_in_staticfiles_storage:
+def _static_url(prefix, rest, data_directory, course_id, static_asset_path):
+    """
+    Return the url that replace_static_urls replaces the static url made of prefix and
+    rest with, or None if it should be left alone.
+    """
+    # Don't mess with things that end in '?raw'
+    if rest.endswith('?raw'):
+        return None
+
+    # In debug mode, if we can find the url as is,
+    if settings.DEBUG and finders.find(rest, True):
+        return None
+    # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
+    elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
+        # first look in the static file pipeline and see if we are trying to reference
+        # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+
+        exists_in_staticfiles_storage = False
+        try:
+            exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+
+        if exists_in_staticfiles_storage:
+            url = staticfiles_storage.url(rest)
+        else:
+            # if not, then assume it's courseware specific content and then look in the
+            # Mongo-backed database
+            url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
+    # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+    else:
+        course_path = "/".join((static_asset_path or data_directory, rest))
+
+        try:
+            if staticfiles_storage.exists(rest):
                 url = staticfiles_storage.url(rest)
             else:
-                # if not, then assume it's courseware specific content and then look in the
-                # Mongo-backed database
-                url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
-        # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
-        else:
-            course_path = "/".join((static_asset_path or data_directory, rest))
-
-            try:
-                if staticfiles_storage.exists(rest):
-                    url = staticfiles_storage.url(rest)
-                else:
-                    url = staticfiles_storage.url(course_path)
-            # And if that fails, assume that it's course content, and add manually data directory
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-                url = "".join([prefix, course_path])
+                url = staticfiles_storage.url(course_path)
+        # And if that fails, assume that it's course content, and add manually data directory
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+            url = "".join([prefix, course_path])
+
+    return url
+
 
+class UrlRewriter(object):
+    """
+    Does what replace_static_urls, replace_course_urls and replace_jump_to_id_urls
+    do for one course, but in a single pass over the text with one precompiled
+    regex. The lookups of static urls are remembered.
+
+    Use get_url_rewriter to share the rewriter of a course between requests.
+    """
+    def __init__(self, data_directory, course_id=None, static_asset_path='', jump_to_id_base_url=None):
+        self.data_directory = data_directory
+        self.course_id = course_id
+        self.static_asset_path = static_asset_path
+        self.jump_to_id_base_url = jump_to_id_base_url
+
+        # The named groups of the prefixes say which kind of url matched; the
+        # prefixes can't overlap, so this matches what running replace_static_urls,
+        # replace_course_urls and then replace_jump_to_id_urls would.
+        static_prefix = _static_url_prefix_regex(data_directory, static_asset_path)
+        self.static_regex = re.compile(_url_replace_regex(static_prefix))
+        prefixes = [u'(?P<static>{})'.format(static_prefix)]
+        if course_id is not None:
+            prefixes.append(u'(?P<course>/course/)')
+            if jump_to_id_base_url is not None:
+                prefixes.append(u'(?P<jump_to_id>/jump_to_id/)')
+        self.regex = re.compile(_url_replace_regex(u'|'.join(prefixes)))
+
+        self._lock = threading.Lock()
+        self._static_urls = OrderedDict()
+
+    def rewrite(self, text):
+        """
+        Return text with all three kinds of url rewritten
+        """
+        return self.regex.sub(self._replace_url, text)
+
+    def replace_static_urls(self, text):
+        """
+        Return text with just its static urls rewritten, like replace_static_urls
+        """
+        def replace_static_url(match):
+            url = self.static_url(match.group('prefix'), match.group('rest'))
+            if url is None:
+                return match.group(0)
+            return "".join([match.group('quote'), url, match.group('quote')])
+
+        return self.static_regex.sub(replace_static_url, text)
+
+    def _replace_url(self, match):
+        """
+        The replacement for one url matched by self.regex
+        """
+        quote = match.group('quote')
+        rest = match.group('rest')
+        if match.group('static') is not None:
+            url = self.static_url(match.group('prefix'), rest)
+            if url is None:
+                return match.group(0)
+        elif match.group('course') is not None:
+            url = '/courses/' + self.course_id + '/' + rest
+        else:
+            url = self.jump_to_id_base_url + rest
         return "".join([quote, url, quote])
 
-    return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=static_asset_path or data_directory
-        )),
-        replace_static_url,
-        text
-    )
+    def static_url(self, prefix, rest):
+        """
+        Like _static_url for this course, remembering the result
+        """
+        key = (prefix, rest)
+        with self._lock:
+            if key in self._static_urls:
+                return self._static_urls[key]
+        url = _static_url(prefix, rest, self.data_directory, self.course_id, self.static_asset_path)
+        with self._lock:
+            self._static_urls[key] = url
+            if len(self._static_urls) > STATIC_URL_CACHE_SIZE:
+                self._static_urls.popitem(last=False)
+        return url
+
+
+# The UrlRewriters, least recently used first
+_URL_REWRITERS = OrderedDict()
+_URL_REWRITERS_LOCK = threading.Lock()
+
+
+def get_url_rewriter(data_directory, course_id=None, static_asset_path='', jump_to_id_base_url=None):
+    """
+    Return the UrlRewriter for these arguments, creating it the first time.
+
+    The rewriters are also keyed by which kind of modulestore has the course, which
+    decides where its static urls point. Only the URL_REWRITERS_CACHE_SIZE most
+    recently used rewriters are kept.
+    """
+    store_type = modulestore().get_modulestore_type(course_id) if course_id else None
+    key = (data_directory, course_id, static_asset_path, jump_to_id_base_url, store_type)
+    with _URL_REWRITERS_LOCK:
+        rewriter = _URL_REWRITERS.pop(key, None)
+        if rewriter is None:
+            rewriter = UrlRewriter(data_directory, course_id, static_asset_path, jump_to_id_base_url)
+        _URL_REWRITERS[key] = rewriter
+        if len(_URL_REWRITERS) > URL_REWRITERS_CACHE_SIZE:
+            _URL_REWRITERS.popitem(last=False)
+    return rewriter
@@ -1,8 +1,9 @@
 import re
+from collections import OrderedDict
 
 from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=E0611
-from static_replace import (replace_static_urls, replace_course_urls,
-                            _url_replace_regex)
+from static_replace import (replace_static_urls, replace_course_urls, replace_jump_to_id_urls,
+                            _url_replace_regex, UrlRewriter, get_url_rewriter)
 from mock import patch, Mock
 from xmodule.modulestore import Location
 from xmodule.modulestore.mongo import MongoModuleStore
@@ -122,3 +123,53 @@ def test_regex():
     for s in no:
         print 'Should not match: {0!r}'.format(s)
         assert_false(re.match(regex, s))
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_url_rewriter(mock_modulestore, mock_storage):
+    """
+    Make sure UrlRewriter rewrites like the separate replace functions, looking each static url up once
+    """
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(XMLModuleStore)
+    mock_modulestore.return_value.get_modulestore_type.return_value = 'xml'
+    mock_storage.url.side_effect = lambda path: '/static/' + path
+
+    jump_to_id_base_url = '/courses/org/course/run/jump_to_id/'
+    text = (
+        '<img src="/static/file.png"/><a href="/course/info">x</a>'
+        '<a href=\'/jump_to_id/abc\'>y</a><img src="/static/file.png"/><a href="/static/foo.png?raw">z</a>'
+    )
+    expected = replace_jump_to_id_urls(
+        replace_course_urls(replace_static_urls(text, DATA_DIRECTORY, COURSE_ID), COURSE_ID),
+        COURSE_ID,
+        jump_to_id_base_url
+    )
+    mock_storage.exists.reset_mock()
+
+    rewriter = UrlRewriter(DATA_DIRECTORY, COURSE_ID, jump_to_id_base_url=jump_to_id_base_url)
+    assert_equals(expected, rewriter.rewrite(text))
+    assert_equals(mock_storage.exists.call_count, 1)
+
+    # the static url lookups are remembered
+    assert_equals(expected, rewriter.rewrite(text))
+    assert_equals(mock_storage.exists.call_count, 1)
+    assert_equals(replace_static_urls(text, DATA_DIRECTORY, COURSE_ID), rewriter.replace_static_urls(text))
+
+
+@patch('static_replace.URL_REWRITERS_CACHE_SIZE', 2)
+@patch('static_replace._URL_REWRITERS', OrderedDict())
+@patch('static_replace.modulestore')
+def test_url_rewriters_bounded(mock_modulestore):
+    """
+    Make sure get_url_rewriter shares rewriters, keeping only the most recently used ones
+    """
+    mock_modulestore.return_value.get_modulestore_type.return_value = 'xml'
+    first = get_url_rewriter(DATA_DIRECTORY, 'org/course/1')
+    second = get_url_rewriter(DATA_DIRECTORY, 'org/course/2')
+    assert_true(get_url_rewriter(DATA_DIRECTORY, 'org/course/1') is first)
+
+    get_url_rewriter(DATA_DIRECTORY, 'org/course/3')
+    assert_true(get_url_rewriter(DATA_DIRECTORY, 'org/course/1') is first)
+    assert_false(get_url_rewriter(DATA_DIRECTORY, 'org/course/2') is second)
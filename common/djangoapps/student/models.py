@@ -22,12 +22,12 @@ from dogapi import dog_stats_api
 
 from django.conf import settings
 from django.utils import timezone
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, Group
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.db import models, IntegrityError
 from django.db.models import Count
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, m2m_changed, pre_delete
 from django.dispatch import receiver, Signal
 import django.dispatch
 from django.core.exceptions import ObjectDoesNotExist
@@ -41,6 +41,7 @@ from importlib import import_module
 from xmodule.modulestore import Location
 
 from course_modes.models import CourseMode
+from student.roles import invalidate_role_cache
 import lms.lib.comment_client as cc
 from util.query import use_read_replica_if_available
 
@@ -1099,3 +1100,26 @@ def enforce_single_login(sender, request, user, signal, **kwargs):
         else:
             key = None
         user.profile.set_login_session(key)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_role_cache_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Forget the cached group names (see student.roles) of users whose groups change,
+    including changes which don't go through the role classes (e.g. in the django admin).
+    """
+    if action in ('post_add', 'post_remove'):
+        user_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear':
+        user_ids = instance.user_set.values_list('id', flat=True) if reverse else [instance.pk]
+    else:
+        return
+    invalidate_role_cache(*user_ids)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_role_cache_on_group_delete(sender, instance, **kwargs):
+    """
+    Forget the cached group names of the members of a group being deleted.
+    """
+    invalidate_role_cache(*instance.user_set.values_list('id', flat=True))
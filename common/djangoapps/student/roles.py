@@ -3,9 +3,16 @@ Classes used to model the roles used in the courseware. Each role is responsible
 adding users, removing users, and listing members
 """
 
+import threading
 from abc import ABCMeta, abstractmethod
+from uuid import uuid4
 
+from django.conf import settings
 from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
 
 from xmodule.modulestore import Location
 from xmodule.modulestore.exceptions import InvalidLocationError, ItemNotFoundError
@@ -20,6 +27,102 @@ class CourseContextRequired(Exception):
     pass
 
 
+# The ids of the users whose groups this thread changed in a transaction which
+# hadn't been committed yet
+_UNCOMMITTED_ROLE_CHANGES = threading.local()
+
+
+def _role_cache_version_key(user_id):
+    """
+    The cache key of the current version of the user's cached group names
+    """
+    return u'student.roles.version.{}'.format(user_id)
+
+
+def _user_group_names(user):
+    """
+    Return the lowercased names of all of the user's groups, which is everything
+    needed to check any of the user's GroupBasedRoles.
+
+    The names are memoized on the user for the rest of the request and cached
+    for ROLE_CACHE_TIMEOUT seconds across requests. The cached names are stored
+    under a per-user version which invalidate_role_cache replaces when the
+    groups change and again once the change is committed, so a request which
+    read the groups before the change was committed can't cache its stale copy
+    under the version that later requests look at.
+    """
+    # pylint: disable=protected-access
+    if hasattr(user, '_groups'):
+        return user._groups
+
+    timeout = settings.ROLE_CACHE_TIMEOUT
+    if timeout:
+        version_key = _role_cache_version_key(user.id)
+        version = cache.get(version_key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(version_key, version, timeout):
+                version = cache.get(version_key, version)
+        groups_key = u'student.roles.groups.{}.{}'.format(user.id, version)
+        groups = cache.get(groups_key)
+    else:
+        groups = None
+
+    if groups is None:
+        groups = frozenset(name.lower() for name in user.groups.values_list('name', flat=True))
+        if timeout:
+            cache.set(groups_key, groups, timeout)
+
+    user._groups = groups
+    return groups
+
+
+def _replace_role_cache_versions(user_ids):
+    """
+    Replace the versions of the cached group names of the users with the given ids
+    """
+    if user_ids and settings.ROLE_CACHE_TIMEOUT:
+        cache.set_many(
+            dict((_role_cache_version_key(user_id), uuid4().hex) for user_id in user_ids),
+            settings.ROLE_CACHE_TIMEOUT
+        )
+
+
+def invalidate_role_cache(*users):
+    """
+    Forget the cached group names of the supplied django users (or user ids), in
+    this request and across requests.
+
+    Within a transaction (e.g. a request's, with TransactionMiddleware),
+    another request can read the old groups until it commits, so the versions
+    are replaced again when the request finishes.
+    """
+    user_ids = set()
+    for user in users:
+        if isinstance(user, User):
+            if hasattr(user, '_groups'):
+                del user._groups  # pylint: disable=protected-access
+            user = user.id
+        user_ids.add(user)
+    _replace_role_cache_versions(user_ids)
+    if user_ids and transaction.is_managed():
+        if not hasattr(_UNCOMMITTED_ROLE_CHANGES, 'user_ids'):
+            _UNCOMMITTED_ROLE_CHANGES.user_ids = set()
+        _UNCOMMITTED_ROLE_CHANGES.user_ids.update(user_ids)
+
+
+@receiver(request_finished)
+def invalidate_uncommitted_role_changes(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Replace the cache versions of the users whose groups the request changed,
+    now that TransactionMiddleware has committed (or rolled back) the change.
+    """
+    user_ids = getattr(_UNCOMMITTED_ROLE_CHANGES, 'user_ids', None)
+    if user_ids:
+        _UNCOMMITTED_ROLE_CHANGES.user_ids = set()
+        _replace_role_cache_versions(user_ids)
+
+
 class AccessRole(object):
     """
     Object representing a role with particular access to a resource
@@ -101,11 +204,7 @@ class GroupBasedRole(AccessRole):
         if not (user.is_authenticated() and user.is_active):
             return False
 
-        # pylint: disable=protected-access
-        if not hasattr(user, '_groups'):
-            user._groups = set(name.lower() for name in user.groups.values_list('name', flat=True))
-
-        return len(user._groups.intersection(self._group_names)) > 0
+        return not _user_group_names(user).isdisjoint(self._group_names)
 
     def add_users(self, *users):
         """
@@ -116,10 +215,7 @@ class GroupBasedRole(AccessRole):
         users = [user for user in users if user.is_authenticated() and user.is_active]
         group, _ = Group.objects.get_or_create(name=self._group_names[0])
         group.user_set.add(*users)
-        # remove cache
-        for user in users:
-            if hasattr(user, '_groups'):
-                del user._groups
+        invalidate_role_cache(*users)
 
     def remove_users(self, *users):
         """
@@ -128,10 +224,7 @@ class GroupBasedRole(AccessRole):
         groups = Group.objects.filter(name__in=self._group_names)
         for group in groups:
             group.user_set.remove(*users)
-        # remove cache
-        for user in users:
-            if hasattr(user, '_groups'):
-                del user._groups
+        invalidate_role_cache(*users)
 
     def users_with_role(self):
         """
@@ -2,12 +2,16 @@
 Tests of student.roles
 """
 
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from xmodule.modulestore import Location
 from courseware.tests.factories import UserFactory, StaffFactory, InstructorFactory
 from student.tests.factories import AnonymousUserFactory
 
+from student import roles
 from student.roles import GlobalStaff, CourseRole, CourseStaffRole
 from xmodule.modulestore.django import loc_mapper
 from xmodule.modulestore.locator import BlockUsageLocator
@@ -84,3 +88,45 @@ class RolesTestCase(TestCase):
             CourseStaffRole(vertical_location, course_context=self.course.course_id).has_user(self.student),
             "Student doesn't have access to {}".format(unicode(vertical_location.url()))
         )
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_role_cache(self):
+        """
+        Test that a user's roles are cached across requests until they change
+        """
+        cache.clear()
+        role = CourseStaffRole(self.course)
+        self.assertFalse(role.has_user(self.student))
+        # a new request gets a new user object
+        student = User.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(role.has_user(student))
+
+        role.add_users(self.student)
+        self.assertTrue(role.has_user(self.student))
+        self.assertTrue(role.has_user(User.objects.get(pk=self.student.pk)))
+
+        # changes that don't go through the role are seen too
+        Group.objects.get(name=role._group_names[0]).user_set.remove(self.student)  # pylint: disable=protected-access
+        self.assertFalse(role.has_user(User.objects.get(pk=self.student.pk)))
+
+    @override_settings(ROLE_CACHE_TIMEOUT=300)
+    def test_role_cache_stale_before_commit(self):
+        """
+        Test that groups cached by another request before a change is committed
+        aren't used once the request making the change finishes
+        """
+        cache.clear()
+        role = CourseStaffRole(self.course)
+        role.add_users(self.student)
+
+        # another request reads the groups before the change is committed, and
+        # caches them under the new version
+        version = cache.get(roles._role_cache_version_key(self.student.id))  # pylint: disable=protected-access
+        cache.set(u'student.roles.groups.{}.{}'.format(self.student.id, version), frozenset())
+        self.assertFalse(role.has_user(User.objects.get(pk=self.student.pk)))
+
+        # the request making the change finishes (sending request_finished
+        # itself would close the test's database connection)
+        roles.invalidate_uncommitted_role_changes(sender=None)
+        self.assertTrue(role.has_user(User.objects.get(pk=self.student.pk)))
@@ -14,7 +14,8 @@ from django.test import TestCase
 from django.test.utils import override_settings
 from django.test.client import RequestFactory
 from django.contrib.auth.models import User, AnonymousUser
-from django.core.urlresolvers import reverse
+from django.core.cache import cache
+from django.core.urlresolvers import reverse, NoReverseMatch
 from django.http import HttpResponse
 
 from xmodule.modulestore.tests.factories import CourseFactory
@@ -24,8 +25,8 @@ from courseware.tests.tests import TEST_DATA_MIXED_MODULESTORE
 from mock import Mock, patch, sentinel
 
 from student.models import anonymous_id_for_user, user_by_anonymous_id, CourseEnrollment, unique_id_for_user
-from student.views import (process_survey_link, _cert_info,
-                           change_enrollment, complete_course_mode_info, token)
+from student.views import (process_survey_link, _cert_info, change_enrollment,
+                           complete_course_mode_info, dashboard_course_info, token)
 from student.tests.factories import UserFactory, CourseModeFactory
 
 import shoppingcart
@@ -186,6 +187,42 @@ class DashboardTest(TestCase):
         verified_mode.save()
         self.assertFalse(enrollment.refundable())
 
+    def test_dashboard_course_info(self):
+        CourseModeFactory.create(
+            course_id=self.course.id,
+            mode_slug='verified',
+            mode_display_name='Verified',
+        )
+        enrollment = CourseEnrollment.enroll(self.user, self.course.id)
+        course_info = dashboard_course_info(self.user, [(self.course, enrollment)])
+        self.assertEqual(
+            course_info['all_course_modes'][self.course.id],
+            complete_course_mode_info(self.course.id, enrollment)
+        )
+        self.assertIn(self.course.id, course_info['show_courseware_links_for'])
+        self.assertIn(self.course.id, course_info['show_refund_option_for'])
+        # the course hasn't ended, so there's no certificate information
+        self.assertEqual(course_info['cert_statuses'][self.course.id], {})
+
+    @override_settings(DASHBOARD_CACHE_TIMEOUT=60)
+    def test_dashboard_course_info_cached(self):
+        try:
+            url = reverse('dashboard')
+        except NoReverseMatch:
+            raise unittest.SkipTest("Skip this test if url cannot be found (ie running from CMS tests)")
+        cache.clear()
+        CourseEnrollment.enroll(self.user, self.course.id)
+        self.client.login(username=self.user.username, password='test')
+        with patch('student.views.dashboard_course_info', wraps=dashboard_course_info) as mock_course_info:
+            self.client.get(url)
+            self.client.get(url)
+            self.assertEqual(mock_course_info.call_count, 1)
+
+            # a change to the enrollments is seen right away
+            CourseEnrollment.unenroll(self.user, self.course.id)
+            self.client.get(url)
+            self.assertEqual(mock_course_info.call_count, 2)
+
 
 
 class EnrollInCourseTest(TestCase):
@@ -2,6 +2,7 @@
 Student Views
 """
 import datetime
+import hashlib
 import json
 import logging
 import re
@@ -47,7 +48,9 @@ from student.forms import PasswordResetFormNoActive
 from student.firebase_token_generator import create_token
 
 from verify_student.models import SoftwareSecurePhotoVerification, MidcourseReverificationWindow
-from certificates.models import CertificateStatuses, certificate_status_for_student
+from certificates.models import (
+    CertificateStatuses, certificate_status_for_student, certificate_statuses_for_student
+)
 from dark_lang.models import DarkLangConfig
 
 from xmodule.course_module import CourseDescriptor
@@ -213,8 +216,11 @@ def reverification_info(course_enrollment_pairs, user, statuses):
             dict["must_reverify"] = [some information]
     """
     reverifications = defaultdict(list)
+    windows = MidcourseReverificationWindow.get_windows(
+        [course.id for course, _enrollment in course_enrollment_pairs], datetime.datetime.now(UTC)
+    )
     for (course, enrollment) in course_enrollment_pairs:
-        info = single_course_reverification_info(user, course, enrollment)
+        info = _reverification_info(user, course, enrollment, windows.get(course.id))
         if info:
             reverifications[info.status].append(info)
 
@@ -241,7 +247,14 @@ def single_course_reverification_info(user, course, enrollment):  # pylint: disa
         OR, None: None if there is no re-verification info for this enrollment
     """
     window = MidcourseReverificationWindow.get_window(course.id, datetime.datetime.now(UTC))
+    return _reverification_info(user, course, enrollment, window)
+
 
+def _reverification_info(user, course, enrollment, window):
+    """
+    Implements the logic for single_course_reverification_info, given the
+    reverification window currently open for the course (or None).
+    """
     # If there's no window OR the user is not verified, we don't get reverification info
     if (not window) or (enrollment.mode != "verified"):
         return None
@@ -258,23 +271,25 @@ def get_course_enrollment_pairs(user, course_org_filter, org_filter_out_set):
     Get the relevant set of (Course, CourseEnrollment) pairs to be displayed on
     a student's dashboard.
     """
-    for enrollment in CourseEnrollment.enrollments_for_user(user):
-        try:
-            course = course_from_id(enrollment.course_id)
-
-            # if we are in a Microsite, then filter out anything that is not
-            # attributed (by ORG) to that Microsite
-            if course_org_filter and course_org_filter != course.location.org:
-                continue
-            # Conversely, if we are not in a Microsite, then let's filter out any enrollments
-            # with courses attributed (by ORG) to Microsites
-            elif course.location.org in org_filter_out_set:
-                continue
-
-            yield (course, enrollment)
-        except ItemNotFoundError:
+    enrollments = list(CourseEnrollment.enrollments_for_user(user))
+    courses = modulestore().get_courses_by_id([enrollment.course_id for enrollment in enrollments])
+    for enrollment in enrollments:
+        course = courses.get(enrollment.course_id)
+        if course is None:
             log.error("User {0} enrolled in non-existent course {1}"
                       .format(user.username, enrollment.course_id))
+            continue
+
+        # if we are in a Microsite, then filter out anything that is not
+        # attributed (by ORG) to that Microsite
+        if course_org_filter and course_org_filter != course.location.org:
+            continue
+        # Conversely, if we are not in a Microsite, then let's filter out any enrollments
+        # with courses attributed (by ORG) to Microsites
+        elif course.location.org in org_filter_out_set:
+            continue
+
+        yield (course, enrollment)
 
 
 def _cert_info(user, course, cert_status):
@@ -392,7 +407,7 @@ def register_user(request, extra_context=None):
     return render_to_response('register.html', context)
 
 
-def complete_course_mode_info(course_id, enrollment):
+def complete_course_mode_info(course_id, enrollment, modes=None):
     """
     We would like to compute some more information from the given course modes
     and the user's current enrollment
@@ -400,8 +415,12 @@ def complete_course_mode_info(course_id, enrollment):
     Returns the given information:
         - whether to show the course upsell information
         - numbers of days until they can't upsell anymore
+
+    `modes` are the course's modes as returned by CourseMode.modes_for_course_dict,
+    if the caller has already fetched them.
     """
-    modes = CourseMode.modes_for_course_dict(course_id)
+    if modes is None:
+        modes = CourseMode.modes_for_course_dict(course_id)
     mode_info = {'show_upsell': False, 'days_for_upsell': None}
     # we want to know if the user is already verified and if verified is an
     # option
@@ -415,6 +434,66 @@ def complete_course_mode_info(course_id, enrollment):
     return mode_info
 
 
+def dashboard_course_info(user, course_enrollment_pairs):
+    """
+    Compute the per-course parts of the dashboard for the given (course, enrollment)
+    pairs, fetching the course modes, certificates, email authorizations and
+    reverification windows of all the courses at once rather than course by course.
+
+    Returns a dict with the 'show_courseware_links_for', 'all_course_modes',
+    'cert_statuses', 'show_email_settings_for', 'reverifications' and
+    'show_refund_option_for' entries of the dashboard's context.
+    """
+    course_ids = [course.id for course, _enrollment in course_enrollment_pairs]
+    modes = CourseMode.modes_for_courses_dict(course_ids)
+    ended_course_ids = [course.id for course, _enrollment in course_enrollment_pairs if course.has_ended()]
+    cert_statuses = certificate_statuses_for_student(user, ended_course_ids) if ended_course_ids else {}
+
+    # only show email settings for Mongo course and when bulk email is turned on
+    show_email_settings_for = frozenset()
+    if settings.FEATURES['ENABLE_INSTRUCTOR_EMAIL']:
+        show_email_settings_for = frozenset(
+            CourseAuthorization.instructor_email_enabled_for([
+                course_id for course_id in course_ids
+                if modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE
+            ])
+        )
+
+    # Gets data for midcourse reverifications, if any are necessary or have failed
+    statuses = ["approved", "denied", "pending", "must_reverify"]
+
+    return {
+        'show_courseware_links_for': frozenset(
+            course.id for course, _enrollment in course_enrollment_pairs if has_access(user, course, 'load')
+        ),
+        'all_course_modes': {
+            course.id: complete_course_mode_info(course.id, enrollment, modes[course.id])
+            for course, enrollment in course_enrollment_pairs
+        },
+        'cert_statuses': {
+            course.id: _cert_info(user, course, cert_statuses[course.id]) if course.id in cert_statuses else {}
+            for course, _enrollment in course_enrollment_pairs
+        },
+        'show_email_settings_for': show_email_settings_for,
+        'reverifications': reverification_info(course_enrollment_pairs, user, statuses),
+        # students may get a refund if the course has a verified mode (see CourseEnrollment.refundable)
+        'show_refund_option_for': frozenset(course_id for course_id in course_ids if 'verified' in modes[course_id]),
+    }
+
+
+def _dashboard_course_info_cache_key(user, course_enrollment_pairs):
+    """
+    The key under which dashboard_course_info is cached for these pairs. It names
+    every course and enrollment mode, so enrolling, unenrolling or upgrading
+    changes the key instead of showing the old courses until the cache expires.
+    """
+    enrollments = sorted(
+        u"{}:{}".format(enrollment.course_id, enrollment.mode) for _course, enrollment in course_enrollment_pairs
+    )
+    digest = hashlib.md5(u"|".join(enrollments).encode('utf-8')).hexdigest()
+    return u"student.dashboard_course_info.{}.{}".format(user.id, digest)
+
+
 @login_required
 @ensure_csrf_cookie
 def dashboard(request):
@@ -451,32 +530,20 @@ def dashboard(request):
         staff_access = True
         errored_courses = modulestore().get_errored_courses()
 
-    show_courseware_links_for = frozenset(course.id for course, _enrollment in course_enrollment_pairs
-                                          if has_access(request.user, course, 'load'))
-
-    course_modes = {course.id: complete_course_mode_info(course.id, enrollment) for course, enrollment in course_enrollment_pairs}
-    cert_statuses = {course.id: cert_info(request.user, course) for course, _enrollment in course_enrollment_pairs}
-
-    # only show email settings for Mongo course and when bulk email is turned on
-    show_email_settings_for = frozenset(
-        course.id for course, _enrollment in course_enrollment_pairs if (
-            settings.FEATURES['ENABLE_INSTRUCTOR_EMAIL'] and
-            modulestore().get_modulestore_type(course.id) != XML_MODULESTORE_TYPE and
-            CourseAuthorization.instructor_email_enabled(course.id)
-        )
-    )
+    # The per-course information is cached briefly, so reloading the dashboard
+    # doesn't look up everything about every course again.
+    cache_key = _dashboard_course_info_cache_key(user, course_enrollment_pairs)
+    course_info = cache.get(cache_key) if settings.DASHBOARD_CACHE_TIMEOUT else None
+    if course_info is None:
+        course_info = dashboard_course_info(user, course_enrollment_pairs)
+        if settings.DASHBOARD_CACHE_TIMEOUT:
+            cache.set(cache_key, course_info, settings.DASHBOARD_CACHE_TIMEOUT)
+    reverifications = course_info['reverifications']
 
     # Verification Attempts
     # Used to generate the "you must reverify for course x" banner
     verification_status, verification_msg = SoftwareSecurePhotoVerification.user_status(user)
 
-    # Gets data for midcourse reverifications, if any are necessary or have failed
-    statuses = ["approved", "denied", "pending", "must_reverify"]
-    reverifications = reverification_info(course_enrollment_pairs, user, statuses)
-
-    show_refund_option_for = frozenset(course.id for course, _enrollment in course_enrollment_pairs
-                                       if _enrollment.refundable())
-
     # get info w.r.t ExternalAuthMap
     external_auth_map = None
     try:
@@ -512,14 +579,14 @@ def dashboard(request):
         'external_auth_map': external_auth_map,
         'staff_access': staff_access,
         'errored_courses': errored_courses,
-        'show_courseware_links_for': show_courseware_links_for,
-        'all_course_modes': course_modes,
-        'cert_statuses': cert_statuses,
-        'show_email_settings_for': show_email_settings_for,
+        'show_courseware_links_for': course_info['show_courseware_links_for'],
+        'all_course_modes': course_info['all_course_modes'],
+        'cert_statuses': course_info['cert_statuses'],
+        'show_email_settings_for': course_info['show_email_settings_for'],
         'reverifications': reverifications,
         'verification_status': verification_status,
         'verification_msg': verification_msg,
-        'show_refund_option_for': show_refund_option_for,
+        'show_refund_option_for': course_info['show_refund_option_for'],
         'denied_banner': denied_banner,
         'billing_email': settings.PAYMENT_SUPPORT_EMAIL,
         'language_options': language_options,
@@ -26,3 +26,11 @@ class BaseBackend(object):
     def send(self, event):
         """Send event to tracker."""
         pass
+
+    def send_many(self, events):
+        """
+        Send several events to tracker. Backends which can write a
+        batch more cheaply than one event at a time should override it.
+        """
+        for event in events:
+            self.send(event)
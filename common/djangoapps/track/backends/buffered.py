@@ -0,0 +1,155 @@
+"""
+Event tracker backend that buffers events in memory and hands them to
+another backend in batches from a background thread, so the request
+doesn't wait on the (typically remote) write.
+
+Configure it by wrapping the backend which does the writing::
+
+  TRACKING_BACKENDS = {
+      'mongo': {
+          'ENGINE': 'track.backends.buffered.BufferedBackend',
+          'OPTIONS': {
+              'backend': {
+                  'ENGINE': 'track.backends.mongodb.MongoBackend',
+                  'OPTIONS': {...}
+              },
+              'batch_size': 100,
+              'flush_interval': 1.0,
+          }
+      }
+  }
+
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import logging
+import os
+import threading
+import time
+from Queue import Queue, Empty, Full
+
+from track.backends import BaseBackend
+
+
+log = logging.getLogger(__name__)
+
+
+class BufferedBackend(BaseBackend):
+    """
+    Queues events and sends them to the wrapped backend's `send_many`
+    once `batch_size` events are waiting or `flush_interval` seconds
+    have passed.
+
+    The queue holds at most `max_queue_size` events. When it's full,
+    `send` waits up to `enqueue_timeout` seconds for room and then
+    sends the event itself, which slows callers down to the rate the
+    wrapped backend can take rather than dropping events or growing
+    without bound.
+    """
+    def __init__(self, backend, batch_size=100, flush_interval=1.0, max_queue_size=10000,
+                 enqueue_timeout=0.1, **kwargs):
+        """
+        :Parameters:
+
+          - `backend`: dict with the `ENGINE` and `OPTIONS` of the
+            backend to send the events to
+          - `batch_size`: most events to send at once
+          - `flush_interval`: most seconds an event waits in the queue
+          - `max_queue_size`: most events to hold in memory
+          - `enqueue_timeout`: seconds to wait for room in a full queue
+
+        """
+        super(BufferedBackend, self).__init__(**kwargs)
+
+        # imported here because the tracker instantiates this backend while it's being imported
+        from track.tracker import _instantiate_backend_from_name  # pylint: disable=protected-access
+        self.backend = _instantiate_backend_from_name(backend['ENGINE'], backend.get('OPTIONS', {}))
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+
+        atexit.register(self.flush)
+
+    def send(self, event):
+        """Queue the event to be sent by the background thread."""
+        queue = self._ensure_worker()
+        try:
+            queue.put(event, True, self.enqueue_timeout)
+        except Full:
+            self._send_batch([event])
+
+    def _ensure_worker(self):
+        """
+        Return the queue, starting the background thread if this
+        process doesn't have one yet. Threads don't survive a fork, so
+        the thread is started on first use rather than at import.
+        """
+        if self._pid != os.getpid() or not self._worker.is_alive():
+            with self._lock:
+                if self._pid != os.getpid() or not self._worker.is_alive():
+                    if self._pid != os.getpid():
+                        self._queue = Queue(self.max_queue_size)
+                    self._worker = threading.Thread(target=self._run, name='track-buffered-backend')
+                    self._worker.daemon = True
+                    self._worker.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self):
+        """Send batches from the queue until told to stop by a None."""
+        queue = self._queue
+        while True:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    event = queue.get(True, max(deadline - time.time(), 0))
+                except Empty:
+                    break
+                if event is None:
+                    stop = True
+                    break
+                batch.append(event)
+            if batch:
+                self._send_batch(batch)
+            if stop:
+                return
+
+    def _send_batch(self, batch):
+        """Send the events to the wrapped backend; a failure loses them."""
+        try:
+            self.backend.send_many(batch)
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Error sending %d events to the buffered event tracker backend', len(batch))
+
+    def flush(self):
+        """
+        Send all the queued events before returning. Registered to run
+        at process exit.
+        """
+        if self._pid != os.getpid():
+            return
+        if self._worker.is_alive():
+            # let the thread send what it has collected and stop
+            self._queue.put(None)
+            self._worker.join()
+        batch = []
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except Empty:
+                break
+            if event is not None:
+                batch.append(event)
+        for start in xrange(0, len(batch), self.batch_size):
+            self._send_batch(batch[start:start + self.batch_size])
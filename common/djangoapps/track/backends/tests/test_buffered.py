@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+
+from Queue import Queue
+
+from mock import patch
+
+from django.test import TestCase
+
+from track.backends.buffered import BufferedBackend
+from track.tests.test_tracker import DummyBackend
+
+
+WRAPPED_BACKEND = {
+    'ENGINE': 'track.tests.test_tracker.DummyBackend',
+}
+
+
+class TestBufferedBackend(TestCase):
+    def _make_backend(self, **options):
+        backend = BufferedBackend(WRAPPED_BACKEND, **options)
+        self.assertIsInstance(backend.backend, DummyBackend)
+        backend.backend = BatchRecordingBackend()
+        return backend
+
+    def test_flush_sends_queued_events(self):
+        backend = self._make_backend(batch_size=2, flush_interval=60)
+        events = [{'test': i} for i in xrange(5)]
+        for event in events:
+            backend.send(event)
+
+        backend.flush()
+
+        sent = [event for batch in backend.backend.batches for event in batch]
+        self.assertEqual(sent, events)
+        self.assertTrue(all(len(batch) <= 2 for batch in backend.backend.batches))
+
+    def test_full_queue_sends_synchronously(self):
+        backend = self._make_backend(max_queue_size=1, enqueue_timeout=0)
+        full_queue = Queue(1)
+        full_queue.put({'test': 0})
+
+        with patch.object(backend, '_ensure_worker', return_value=full_queue):
+            backend.send({'test': 1})
+
+        self.assertEqual(backend.backend.batches, [[{'test': 1}]])
+
+
+class BatchRecordingBackend(DummyBackend):
+    """Records the batches it's sent"""
+    def __init__(self, **options):
+        super(BatchRecordingBackend, self).__init__(**options)
+        self.batches = []
+
+    def send_many(self, events):
+        self.batches.append(list(events))
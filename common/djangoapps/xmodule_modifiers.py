@@ -114,6 +114,15 @@ def replace_course_urls(course_id, block, view, frag, context):  # pylint: disab
     return wrap_fragment(frag, static_replace.replace_course_urls(frag.content, course_id))
 
 
+def rewrite_urls(url_rewriter, block, view, frag, context):  # pylint: disable=unused-argument
+    """
+    Updates the supplied module with a new get_html function that wraps
+    the old get_html function and rewrites its /static/, /course/ and
+    /jump_to_id/ urls in one pass with the given static_replace.UrlRewriter
+    """
+    return wrap_fragment(frag, url_rewriter.rewrite(frag.content))
+
+
 def replace_static_urls(data_dir, block, view, frag, context, course_id=None, static_asset_path=''):  # pylint: disable=unused-argument
     """
     Updates the supplied module with a new get_html function that wraps
@@ -2,11 +2,19 @@
 Parser and evaluator for FormulaResponse and NumericalResponse
 
 Uses pyparsing to parse. Main function as of now is evaluator().
+
+Expressions are parsed once with a grammar shared by all parses, and compiled
+into functions (see `compile_expression`) which are kept for reuse; a compiled
+expression can evaluate all the samples of a formula check in one pass over
+numpy arrays.
 """
 
 import math
 import operator
 import numbers
+import threading
+from collections import OrderedDict
+
 import numpy
 import scipy.constants
 import functions
@@ -72,6 +80,16 @@ SUFFIXES = {
     'c': 1e-2, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9, 'p': 1e-12
 }
 
+# The default functions which give the same results for numpy arrays of
+# arguments as for each argument on its own. arccot branches on the sign of
+# its argument, which an array doesn't have.
+VECTORIZABLE_FUNCTIONS = frozenset(
+    func for func in DEFAULT_FUNCTIONS.values() if func not in (math.factorial, functions.arccot)
+)
+
+# How many compiled expressions to keep.
+COMPILED_EXPRESSION_CACHE_SIZE = 1000
+
 
 class UndefinedVariable(Exception):
     """
@@ -228,34 +246,305 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
-    # Parse the tree.
-    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
-    math_interpreter.parse_algebra()
+    return compile_expression(math_expr, case_sensitive).evaluate(variables, functions)
+
 
-    # Get our variables together.
-    all_variables, all_functions = add_defaults(variables, functions, case_sensitive)
+def evaluator_samples(variables_list, functions, math_expr, case_sensitive=False):
+    """
+    Evaluate an expression for each dictionary of variables in
+    `variables_list`; return the list of results.
+
+    Gives the same results as calling `evaluator` for each of them, but
+    parses the expression only once and, where it can, evaluates all the
+    samples at once.
+    """
+    if math_expr.strip() == "":
+        return [float('nan')] * len(variables_list)
 
-    # ...and check them
-    math_interpreter.check_variables(all_variables, all_functions)
+    return compile_expression(math_expr, case_sensitive).evaluate_samples(variables_list, functions)
 
-    # Create a recursion to evaluate the tree.
-    if case_sensitive:
-        casify = lambda x: x
-    else:
-        casify = lambda x: x.lower()  # Lowercase for case insens.
 
-    evaluate_actions = {
-        'number': eval_number,
-        'variable': lambda x: all_variables[casify(x[0])],
-        'function': lambda x: all_functions[casify(x[0])](x[1]),
-        'atom': eval_atom,
-        'power': eval_power,
-        'parallel': eval_parallel,
-        'product': eval_product,
-        'sum': eval_sum
-    }
+_COMPILED_EXPRESSIONS = OrderedDict()
+_COMPILED_EXPRESSIONS_LOCK = threading.Lock()
+
 
-    return math_interpreter.reduce_tree(evaluate_actions)
+def compile_expression(math_expr, case_sensitive=False):
+    """
+    Return the `CompiledExpression` of `math_expr`, reusing those of recently
+    compiled expressions.
+    """
+    key = (math_expr, case_sensitive)
+    with _COMPILED_EXPRESSIONS_LOCK:
+        compiled = _COMPILED_EXPRESSIONS.pop(key, None)
+        if compiled is not None:
+            _COMPILED_EXPRESSIONS[key] = compiled
+            return compiled
+
+    compiled = CompiledExpression(math_expr, case_sensitive)
+    with _COMPILED_EXPRESSIONS_LOCK:
+        _COMPILED_EXPRESSIONS[key] = compiled
+        while len(_COMPILED_EXPRESSIONS) > COMPILED_EXPRESSION_CACHE_SIZE:
+            _COMPILED_EXPRESSIONS.popitem(last=False)
+    return compiled
+
+
+# The following few functions compile the nodes of a parse tree into functions
+# of the (casified) variables and functions dictionaries. They do the same as
+# the evaluation actions above, in the same order, but work for numpy arrays
+# of values as well as for numbers.
+
+def compile_number(parse_result):
+    """
+    A number is a constant.
+    """
+    value = eval_number(parse_result)
+    return lambda variables, functions: value
+
+
+def compile_atom(parse_result):
+    """
+    An atom is the compiled node it wraps (dropping any parentheses).
+    """
+    return next(k for k in parse_result if callable(k))
+
+
+def compile_power(parse_result):
+    """
+    Exponentiate right to left, like `eval_power`.
+    """
+    operands = [k for k in parse_result if callable(k)]
+    if len(operands) == 1:
+        return operands[0]
+    operands.reverse()
+
+    def power(variables, functions):
+        """Raise the operands to the power of those after them."""
+        return reduce(lambda a, b: b ** a, [operand(variables, functions) for operand in operands])
+    return power
+
+
+def compile_parallel(parse_result):
+    """
+    Combine with the parallel resistors operator, like `eval_parallel`.
+    """
+    operands = [k for k in parse_result if callable(k)]
+    if len(operands) == 1:
+        return operands[0]
+
+    def parallel(variables, functions):
+        """
+        Return NaN if an operand is zero. An array containing a zero fails
+        to divide, so its samples get evaluated one at a time instead.
+        """
+        values = [operand(variables, functions) for operand in operands]
+        if any(numpy.ndim(value) == 0 and value == 0 for value in values):
+            return float('nan')
+        return 1. / sum(1. / value for value in values)
+    return parallel
+
+
+def _compile_chain(parse_result, initial, operators):
+    """
+    Compile a chain of operands joined by the operators named in
+    `operators`, applied to `initial` from left to right.
+    """
+    steps = []
+    current_op = operators[None]
+    for token in parse_result:
+        if callable(token):
+            steps.append((current_op, token))
+        else:
+            current_op = operators[token]
+
+    def chain(variables, functions):
+        """Apply the operators in turn."""
+        result = initial
+        for op, operand in steps:
+            result = op(result, operand(variables, functions))
+        return result
+    return chain
+
+
+def compile_sum(parse_result):
+    """
+    Add the operands, like `eval_sum`.
+    """
+    return _compile_chain(parse_result, 0.0, {None: operator.add, '+': operator.add, '-': operator.sub})
+
+
+def compile_product(parse_result):
+    """
+    Multiply the operands, like `eval_product`.
+    """
+    return _compile_chain(parse_result, 1.0, {None: operator.mul, '*': operator.mul, '/': operator.truediv})
+
+
+class CompiledExpression(object):
+    """
+    A math expression parsed and compiled into a function of the values of
+    its variables and functions.
+    """
+    def __init__(self, math_expr, case_sensitive=False):
+        """
+        Parse and compile `math_expr`. Raises a pyparsing.ParseException if
+        it can't be parsed.
+        """
+        self.math_expr = math_expr
+        self.case_sensitive = case_sensitive
+        if case_sensitive:
+            casify = lambda x: x
+        else:
+            casify = lambda x: x.lower()  # Lowercase for case insens.
+
+        math_interpreter = ParseAugmenter(math_expr, case_sensitive)
+        math_interpreter.parse_algebra()
+        self.parsed = math_interpreter
+        self.variables = frozenset(casify(var) for var in math_interpreter.variables_used)
+        self.functions = frozenset(casify(func) for func in math_interpreter.functions_used)
+
+        def compile_variable(parse_result):
+            """Look the variable up."""
+            name = casify(parse_result[0])
+            return lambda variables, functions: variables[name]
+
+        def compile_function(parse_result):
+            """Look the function up and call it."""
+            name = casify(parse_result[0])
+            argument = parse_result[1]
+            return lambda variables, functions: functions[name](argument(variables, functions))
+
+        self.function = math_interpreter.reduce_tree({
+            'number': compile_number,
+            'variable': compile_variable,
+            'function': compile_function,
+            'atom': compile_atom,
+            'power': compile_power,
+            'parallel': compile_parallel,
+            'product': compile_product,
+            'sum': compile_sum
+        })
+
+    def evaluate(self, variables, functions):
+        """
+        Evaluate the expression with these variables and functions (in
+        addition to the defaults), like `evaluator`.
+        """
+        all_variables, all_functions = add_defaults(variables, functions, self.case_sensitive)
+        self.parsed.check_variables(all_variables, all_functions)
+        return self.function(all_variables, all_functions)
+
+    def evaluate_samples(self, variables_list, functions):
+        """
+        Evaluate the expression for each of the dictionaries of variables in
+        `variables_list`, like `evaluator_samples`.
+
+        When the expression uses only the default functions (other than the
+        factorials and arccot) and float or complex variables, the samples are evaluated
+        at once, as numpy arrays of the values which differ between them.
+        Wherever numpy would give a different result than Python (e.g., where
+        Python raises ZeroDivisionError), it raises a FloatingPointError
+        instead, and the samples are evaluated one at a time.
+        """
+        all_functions = add_defaults({}, functions, self.case_sensitive)[1]
+        all_variables_list = []
+        for variables in variables_list:
+            all_variables = add_defaults(variables, {}, self.case_sensitive)[0]
+            self.parsed.check_variables(all_variables, all_functions)
+            all_variables_list.append(all_variables)
+
+        if len(all_variables_list) > 1:
+            results = self._evaluate_vectorized(all_variables_list, all_functions)
+            if results is not None:
+                return results
+        return [self.function(all_variables, all_functions) for all_variables in all_variables_list]
+
+    def _evaluate_vectorized(self, all_variables_list, all_functions):
+        """
+        Evaluate the samples at once, or return None if that isn't possible.
+        """
+        if not all(all_functions[func] in VECTORIZABLE_FUNCTIONS for func in self.functions):
+            return None
+
+        vectorized = {}
+        for var in self.variables:
+            values = [all_variables[var] for all_variables in all_variables_list]
+            if not all(isinstance(value, (float, complex)) for value in values):
+                return None
+            if values.count(values[0]) == len(values):
+                vectorized[var] = values[0]
+            else:
+                vectorized[var] = numpy.array(values)
+
+        try:
+            with numpy.errstate(divide='raise', over='raise', invalid='raise'):
+                result = self.function(vectorized, all_functions)
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+        if numpy.ndim(result) == 0:
+            return [result] * len(all_variables_list)
+        return list(result)
+
+
+def build_algebra_grammar():
+    """
+    Return the pyparsing grammar of algebraic expressions.
+
+    It has no parse actions, so one grammar (`ALGEBRA_GRAMMAR`) serves every
+    parse.
+    """
+    # 0.33 or 7 or .34 or 16.
+    number_part = Word(nums)
+    inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
+    # pyparsing allows spaces between tokens--`Combine` prevents that.
+    inner_number = Combine(inner_number)
+
+    # SI suffixes and percent.
+    number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
+
+    # 0.33k or 17
+    plus_minus = Literal('+') | Literal('-')
+    number = Group(
+        Optional(plus_minus) +
+        inner_number +
+        Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
+        Optional(number_suffix)
+    )
+    number = number("number")
+
+    # Predefine recursive variables.
+    expr = Forward()
+
+    # Handle variables passed in. They must start with letters/underscores
+    # and may contain numbers afterward.
+    inner_varname = Word(alphas + "_", alphanums + "_")
+    varname = Group(inner_varname)("variable")
+
+    # Same thing for functions.
+    function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
+
+    atom = number | function | varname | "(" + expr + ")"
+    atom = Group(atom)("atom")
+
+    # Do the following in the correct order to preserve order of operation.
+    pow_term = atom + ZeroOrMore("^" + atom)
+    pow_term = Group(pow_term)("power")
+
+    par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
+    par_term = Group(par_term)("parallel")
+
+    prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
+    prod_term = Group(prod_term)("product")
+
+    sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
+    sum_term = Group(sum_term)("sum")
+
+    # Finish the recursion.
+    expr << sum_term  # pylint: disable=W0104
+    return expr + stringEnd
+
+
+ALGEBRA_GRAMMAR = build_algebra_grammar()
 
 
 class ParseAugmenter(object):
@@ -278,23 +567,6 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
-
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
-
     def parse_algebra(self):
         """
         Parse an algebraic expression into a tree.
@@ -302,62 +574,29 @@ class ParseAugmenter(object):
         Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
         reflect parenthesis and order of operations. Leave all operators in the
         tree and do not parse any strings of numbers into their float versions.
+        Collect the names of the variables and functions in the tree into
+        `self.variables_used` and `self.functions_used`.
 
         Adding the groups and result names makes the `repr()` of the result
         really gross. For debugging, use something like
           print OBJ.tree.asXML()
         """
-        # 0.33 or 7 or .34 or 16.
-        number_part = Word(nums)
-        inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
-        # pyparsing allows spaces between tokens--`Combine` prevents that.
-        inner_number = Combine(inner_number)
-
-        # SI suffixes and percent.
-        number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
-
-        # 0.33k or 17
-        plus_minus = Literal('+') | Literal('-')
-        number = Group(
-            Optional(plus_minus) +
-            inner_number +
-            Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
-            Optional(number_suffix)
-        )
-        number = number("number")
-
-        # Predefine recursive variables.
-        expr = Forward()
-
-        # Handle variables passed in. They must start with letters/underscores
-        # and may contain numbers afterward.
-        inner_varname = Word(alphas + "_", alphanums + "_")
-        varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
-
-        # Same thing for functions.
-        function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
-
-        atom = number | function | varname | "(" + expr + ")"
-        atom = Group(atom)("atom")
-
-        # Do the following in the correct order to preserve order of operation.
-        pow_term = atom + ZeroOrMore("^" + atom)
-        pow_term = Group(pow_term)("power")
-
-        par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
-        par_term = Group(par_term)("parallel")
-
-        prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
-        prod_term = Group(prod_term)("product")
-
-        sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
-        sum_term = Group(sum_term)("sum")
-
-        # Finish the recursion.
-        expr << sum_term  # pylint: disable=W0104
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        self.tree = ALGEBRA_GRAMMAR.parseString(self.math_expr)[0]
+
+        def collect_names(node):
+            """
+            Add the names of the variables and functions under `node`.
+            """
+            node_name = node.getName()
+            if node_name == 'variable':
+                self.variables_used.add(node[0])
+            elif node_name == 'function':
+                self.functions_used.add(node[0])
+            for child in node:
+                if isinstance(child, ParseResults):
+                    collect_names(child)
+
+        collect_names(self.tree)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
@@ -558,3 +558,40 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+    def test_compiled_expressions_reused(self):
+        """
+        Check that an expression is only compiled once for each case sensitivity
+        """
+        compiled = calc.compile_expression("x^2 + 1")
+        self.assertIs(compiled, calc.compile_expression("x^2 + 1"))
+        self.assertIsNot(compiled, calc.compile_expression("x^2 + 1", case_sensitive=True))
+
+    def test_evaluator_samples(self):
+        """
+        Check that evaluating samples together gives what `evaluator` gives for each
+        """
+        samples = [{'x': 0.5, 'y': 2.0}, {'x': -1.5, 'y': 2.0}, {'x': 3.0, 'y': 2.0}]
+        functions = {'f': lambda z: z * 2}
+        exprs = ("-x^2 + 3*y - x", "sin(x)/y", "x || y", "y || (x - x)", "fact(3)*x", "f(x)", "2k", "arccot(x)", "")
+        for expr in exprs:
+            expected = [calc.evaluator(sample, functions, expr) for sample in samples]
+            results = calc.evaluator_samples(samples, functions, expr)
+            self.assertEqual(len(results), len(samples))
+            for result, value in zip(results, expected):
+                if numpy.isnan(value):
+                    self.assertTrue(numpy.isnan(result))
+                else:
+                    self.assertAlmostEqual(result, value)
+
+    def test_evaluator_samples_errors(self):
+        """
+        Check that evaluating samples together raises what `evaluator` raises
+        """
+        samples = [{'x': 1.0}, {'x': 0.0}]
+        with self.assertRaises(ZeroDivisionError):
+            calc.evaluator_samples(samples, {}, "1/x")
+        with self.assertRaises(ValueError):
+            calc.evaluator_samples(samples, {}, "(x - 1)^0.5")
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'y'):
+            calc.evaluator_samples(samples, {}, "x + y")
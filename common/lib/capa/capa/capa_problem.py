@@ -13,10 +13,13 @@ Main module which shows problems (of "capa" type).
 This is used by capa_module.
 """
 
+from collections import OrderedDict
 from datetime import datetime
+import hashlib
 import logging
 import os.path
 import re
+import threading
 
 from lxml import etree
 from xml.sax.saxutils import unescape
@@ -57,8 +60,57 @@ html_problem_semantics = [
     "openendedrubric",
 ]
 
+# how many parsed problems, and contexts made by their scripts, each process keeps
+PROBLEM_TEMPLATE_CACHE_SIZE = 500
+PROBLEM_CONTEXT_CACHE_SIZE = 2000
+
 log = logging.getLogger(__name__)
 
+
+class _BoundedCache(object):
+    """
+    A thread-safe dict that forgets its least recently used entries beyond `size`.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value for key, or None."""
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+            return value
+
+    def set(self, key, value):
+        """Remember value for key."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class ProblemTemplate(object):
+    """
+    The parts of a LoncapaProblem which depend only on its text: the tree
+    (with its includes included), and the code and python path of its scripts.
+    Problems are made from copies of it, and it is never changed.
+    """
+    def __init__(self, problem_text, tree, script_code, python_path):
+        self.problem_text = problem_text
+        self.tree = tree
+        self.script_code = script_code
+        self.python_path = python_path
+
+
+# ProblemTemplates by the hash of the problem text and where its files are (for problems without includes)
+_PROBLEM_TEMPLATES = _BoundedCache(PROBLEM_TEMPLATE_CACHE_SIZE)
+# Contexts made by running problems' scripts, by the template's key and the seed
+_PROBLEM_CONTEXTS = _BoundedCache(PROBLEM_CONTEXT_CACHE_SIZE)
+
 #-----------------------------------------------------------------------------
 # main class for this module
 
@@ -151,19 +203,28 @@ class LoncapaProblem(object):
         self.done = state.get('done', False)
         self.input_state = state.get('input_state', {})
 
-        # Convert startouttext and endouttext to proper <text></text>
-        problem_text = re.sub(r"startouttext\s*/", "text", problem_text)
-        problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
-        self.problem_text = problem_text
-
-        # parse problem XML file into an element tree
-        self.tree = etree.XML(problem_text)
-
-        # handle any <include file="foo"> tags
-        self._process_includes()
+        # Parse the problem, or copy the parse of the same text done for an earlier problem
+        if isinstance(problem_text, unicode):
+            problem_text = problem_text.encode('utf-8')
+        # Included files can change without the problem text changing, so
+        # problems with includes are parsed every time.
+        if '<include' in problem_text:
+            template_key = None
+            template = self._make_template(problem_text)
+        else:
+            template_key = (
+                hashlib.md5(problem_text).hexdigest(),
+                getattr(self.capa_system.filestore, 'root_path', None),
+            )
+            template = _PROBLEM_TEMPLATES.get(template_key)
+            if template is None:
+                template = self._make_template(problem_text)
+                _PROBLEM_TEMPLATES.set(template_key, template)
+        self.problem_text = template.problem_text
+        self.tree = deepcopy(template.tree)
 
         # construct script processor context (eg for customresponse problems)
-        self.context = self._extract_context(self.tree)
+        self.context = self._get_context(template, template_key)
 
         # Pre-parse the XML tree: modifies it to add ID's and perform some in-place
         # transformations.  This also creates the dict (self.responders) of Response
@@ -528,6 +589,46 @@ class LoncapaProblem(object):
 
         return path
 
+    def _make_template(self, problem_text):
+        """
+        Parse problem_text into a ProblemTemplate.
+        """
+        # Convert startouttext and endouttext to proper <text></text>
+        problem_text = re.sub(r"startouttext\s*/", "text", problem_text)
+        problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
+
+        # parse problem XML file into an element tree
+        self.tree = etree.XML(problem_text)
+
+        # handle any <include file="foo"> tags
+        self._process_includes()
+
+        script_code, python_path = self._extract_script(self.tree)
+        return ProblemTemplate(problem_text, self.tree, script_code, python_path)
+
+    def _get_context(self, template, template_key):
+        """
+        Return a copy of the context made by running the template's scripts with this
+        problem's seed, running them only if that hasn't been done already. Templates
+        which aren't cached (`template_key` is None) always run their scripts.
+        """
+        if not template.script_code or template_key is None:
+            return self._execute_script(template.script_code, template.python_path)
+
+        unsafely = self.capa_system.can_execute_unsafe_code()
+        context_key = (template_key, self.seed, unsafely)
+        context = _PROBLEM_CONTEXTS.get(context_key)
+        if context is None:
+            context = self._execute_script(template.script_code, template.python_path)
+            try:
+                _PROBLEM_CONTEXTS.set(context_key, deepcopy(context))
+            except Exception:  # pylint: disable=broad-except
+                # scripts run unsafely can leave things which can't be copied
+                pass
+            return context
+        # responses can change their context (e.g. by running check functions in it)
+        return deepcopy(context)
+
     def _extract_context(self, tree):
         """
         Extract content of <script>...</script> from the problem.xml file, and exec it in the
@@ -536,8 +637,13 @@ class LoncapaProblem(object):
 
         Problem XML goes to Python execution context. Runs everything in script tags.
         """
-        context = {}
-        context['seed'] = self.seed
+        return self._execute_script(*self._extract_script(tree))
+
+    def _extract_script(self, tree):
+        """
+        Return the code of the <script>...</script>s in tree, and the python path
+        it should run with.
+        """
         all_code = ''
 
         python_path = []
@@ -560,6 +666,15 @@ class LoncapaProblem(object):
             code = unescape(script.text, XMLESC)
             all_code += code
 
+        return all_code, python_path
+
+    def _execute_script(self, all_code, python_path):
+        """
+        Run the script code with this problem's seed; return the resulting context.
+        """
+        context = {}
+        context['seed'] = self.seed
+
         if all_code:
             try:
                 safe_exec(
@@ -578,7 +693,7 @@ class LoncapaProblem(object):
 
         # Store code source in context, along with the Python path needed to run it correctly.
         context['script_code'] = all_code
-        context['python_path'] = python_path
+        context['python_path'] = list(python_path)
         return context
 
     def _extract_html(self, problemtree):  # private
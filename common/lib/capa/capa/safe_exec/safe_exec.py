@@ -3,6 +3,7 @@
 from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
+from codejail.jail_code import is_configured
 from . import lazymod
 from dogapi import dog_stats_api
 
@@ -46,6 +47,23 @@ for name, modname in ASSUMED_IMPORTS:
 
 LAZY_IMPORTS = "".join(LAZY_IMPORTS)
 
+# A pool of warm sandboxes to run code in, if configure_worker_pool was called.
+WORKER_POOL = None
+
+
+def configure_worker_pool(size, max_jobs):
+    """
+    Run sandboxed code in a pool of `size` pre-started sandbox processes which
+    have already imported the ASSUMED_IMPORTS, instead of starting a new
+    sandbox for each execution.  Each worker is replaced after `max_jobs`
+    executions.  Has no effect unless CodeJail is configured for python.
+
+    """
+    global WORKER_POOL  # pylint: disable=global-statement
+    from .worker_pool import SandboxWorkerPool
+    preload = ["random"] + [modname for _, modname in ASSUMED_IMPORTS]
+    WORKER_POOL = SandboxWorkerPool(size, max_jobs, preload=preload)
+
 
 def update_hash(hasher, obj):
     """
@@ -116,6 +134,8 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     # Decide which code executor to use.
     if unsafely:
         exec_fn = codejail_not_safe_exec
+    elif WORKER_POOL is not None and is_configured("python"):
+        exec_fn = WORKER_POOL.safe_exec
     else:
         exec_fn = codejail_safe_exec
 
@@ -7,9 +7,12 @@ import random
 import textwrap
 import unittest
 
+from mock import patch
 from nose.plugins.skip import SkipTest
 
 from capa.safe_exec import safe_exec, update_hash
+from capa.safe_exec import worker_pool
+from capa.safe_exec.worker_pool import SandboxWorkerPool
 from codejail.safe_exec import SafeExecException
 from codejail.jail_code import is_configured
 
@@ -90,6 +93,60 @@ class TestSafeOrNot(unittest.TestCase):
         self.assertEqual(g['files'], os.listdir('/'))
 
 
+class TestSandboxWorkerPool(unittest.TestCase):
+    """Test running code in warm sandboxes."""
+
+    def setUp(self):
+        # The pool runs the configured sandbox python, so it needs CodeJail.
+        if not is_configured("python"):
+            raise SkipTest
+        self.pool = SandboxWorkerPool(1, 2, preload=["math"])
+
+    def tearDown(self):
+        for worker in self.pool._idle:  # pylint: disable=protected-access
+            worker.close()
+
+    def test_set_values(self):
+        g = {'b': 3}
+        self.pool.safe_exec("import math; a = int(math.pi) + b", g)
+        self.assertEqual(g['a'], 6)
+
+    def test_jobs_dont_share_state(self):
+        g = {}
+        self.pool.safe_exec("import math; math.leftover = 17", g)
+        self.pool.safe_exec("import math; a = hasattr(math, 'leftover')", g)
+        self.assertFalse(g['a'])
+
+    def test_raising_exceptions_keeps_worker(self):
+        self.pool.max_jobs = 10
+        self.pool.safe_exec("a = 1", {})
+        worker = self.pool._idle[0]  # pylint: disable=protected-access
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.safe_exec("1/0", {})
+        self.assertIn("ZeroDivisionError", cm.exception.message)
+        self.assertIs(self.pool._idle[0], worker)  # pylint: disable=protected-access
+
+    def test_recycled_after_max_jobs(self):
+        self.pool.safe_exec("a = 1", {})
+        worker = self.pool._idle[0]  # pylint: disable=protected-access
+        self.pool.safe_exec("a = 1", {})
+        self.assertIsNot(self.pool._idle[0], worker)  # pylint: disable=protected-access
+
+    def test_cant_do_something_forbidden(self):
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.safe_exec("import os; files = os.listdir('/')", {})
+        self.assertIn("OSError", cm.exception.message)
+
+    def test_worker_that_cant_isolate_itself_isnt_used(self):
+        failing_startup = 'import os\nos.write(2, \'{"ready": false, "error": "no prctl"}\\n\')\nos._exit(1)\n'
+        with patch.object(worker_pool, "WORKER_CODE", failing_startup):
+            pool = SandboxWorkerPool(1, 2)
+            with self.assertRaises(SafeExecException):
+                pool.safe_exec("a = 1", {})
+        for worker in pool._idle:  # pylint: disable=protected-access
+            worker.close()
+
+
 class DictCache(object):
     """A cache implementation over a simple dict, for testing."""
 
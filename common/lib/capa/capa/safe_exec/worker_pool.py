@@ -0,0 +1,403 @@
+"""
+A pool of warm sandboxed Python processes for running Capa code.
+
+Starting a sandboxed interpreter and importing numpy, scipy and the rest of
+the assumed imports costs far more than most problem code.  Each worker here
+is a long-lived process started exactly the way CodeJail starts one (the
+configured sandbox Python, as the sandbox user, under its AppArmor profile)
+that does those imports once.  Jobs are sent to it over a pipe, and for each
+job the worker forks: the code runs in the fresh child, which drops to the
+same resource limits CodeJail would apply (no subprocesses, no files, CPU and
+memory limits) and is killed when it runs out of real time.  Since every job
+gets its own process, nothing one job does can be seen by the next.
+
+Workers are recycled after `max_jobs` jobs and whenever a job fails other
+than by raising an exception (e.g., it was killed or garbled its result).
+
+Before its first job, a worker reports that it is ready, along with any of
+the preloaded modules which failed to import.  A worker which can't make
+itself undumpable (so that jobs can't ptrace it or reach its files through
+/proc) reports that instead and exits without serving any job.
+
+"""
+
+import inspect
+import json
+import logging
+import os
+import resource
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from codejail import jail_code
+from codejail.safe_exec import json_safe, SafeExecException
+
+log = logging.getLogger(__name__)
+
+# How long to allow a worker to start up and do its imports before deciding
+# it is stuck.
+WORKER_STARTUP_TIME = 10
+
+# The program run by each sandboxed worker.  It keeps one forked child waiting
+# for a job.  The child reads the JSON job from stdin and writes the JSON
+# result to stdout itself, so no job's data ever passes through (and lingers
+# in) the memory of the worker that later children are forked from.  Once the
+# child has exited, the worker reports its exit status as a line on stderr.
+WORKER_CODE = r'''
+import json
+import os
+import resource
+import signal
+import sys
+import time
+import traceback
+from StringIO import StringIO
+
+CONFIG = json.loads(sys.argv[1])
+LIMITS = CONFIG["limits"]
+
+def report_startup(startup):
+    """Write the startup report line to stderr."""
+    line = json.dumps(startup) + "\n"
+    while line:
+        line = line[os.write(2, line):]
+
+preload_errors = []
+for modname in CONFIG["preload"]:
+    try:
+        __import__(modname)
+    except Exception:
+        preload_errors.append(modname + ": " + traceback.format_exc())
+
+try:
+    # Don't let the jobs, which run as the same user, ptrace this process
+    # or reach its file descriptors through /proc.
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.prctl(4, 0, 0, 0, 0) != 0:  # PR_SET_DUMPABLE, 0
+        raise OSError(ctypes.get_errno(), "prctl(PR_SET_DUMPABLE, 0) failed")
+except Exception:
+    report_startup({"ready": False, "error": traceback.format_exc()})
+    os._exit(1)
+
+report_startup({"ready": True, "preload_errors": preload_errors})
+
+%(json_safe)s
+
+def run_job(started_fd):
+    """Read and run one job in this forked child, never returning."""
+    os.close(2)
+    data = ""
+    while not data.endswith("\n"):
+        chunk = os.read(0, 65536)
+        if not chunk:
+            os._exit(3)
+        data += chunk
+    os.close(0)
+    os.write(started_fd, "x")
+    os.close(started_fd)
+
+    out = None
+    try:
+        sys.stdin, sys.stdout, sys.stderr = StringIO(), StringIO(), StringIO()
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+        if LIMITS.get("CPU"):
+            resource.setrlimit(resource.RLIMIT_CPU, (LIMITS["CPU"], LIMITS["CPU"]))
+        if LIMITS.get("VMEM"):
+            resource.setrlimit(resource.RLIMIT_AS, (LIMITS["VMEM"], LIMITS["VMEM"]))
+        job = json.loads(data)
+        os.chdir(job["cwd"])
+        sys.path.extend(job["python_path"])
+        g_dict = job["globals"]
+        try:
+            exec job["code"] in g_dict
+            out = json.dumps({"globals": json_safe(g_dict)})
+        except BaseException:
+            out = json.dumps({"error": traceback.format_exc()})
+    except BaseException:
+        out = json.dumps({"error": traceback.format_exc()})
+    finally:
+        try:
+            out = (out or "") + "\n"
+            while out:
+                out = out[os.write(1, out):]
+        finally:
+            os._exit(0)
+
+def serve_one():
+    """Fork a child for the next job and report on it.  False means stop."""
+    started_r, started_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(started_r)
+        run_job(started_w)
+    os.close(started_w)
+    started = os.read(started_r, 1)
+    os.close(started_r)
+    if not started:
+        # stdin was closed: time to go
+        os.waitpid(pid, 0)
+        return False
+    deadline = time.time() + LIMITS["REALTIME"] if LIMITS.get("REALTIME") else None
+    timed_out = False
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if deadline is not None and time.time() > deadline:
+            timed_out = True
+            os.kill(pid, signal.SIGKILL)
+            _, status = os.waitpid(pid, 0)
+            break
+        time.sleep(0.002)
+    report = json.dumps({"status": status, "timed_out": timed_out}) + "\n"
+    while report:
+        report = report[os.write(2, report):]
+    return True
+
+while serve_one():
+    pass
+'''
+
+
+class SandboxWorkerError(Exception):
+    """A worker stopped responding or behaved unexpectedly."""
+    pass
+
+
+def _set_worker_limits():
+    """
+    Limits for the worker process itself.  The worker runs no course code and
+    needs to be able to fork, so it gets no process limit; each forked child
+    sets the full CodeJail limits before it reads its job's code.
+    """
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    vmem = jail_code.LIMITS.get("VMEM")
+    if vmem:
+        resource.setrlimit(resource.RLIMIT_AS, (vmem, vmem))
+
+
+class SandboxWorker(object):
+    """
+    One warm sandboxed Python process.
+    """
+    def __init__(self, preload):
+        self.jobs = 0
+        self.tmpdir = tempfile.mkdtemp(prefix="codejail-")
+        # The sandbox user needs to be able to read the job directories.
+        os.chmod(self.tmpdir, 0775)
+        config = json.dumps({"preload": preload, "limits": jail_code.LIMITS})
+        code = WORKER_CODE % {"json_safe": inspect.getsource(json_safe)}
+        cmd = jail_code.COMMANDS["python"]["cmdline_start"] + ["-c", code, config]
+        self.process = subprocess.Popen(
+            cmd, cwd=self.tmpdir, env={}, preexec_fn=_set_worker_limits,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+
+    def run(self, code, globals_dict, python_path=None):
+        """
+        Run `code` with `globals_dict` in the worker, updating `globals_dict`
+        with the results.  Raises SafeExecException if the code raised an
+        exception, or SandboxWorkerError if the job or the worker failed in
+        any other way.
+        """
+        if self.jobs == 0:
+            self._wait_for_startup()
+        self.jobs += 1
+        jobdir = tempfile.mkdtemp(dir=self.tmpdir)
+        try:
+            os.chmod(jobdir, 0775)
+            # Like CodeJail, copy the python path into the sandbox's reach.
+            job_path = []
+            for pydir in python_path or ():
+                target = os.path.join(jobdir, os.path.basename(pydir))
+                shutil.copytree(pydir, target)
+                job_path.append(target)
+            job = {
+                "code": code,
+                "globals": json_safe(globals_dict),
+                "python_path": job_path,
+                "cwd": jobdir,
+            }
+            try:
+                self.process.stdin.write(json.dumps(job) + "\n")
+                self.process.stdin.flush()
+            except IOError as exc:
+                raise SandboxWorkerError(str(exc))
+            # Without a real time limit the worker lets the job run as long
+            # as it takes (as CodeJail would), so don't give up on it here.
+            realtime = jail_code.LIMITS.get("REALTIME")
+            timeout = realtime + 1 if realtime else None
+            output, report = self._wait_for_job(timeout)
+        finally:
+            shutil.rmtree(jobdir, ignore_errors=True)
+
+        # Course code which raised an exception leaves the worker as good as
+        # new, but anything else means the job or the worker misbehaved.
+        if report["timed_out"]:
+            raise SandboxWorkerError("ran out of real time")
+        # The child's output has to be exactly one result line.
+        lines = output.split("\n")
+        if report["status"] != 0 or len(lines) != 2 or lines[1]:
+            raise SandboxWorkerError("exited with status %d" % report["status"])
+        try:
+            result = json.loads(lines[0])
+        except ValueError:
+            raise SandboxWorkerError("malformed result")
+        if "error" in result:
+            raise SafeExecException("Couldn't execute jailed code: %s" % result["error"])
+        globals_dict.update(result["globals"])
+
+    def _wait_for_startup(self):
+        """
+        Read the worker's startup report, raising SandboxWorkerError unless it
+        is ready to serve jobs.
+        """
+        deadline = time.time() + WORKER_STARTUP_TIME
+        stderr_fd = self.process.stderr.fileno()
+        line = ""
+        while not line.endswith("\n"):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise SandboxWorkerError("Timed out waiting for the sandbox worker to start")
+            if not select.select([stderr_fd], [], [], remaining)[0]:
+                continue
+            chunk = os.read(stderr_fd, 65536)
+            if not chunk:
+                raise SandboxWorkerError("The sandbox worker exited while starting")
+            line += chunk
+        try:
+            startup = json.loads(line)
+        except ValueError:
+            raise SandboxWorkerError("Malformed startup report from the sandbox worker")
+        if not startup.get("ready"):
+            log.error("Sandbox worker couldn't start: %s", startup.get("error"))
+            raise SandboxWorkerError("The sandbox worker couldn't isolate itself")
+        for error in startup.get("preload_errors", ()):
+            log.warning("Sandbox worker couldn't preload %s", error)
+
+    def _wait_for_job(self, timeout):
+        """
+        Collect the job's output until the worker reports that the child has
+        exited, waiting at most `timeout` seconds (or for as long as it takes,
+        if `timeout` is None).  Returns the output and the parsed report.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        stdout_fd = self.process.stdout.fileno()
+        stderr_fd = self.process.stderr.fileno()
+        output = []
+        report = ""
+        while not report.endswith("\n"):
+            remaining = deadline - time.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise SandboxWorkerError("Timed out waiting for the sandbox worker")
+            ready, _, _ = select.select([stdout_fd, stderr_fd], [], [], remaining)
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise SandboxWorkerError("The sandbox worker exited")
+                if fd == stdout_fd:
+                    output.append(chunk)
+                else:
+                    report += chunk
+        # The child is gone, so whatever else it wrote is already in the pipe.
+        while select.select([stdout_fd], [], [], 0)[0]:
+            chunk = os.read(stdout_fd, 65536)
+            if not chunk:
+                break
+            output.append(chunk)
+        try:
+            return "".join(output), json.loads(report)
+        except ValueError:
+            raise SandboxWorkerError("Malformed report from the sandbox worker")
+
+    def close(self):
+        """Stop the worker.  Closing its stdin makes it exit."""
+        try:
+            self.process.stdin.close()
+            self.process.stdout.close()
+            self.process.stderr.close()
+        except IOError:
+            pass
+        if self.process.poll() is None:
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+        # Reap it in the background so a slow exit doesn't hold up the request.
+        reaper = threading.Thread(target=self.process.wait)
+        reaper.daemon = True
+        reaper.start()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class SandboxWorkerPool(object):
+    """
+    Keeps up to `size` idle warm workers, each used for at most `max_jobs` jobs.
+
+    Workers belong to the process which started them, so a forked copy of the
+    pool (e.g., in a pre-forking web server) starts its own.
+    """
+    def __init__(self, size, max_jobs, preload=()):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.preload = list(preload)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _checkout(self):
+        """Get an idle worker, starting the pool's workers in a new process."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Workers inherited from a parent process aren't ours to use.
+                self._idle = [SandboxWorker(self.preload) for _ in xrange(self.size)]
+                self._pid = os.getpid()
+            if self._idle:
+                return self._idle.pop()
+        return SandboxWorker(self.preload)
+
+    def _checkin(self, worker):
+        """Return a worker to the pool, replacing it if it's done its share of jobs."""
+        if worker.jobs >= self.max_jobs:
+            worker.close()
+            # Start the replacement now so it's warm by the time it's needed.
+            worker = SandboxWorker(self.preload)
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(worker)
+                return
+        worker.close()
+
+    def safe_exec(self, code, globals_dict, python_path=None, slug=None):
+        """
+        Execute `code` in a warm sandbox; the same interface as CodeJail's safe_exec.
+        """
+        worker = self._checkout()
+        try:
+            worker.run(code, globals_dict, python_path)
+        except SandboxWorkerError as exc:
+            log.warning("Sandbox worker failed running %s: %s", slug, exc)
+            worker.close()
+            self._replace()
+            raise SafeExecException("Couldn't execute jailed code: %s" % exc)
+        except SafeExecException:
+            self._checkin(worker)
+            raise
+        except:
+            worker.close()
+            self._replace()
+            raise
+        self._checkin(worker)
+
+    def _replace(self):
+        """Start a worker in place of one which was closed after an error."""
+        with self._lock:
+            if len(self._idle) >= self.size:
+                return
+        self._checkin(SandboxWorker(self.preload))
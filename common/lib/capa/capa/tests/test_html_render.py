@@ -5,6 +5,7 @@ import textwrap
 
 import mock
 
+from capa.capa_problem import LoncapaProblem
 from .response_xml_factory import StringResponseXMLFactory, CustomResponseXMLFactory
 from . import test_capa_system, new_loncapa_problem
 
@@ -255,6 +256,45 @@ class CapaHtmlRenderTest(unittest.TestCase):
         the_html = problem.get_html()
         self.assertRegexpMatches(the_html, r"<div>\s+</div>")
 
+    def test_parse_and_script_reused(self):
+        xml_str = textwrap.dedent("""
+            <problem>
+                <!-- test_parse_and_script_reused -->
+                <script type="loncapa/python">answer = 2 * 3</script>
+                <p>$answer</p>
+            </problem>
+        """)
+
+        with mock.patch('capa.capa_problem.safe_exec') as mock_safe_exec:
+            mock_safe_exec.side_effect = lambda code, context, **kwargs: context.update({'answer': 6})
+            first = new_loncapa_problem(xml_str)
+            second = new_loncapa_problem(xml_str)
+            self.assertEqual(mock_safe_exec.call_count, 1)
+            LoncapaProblem(xml_str, id='1', seed=724, capa_system=test_capa_system())
+            self.assertEqual(mock_safe_exec.call_count, 2)
+
+        # the problems get their own copies of the tree and the context
+        self.assertIsNot(first.tree, second.tree)
+        first.context['answer'] = 7
+        self.assertEqual(second.context['answer'], 6)
+        self.assertIn('<p>6</p>', second.get_html())
+
+    def test_include_changes_seen(self):
+        # problems with includes aren't reused, since the included file can change
+        xml_str = textwrap.dedent("""
+            <problem>
+                <include file="test_include_changes.xml"/>
+            </problem>
+        """)
+        self._create_test_file('test_include_changes.xml', '<test>First</test>')
+        problem = new_loncapa_problem(xml_str, capa_system=self.capa_system)
+        self.assertEqual(etree.XML(problem.get_html()).find("test").text, "First")
+
+        with self.capa_system.filestore.open('test_include_changes.xml', 'w') as test_fp:
+            test_fp.write('<test>Second</test>')
+        problem = new_loncapa_problem(xml_str, capa_system=self.capa_system)
+        self.assertEqual(etree.XML(problem.get_html()).find("test").text, "Second")
+
     def _create_test_file(self, path, content_str):
         test_fp = self.capa_system.filestore.open(path, "w")
         test_fp.write(content_str)
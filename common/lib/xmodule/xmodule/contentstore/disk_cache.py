@@ -0,0 +1,142 @@
+"""
+A size bounded cache of asset files on the local disk.
+
+Files are addressed by the md5 digest of their content (which gridfs computes for every file),
+so a changed asset is simply a different file and a stale copy can never be served; removing
+entries on save/delete only frees the space sooner.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DISK_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+
+
+class DiskContentCache(object):
+    """
+    An LRU cache of files under a directory. The index is kept in memory by each process and
+    seeded from what is already on disk, so several processes on a server can share the
+    directory (each one only evicts based on the files it knows about).
+    """
+    def __init__(self, root, max_size=DEFAULT_DISK_CACHE_MAX_SIZE):
+        self.root = root
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        if not os.path.isdir(root):
+            os.makedirs(root)
+        self._load_index()
+
+    def _load_index(self):
+        """
+        Add the files already in the cache directory to the index, least recently used first
+        """
+        existing = []
+        for dirpath, _dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.'):
+                    # a partially written file
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                existing.append((stat.st_mtime, filename, stat.st_size))
+        with self._lock:
+            for _mtime, digest, size in sorted(existing):
+                self._entries[digest] = size
+                self.size += size
+            self._evict()
+
+    def _path(self, digest):
+        """
+        Where the file with this digest lives; sharded by the leading characters so no directory gets huge
+        """
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, digest):
+        """
+        Return the path of the cached file with this digest or None if it isn't cached
+        """
+        path = self._path(digest)
+        with self._lock:
+            if digest not in self._entries:
+                if not os.path.exists(path):
+                    return None
+                # written by another process
+                self._entries[digest] = os.path.getsize(path)
+                self.size += self._entries[digest]
+            else:
+                self._entries[digest] = self._entries.pop(digest)
+        try:
+            # keep the mtime as the last use so the LRU order survives restarts
+            os.utime(path, None)
+        except OSError:
+            # evicted by another process
+            self.remove(digest)
+            return None
+        return path
+
+    def add(self, digest, stream):
+        """
+        Copy stream into the cache as the file for digest and return its path (or None if the file is
+        too big for the cache). The data is written to a temporary file and renamed into place so readers
+        never see a partial file.
+        """
+        path = self._path(digest)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(directory):
+                    raise
+        handle, temp_path = tempfile.mkstemp(prefix='.', dir=directory)
+        try:
+            with os.fdopen(handle, 'wb') as temp_file:
+                shutil.copyfileobj(stream, temp_file)
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            self.size += size - self._entries.pop(digest, 0)
+            self._entries[digest] = size
+            self._evict(keep=digest)
+            return path if digest in self._entries else None
+
+    def remove(self, digest):
+        """
+        Drop the file with this digest if it's cached
+        """
+        with self._lock:
+            self.size -= self._entries.pop(digest, 0)
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+    def _evict(self, keep=None):
+        """
+        Remove the least recently used files until the cache fits in max_size
+        """
+        while self.size > self.max_size and self._entries:
+            digest = next(iter(self._entries))
+            if digest == keep:
+                if len(self._entries) == 1:
+                    # the only file is bigger than the cache; don't keep it either
+                    self.remove(digest)
+                    return
+                self._entries[digest] = self._entries.pop(digest)
+                continue
+            log.debug("Evicting %s from the asset disk cache", digest)
+            self.remove(digest)
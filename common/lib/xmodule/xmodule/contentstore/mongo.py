@@ -9,19 +9,89 @@ from xmodule.contentstore.content import XASSET_LOCATION_TAG
 import logging
 
 from .content import StaticContent, ContentStore, StaticContentStream
+from .disk_cache import DiskContentCache, DEFAULT_DISK_CACHE_MAX_SIZE
 from xmodule.exceptions import NotFoundError
+from xmodule.util.tarball import add_string_to_tar, tar_member_name
 from fs.osfs import OSFS
+from multiprocessing.pool import ThreadPool
 import os
 import json
+import shutil
+import tarfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# smaller assets are expected to be cached in memcached by the content server
+DISK_CACHE_MIN_FILE_SIZE = 1024 * 1024
+
+# how many bytes of an asset exports copy at a time
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+# the asset attributes which exports don't write to the assets policy
+EXPORT_POLICY_EXCLUDED_ATTRS = ['_id', 'md5', 'uploadDate', 'length', 'chunkSize']
+
+
+def asset_export_path(asset):
+    """
+    Where an export puts the file of the asset (one of the dicts from
+    get_all_content_for_course), relative to its static directory
+    """
+    import_path = asset.get('import_path')
+    directory = os.path.dirname(import_path) if import_path is not None else ''
+    return os.path.join(directory, asset['displayname'])
+
+
+def assets_policy(assets):
+    """
+    The assets policy (asset name -> attributes) for the assets (as returned
+    by get_all_content_for_course) of an export
+    """
+    policy = {}
+    for asset in assets:
+        asset_location = Location(asset['_id'])
+        for attr, value in asset.iteritems():
+            if attr not in EXPORT_POLICY_EXCLUDED_ATTRS:
+                policy.setdefault(asset_location.name, {})[attr] = value
+    return policy
+
+
+class LocalGridFile(object):
+    """
+    A local copy of a gridfs file which reads from the local file but otherwise looks like the GridOut
+    """
+    def __init__(self, local_file, grid_out):
+        self._local_file = local_file
+        self._grid_out = grid_out
+
+    def read(self, size=-1):
+        return self._local_file.read(size)
+
+    def seek(self, pos, whence=os.SEEK_SET):
+        self._local_file.seek(pos, whence)
+
+    def tell(self):
+        return self._local_file.tell()
+
+    def close(self):
+        self._local_file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._grid_out, name)
 
 
 class MongoContentStore(ContentStore):
     # pylint: disable=W0613
-    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None, **kwargs):
+    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None,
+                 disk_cache_dir=None, disk_cache_max_size=DEFAULT_DISK_CACHE_MAX_SIZE, **kwargs):
         """
         Establish the connection with the mongo backend and connect to the collections
 
         :param collection: ignores but provided for consistency w/ other doc_store_config patterns
+        :param disk_cache_dir: if given, streamed assets of at least DISK_CACHE_MIN_FILE_SIZE are copied
+        to this local directory (in the background) the first time they're read and then served from there
+        :param disk_cache_max_size: the most bytes to keep in disk_cache_dir
         """
         logging.debug('Using MongoDB for static content serving at host={0} db={1}'.format(host, db))
         _db = pymongo.database.Database(
@@ -38,8 +108,17 @@ class MongoContentStore(ContentStore):
 
         self.fs = gridfs.GridFS(_db, bucket)
 
+        self.fs_root = _db[bucket]  # the root collection of the GridFS
         self.fs_files = _db[bucket + ".files"]  # the underlying collection GridFS uses
 
+        if disk_cache_dir is not None:
+            self.disk_cache = DiskContentCache(disk_cache_dir, disk_cache_max_size)
+        else:
+            self.disk_cache = None
+        # the digests of the files being copied into the disk cache
+        self._disk_cache_fills = set()
+        self._disk_cache_fills_lock = threading.Lock()
+
     def save(self, content):
         content_id = content.get_id()
 
@@ -60,6 +139,12 @@ class MongoContentStore(ContentStore):
         return content
 
     def delete(self, content_id):
+        if self.disk_cache is not None:
+            # the cache is content addressed so the old file can't be served for the new content,
+            # but there's no reason to keep it around
+            existing = self.fs_files.find_one({"_id": content_id}, fields=['md5'])
+            if existing is not None and existing.get('md5'):
+                self.disk_cache.remove(existing['md5'])
         if self.fs.exists({"_id": content_id}):
             self.fs.delete(content_id)
 
@@ -67,12 +152,16 @@ class MongoContentStore(ContentStore):
         content_id = StaticContent.get_id_from_location(location)
         try:
             if as_stream:
-                fp = self.fs.get(content_id)
+                file_document = self.fs_files.find_one({"_id": content_id})
+                if file_document is None:
+                    raise NoFile(content_id)
+                fp = self._local_copy(file_document)
                 return StaticContentStream(
                     location, fp.displayname, fp.content_type, fp, last_modified_at=fp.uploadDate,
                     thumbnail_location=getattr(fp, 'thumbnail_location', None),
                     import_path=getattr(fp, 'import_path', None),
-                    length=fp.length, locked=getattr(fp, 'locked', False)
+                    length=fp.length, locked=getattr(fp, 'locked', False),
+                    content_digest=getattr(fp, 'md5', None)
                 )
             else:
                 with self.fs.get(content_id) as fp:
@@ -80,7 +169,8 @@ class MongoContentStore(ContentStore):
                         location, fp.displayname, fp.content_type, fp.read(), last_modified_at=fp.uploadDate,
                         thumbnail_location=getattr(fp, 'thumbnail_location', None),
                         import_path=getattr(fp, 'import_path', None),
-                        length=fp.length, locked=getattr(fp, 'locked', False)
+                        length=fp.length, locked=getattr(fp, 'locked', False),
+                        content_digest=getattr(fp, 'md5', None)
                     )
         except NoFile:
             if throw_on_not_found:
@@ -88,6 +178,56 @@ class MongoContentStore(ContentStore):
             else:
                 return None
 
+    def _local_copy(self, file_document):
+        """
+        Return a stream of the content of the gridfs file with file_document, which reads from the disk
+        cache when there is one and the file is in it. The returned object carries the file's attributes
+        (displayname, md5, etc.) as StaticContentStream needs them.
+
+        A large file which isn't in the disk cache yet is served from gridfs while it's copied into the
+        cache in the background, so the first request for it isn't held up by the copy.
+        """
+        fp = gridfs.GridOut(self.fs_root, file_document=file_document)
+        digest = file_document.get('md5')
+        if self.disk_cache is None or digest is None or fp.length < DISK_CACHE_MIN_FILE_SIZE:
+            return fp
+        path = self.disk_cache.get(digest)
+        if path is not None:
+            try:
+                return LocalGridFile(open(path, 'rb'), fp)
+            except IOError:
+                # evicted in the meantime
+                pass
+        self._fill_disk_cache(file_document)
+        return fp
+
+    def _fill_disk_cache(self, file_document):
+        """
+        Start copying the gridfs file with file_document into the disk cache, unless it's already being copied
+        """
+        digest = file_document['md5']
+        with self._disk_cache_fills_lock:
+            if digest in self._disk_cache_fills:
+                return
+            self._disk_cache_fills.add(digest)
+        thread = threading.Thread(target=self._copy_to_disk_cache, args=(file_document,))
+        thread.daemon = True
+        thread.start()
+
+    def _copy_to_disk_cache(self, file_document):
+        """
+        Copy the gridfs file with file_document into the disk cache
+        """
+        digest = file_document['md5']
+        try:
+            with gridfs.GridOut(self.fs_root, file_document=file_document) as fp:
+                self.disk_cache.add(digest, fp)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Couldn't copy %s to the asset disk cache", file_document.get('filename'))
+        finally:
+            with self._disk_cache_fills_lock:
+                self._disk_cache_fills.discard(digest)
+
     def get_stream(self, location):
         content_id = StaticContent.get_id_from_location(location)
         try:
@@ -104,20 +244,32 @@ class MongoContentStore(ContentStore):
             pass
 
     def export(self, location, output_directory):
-        content = self.find(location)
-
-        if content.import_path is not None:
-            output_directory = output_directory + '/' + os.path.dirname(content.import_path)
-
-        if not os.path.exists(output_directory):
-            os.makedirs(output_directory)
-
-        disk_fs = OSFS(output_directory)
-
-        with disk_fs.open(content.name, 'wb') as asset_file:
-            asset_file.write(content.data)
-
-    def export_all_for_course(self, course_location, output_directory, assets_policy_file):
+        """
+        Copy the asset at location into output_directory (or the subdirectory of it
+        it was imported from), a chunk at a time
+        """
+        handle = self.get_stream(location)
+        try:
+            import_path = getattr(handle, 'import_path', None)
+            if import_path is not None:
+                output_directory = output_directory + '/' + os.path.dirname(import_path)
+
+            if not os.path.exists(output_directory):
+                try:
+                    os.makedirs(output_directory)
+                except OSError:
+                    # created concurrently by another export
+                    if not os.path.isdir(output_directory):
+                        raise
+
+            disk_fs = OSFS(output_directory)
+
+            with disk_fs.open(handle.displayname, 'wb') as asset_file:
+                shutil.copyfileobj(handle, asset_file, EXPORT_CHUNK_SIZE)
+        finally:
+            self.close_stream(handle)
+
+    def export_all_for_course(self, course_location, output_directory, assets_policy_file, workers=1):
         """
         Export all of this course's assets to the output_directory. Export all of the assets'
         attributes to the policy file.
@@ -126,19 +278,44 @@ class MongoContentStore(ContentStore):
         :param output_directory: the directory under which to put all the asset files
         :param assets_policy_file: the filename for the policy file which should be in the same
         directory as the other policy files.
+        :param workers: how many assets to copy at once
         """
-        policy = {}
         assets, __ = self.get_all_content_for_course(course_location)
 
-        for asset in assets:
-            asset_location = Location(asset['_id'])
-            self.export(asset_location, output_directory)
-            for attr, value in asset.iteritems():
-                if attr not in ['_id', 'md5', 'uploadDate', 'length', 'chunkSize']:
-                    policy.setdefault(asset_location.name, {})[attr] = value
+        export = lambda asset: self.export(Location(asset['_id']), output_directory)
+        if workers > 1 and len(assets) > 1:
+            pool = ThreadPool(min(workers, len(assets)))
+            try:
+                pool.map(export, assets)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for asset in assets:
+                export(asset)
 
         with open(assets_policy_file, 'w') as f:
-            json.dump(policy, f)
+            json.dump(assets_policy(assets), f)
+
+    def export_all_for_course_to_tar(self, course_location, tar_file, static_dir, assets_policy_name):
+        """
+        Stream all of this course's assets into tar_file (an open tarfile.TarFile)
+        under static_dir, and the assets' attributes into it as assets_policy_name,
+        without writing them to disk.
+        """
+        assets, __ = self.get_all_content_for_course(course_location)
+
+        for asset in assets:
+            handle = self.get_stream(Location(asset['_id']))
+            try:
+                info = tarfile.TarInfo(tar_member_name(os.path.join(static_dir, asset_export_path(asset))))
+                info.size = handle.length
+                info.mtime = time.mktime(handle.upload_date.timetuple())
+                tar_file.addfile(info, handle)
+            finally:
+                self.close_stream(handle)
+
+        add_string_to_tar(tar_file, assets_policy_name, json.dumps(assets_policy(assets)))
 
     def get_all_content_thumbnails_for_course(self, location):
         return self._get_all_content_for_course(location, get_thumbnails=True)[0]
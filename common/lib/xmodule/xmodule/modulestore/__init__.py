@@ -535,6 +535,19 @@ class ModuleStoreReadBase(ModuleStoreRead):
                 return c
         return None
 
+    def get_courses_by_id(self, course_ids):
+        """
+        Returns a dict of course_id -> course descriptor for those of the given
+        course_ids which exist. Stores which can fetch several courses at once
+        should override this default of looking each one up.
+        """
+        courses = {}
+        for course_id in course_ids:
+            course = self.get_course(course_id)
+            if course is not None:
+                courses[course_id] = course
+        return courses
+
     def update_item(self, xblock, user_id=None, allow_not_found=False, force=False):
         """
         Update the given xblock's persisted repr. Pass the user's unique id which the persistent store
@@ -576,6 +589,15 @@ class ModuleStoreWriteBase(ModuleStoreReadBase, ModuleStoreWrite):
         # the split mongo store is used for item creation as well as item persistence
         self.mixologist = Mixologist(self.xblock_mixins)
 
+    def update_items(self, xblocks, user_id=None):
+        """
+        Persist each of xblocks, whether or not it has been persisted before.
+        Stores which can write many new items at once should override this
+        default of updating each one.
+        """
+        for xblock in xblocks:
+            self.update_item(xblock, user_id, allow_not_found=True)
+
     def partition_fields_by_scope(self, category, fields):
         """
         Return dictionary of {scope: {field1: val, ..}..} for the fields of this potential xblock
@@ -7,12 +7,14 @@ Passes settings.MODULESTORE as kwargs to MongoModuleStore
 from __future__ import absolute_import
 from importlib import import_module
 import re
+from uuid import uuid4
 
 from django.conf import settings
-from django.core.cache import get_cache, InvalidCacheBackendError
-from django.dispatch import Signal
+from django.core.cache import cache, get_cache, InvalidCacheBackendError
+from django.dispatch import Signal, receiver
 import django.utils
 
+from xmodule.modulestore import Location
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 from xmodule.util.django import get_current_request_hostname
 
@@ -28,6 +30,14 @@ _MODULESTORES = {}
 
 FUNCTION_KEYS = ['render_template']
 
+# Sent by the modulestores created here whenever they write or delete an item
+modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
+
+# The categories of the items which describe a course in course listings
+COURSE_LISTING_CATEGORIES = ('course', 'about')
+COURSE_LISTING_VERSION_KEY = 'modulestore.course_listing_version'
+COURSE_CONTENT_VERSION_KEY = u'modulestore.course_content_version.{org}/{course}'
+
 
 def load_function(path):
     """
@@ -63,10 +73,17 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     except InvalidCacheBackendError:
         metadata_inheritance_cache = get_cache('default')
 
+    # the shared tier of the split modulestore's structure cache is optional
+    try:
+        structure_cache = get_cache('split_structures')
+    except InvalidCacheBackendError:
+        structure_cache = None
+
     return class_(
         metadata_inheritance_cache_subsystem=metadata_inheritance_cache,
+        structure_cache_subsystem=structure_cache,
         request_cache=request_cache,
-        modulestore_update_signal=Signal(providing_args=['modulestore', 'course_id', 'location']),
+        modulestore_update_signal=modulestore_update_signal,
         xblock_mixins=getattr(settings, 'XBLOCK_MIXINS', ()),
         xblock_select=getattr(settings, 'XBLOCK_SELECT_FUNCTION', None),
         doc_store_config=doc_store_config,
@@ -75,6 +92,51 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     )
 
 
+def _cache_version(key):
+    """
+    Return the version token stored in the default cache under key, creating it if needed.
+    """
+    version = cache.get(key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(key, version):
+            version = cache.get(key, version)
+    return version
+
+
+def course_listing_version():
+    """
+    Return a token which changes whenever the course or about item of any course
+    is written (in any process sharing the default cache), for keying caches of
+    course listings.
+    """
+    return _cache_version(COURSE_LISTING_VERSION_KEY)
+
+
+def course_content_version(location):
+    """
+    Return a token which changes whenever any item of the course containing
+    location is written (in any process sharing the default cache), for keying
+    caches of things derived from the course's structure.
+    """
+    location = Location(location)
+    return _cache_version(COURSE_CONTENT_VERSION_KEY.format(org=location.org, course=location.course))
+
+
+@receiver(modulestore_update_signal)
+def update_course_versions(sender, location=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Change the course_content_version of the course an item was written in, and
+    the course_listing_version too if the item was a course or about item.
+    """
+    if location is None:
+        return
+    location = Location(location)
+    cache.set(COURSE_CONTENT_VERSION_KEY.format(org=location.org, course=location.course), uuid4().hex)
+    if location.category in COURSE_LISTING_CATEGORIES:
+        cache.set(COURSE_LISTING_VERSION_KEY, uuid4().hex)
+
+
 def get_default_store_name_for_current_request():
     """
     This method will return the appropriate default store mapping for the current Django request,
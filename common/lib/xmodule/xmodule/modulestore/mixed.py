@@ -6,6 +6,7 @@ In this way, courses can be served up both - say - XMLModuleStore or MongoModule
 """
 
 import logging
+from collections import defaultdict
 
 from . import ModuleStoreWriteBase
 from xmodule.modulestore.django import create_modulestore_instance, loc_mapper
@@ -167,6 +168,20 @@ class MixedModuleStore(ModuleStoreWriteBase):
         except ItemNotFoundError:
             return None
 
+    def get_courses_by_id(self, course_ids):
+        """
+        Returns a dict of course_id -> course descriptor for those of the given
+        course_ids which exist, asking each modulestore for its courses at once.
+        """
+        course_ids_by_store = defaultdict(list)
+        for course_id in course_ids:
+            course_ids_by_store[self._get_modulestore_for_courseid(course_id)].append(course_id)
+
+        courses = {}
+        for store, store_course_ids in course_ids_by_store.iteritems():
+            courses.update(store.get_courses_by_id(store_course_ids))
+        return courses
+
     def get_parent_locations(self, location, course_id):
         """
         returns the parent locations for a given location and course_id
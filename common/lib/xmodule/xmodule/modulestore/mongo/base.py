@@ -15,7 +15,6 @@ structure:
 import pymongo
 import sys
 import logging
-import copy
 
 from bson.son import SON
 from fs.osfs import OSFS
@@ -39,6 +38,12 @@ from xblock.core import XBlock
 
 log = logging.getLogger(__name__)
 
+# the most items update_items inserts (or looks up) with one query
+BULK_INSERT_BATCH_SIZE = 1000
+
+# how many seconds an update of a cached metadata inheritance tree may hold its lock
+METADATA_INHERITANCE_LOCK_TIMEOUT = 60
+
 
 def get_course_id_no_run(location):
     '''
@@ -244,6 +249,14 @@ def metadata_cache_key(location):
     return u"{0.org}/{0.course}".format(location)
 
 
+def _batches(items, size):
+    """
+    Yield successive lists of at most size of items
+    """
+    for start in xrange(0, len(items), size):
+        yield items[start:start + size]
+
+
 class MongoModuleStore(ModuleStoreWriteBase):
     """
     A Mongodb backed ModuleStore
@@ -309,19 +322,33 @@ class MongoModuleStore(ModuleStoreWriteBase):
         self.i18n_service = i18n_service
 
         self.ignore_write_events_on_courses = []
+        self._container_block_types = None
 
-    def compute_metadata_inheritance_tree(self, location):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-        # get all collections in the course, this query should not return any leaf nodes
-        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+    def _block_types_with_children(self):
+        """
+        Return the set of block types that can have children (i.e. the containers
+        that take part in metadata inheritance)
+        """
+        if self._container_block_types is None:
+            self._container_block_types = set(
+                name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False)
+            )
+        return self._container_block_types
 
-        block_types_with_children = set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
+    def _query_inheritance_records(self, location, names=None):
+        """
+        Return a dict mapping non-draft location urls to the inheritance records
+        (location, children and inheritable metadata) of the containers in
+        location's course. If `names` is given, only containers whose location
+        name is in `names` are queried.
+        """
         query = {'_id.org': location.org,
                  '_id.course': location.course,
-                 '_id.category': {'$in': list(block_types_with_children)}
+                 '_id.category': {'$in': list(self._block_types_with_children())}
                  }
+        if names is not None:
+            query['_id.name'] = {'$in': list(names)}
+
         # we just want the Location, children, and inheritable metadata
         record_filter = {'_id': 1, 'definition.children': 1}
 
@@ -330,14 +357,10 @@ class MongoModuleStore(ModuleStoreWriteBase):
         for field_name in InheritanceMixin.fields:
             record_filter['metadata.{0}'.format(field_name)] = 1
 
-        # call out to the DB
-        resultset = self.collection.find(query, record_filter)
-
         results_by_url = {}
-        root = None
 
         # now go through the results and order them by the location url
-        for result in resultset:
+        for result in self.collection.find(query, record_filter):
             location = Location(result['_id'])
             # We need to collate between draft and non-draft
             # i.e. draft verticals will have draft children but will have non-draft parents currently
@@ -347,38 +370,70 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 existing_children = results_by_url[location_url].get('definition', {}).get('children', [])
                 additional_children = result.get('definition', {}).get('children', [])
                 total_children = existing_children + additional_children
-                results_by_url[location_url].setdefault('definition', {})['children'] = total_children
-            results_by_url[location.url()] = result
-            if location.category == 'course':
-                root = location.url()
+                result.setdefault('definition', {})['children'] = total_children
+            results_by_url[location_url] = result
+
+        return results_by_url
+
+    @staticmethod
+    def _inherit_metadata_down(results_by_url, url, parent_metadata, metadata_to_inherit):
+        """
+        Record in `metadata_to_inherit` the metadata that every descendant of
+        the container at `url` inherits, given that the container itself
+        inherits `parent_metadata`.
+
+        Children that don't add inheritable metadata of their own share their
+        parent's dict rather than getting a copy of it, which keeps both the
+        memory use and the pickled (cached) size of the tree down.
+        """
+        own_metadata = results_by_url[url].get('metadata', {})
+        if own_metadata:
+            my_metadata = dict(parent_metadata)
+            my_metadata.update(own_metadata)
+        else:
+            my_metadata = parent_metadata
+
+        # go through all the children and recurse, but only if we have
+        # in the result set. Remember results will not contain leaf nodes
+        for child in results_by_url[url].get('definition', {}).get('children', []):
+            metadata_to_inherit[child] = my_metadata
+            if child in results_by_url:
+                MongoModuleStore._inherit_metadata_down(results_by_url, child, my_metadata, metadata_to_inherit)
+
+    def compute_metadata_inheritance_tree(self, location):
+        '''
+        Return a dict mapping the location url of every block in location's
+        course to the inheritable metadata it inherits from its ancestors.
+
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        # get all collections in the course, this query should not return any leaf nodes
+        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+        results_by_url = self._query_inheritance_records(location)
 
         # now traverse the tree and compute down the inherited metadata
         metadata_to_inherit = {}
-
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
-                else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
-
-        if root is not None:
-            _compute_inherited_metadata(root)
+        for url in results_by_url:
+            if Location(url).category == 'course':
+                self._inherit_metadata_down(results_by_url, url, {}, metadata_to_inherit)
 
         return metadata_to_inherit
 
+    def _set_cached_metadata_inheritance_tree(self, key, tree, update_subsystem=True):
+        """
+        Store `tree` in the request cache and, if update_subsystem is True,
+        in the caching subsystem (e.g. memcached), if those are available.
+        """
+        if update_subsystem and self.metadata_inheritance_cache_subsystem is not None:
+            self.metadata_inheritance_cache_subsystem.set(key, tree)
+
+        if self.request_cache is not None:
+            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
+            # defined
+            if 'metadata_inheritance' not in self.request_cache.data:
+                self.request_cache.data['metadata_inheritance'] = {}
+            self.request_cache.data['metadata_inheritance'][key] = tree
+
     def get_cached_metadata_inheritance_tree(self, location, force_refresh=False):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
@@ -397,23 +452,15 @@ class MongoModuleStore(ModuleStoreWriteBase):
             else:
                 logging.warning('Running MongoModuleStore without a metadata_inheritance_cache_subsystem. This is OK in localdev and testing environment. Not OK in production.')
 
-        if not tree:
-            # if not in subsystem, or we are on force refresh, then we have to compute
+        # if not in subsystem, or we are on force refresh, then we have to compute
+        computed = not tree
+        if computed:
             tree = self.compute_metadata_inheritance_tree(location)
 
-            # now write out computed tree to caching subsystem (e.g. memcached), if available
-            if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(key, tree)
-
-        # now populate a request_cache, if available. NOTE, we are outside of the
-        # scope of the above if: statement so that after a memcache hit, it'll get
-        # put into the request_cache
-        if self.request_cache is not None:
-            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
-            # defined
-            if 'metadata_inheritance' not in self.request_cache.data:
-                self.request_cache.data['metadata_inheritance'] = {}
-            self.request_cache.data['metadata_inheritance'][key] = tree
+        # now write out a computed tree to the caching subsystem (e.g. memcached), and
+        # populate the request_cache. NOTE, the request_cache is populated even on
+        # a memcache hit
+        self._set_cached_metadata_inheritance_tree(key, tree, update_subsystem=computed)
 
         return tree
 
@@ -426,6 +473,105 @@ class MongoModuleStore(ModuleStoreWriteBase):
         if pseudo_course_id not in self.ignore_write_events_on_courses:
             self.get_cached_metadata_inheritance_tree(location, force_refresh=True)
 
+    def update_cached_metadata_inheritance_subtree(self, location):
+        """
+        Bring the cached metadata inheritance tree for location's course up to
+        date after the inheritable metadata or children of the block at
+        location changed.
+
+        Only the entries for the block's descendants are recomputed, loading
+        just the containers in that subtree (one query per level). Leaf blocks
+        don't contribute to the tree, so changes to them need no work. The
+        whole tree is recomputed if it isn't cached yet, or if location is the
+        course itself.
+
+        The shared tree is read, patched and written back under a lock, so
+        concurrent updates of a course don't overwrite each other. An update
+        which can't get the lock drops the shared tree instead, and has the
+        update holding the lock drop it too, so that the tree is recomputed
+        the next time it's read.
+        """
+        location = Location(location).replace(revision=None)
+        pseudo_course_id = '/'.join([location.org, location.course])
+        if pseudo_course_id in self.ignore_write_events_on_courses:
+            return
+
+        if location.category not in self._block_types_with_children():
+            return
+
+        key = metadata_cache_key(location)
+        cache = self.metadata_inheritance_cache_subsystem
+        if cache is None:
+            self._update_cached_metadata_inheritance_subtree(location, key)
+            return
+
+        lock_key = key + '.lock'
+        conflict_key = key + '.conflict'
+        if not cache.add(lock_key, True, METADATA_INHERITANCE_LOCK_TIMEOUT):
+            # another update of the course is in progress
+            cache.set(conflict_key, True, METADATA_INHERITANCE_LOCK_TIMEOUT)
+            self._forget_cached_metadata_inheritance_tree(key)
+            return
+        try:
+            cache.delete(conflict_key)
+            self._update_cached_metadata_inheritance_subtree(location, key)
+            if cache.get(conflict_key):
+                # another update gave up while this one held the lock
+                self._forget_cached_metadata_inheritance_tree(key)
+        finally:
+            cache.delete(lock_key)
+
+    def _forget_cached_metadata_inheritance_tree(self, key):
+        """
+        Drop the tree with `key` from the caching subsystem and the request cache,
+        so that it's recomputed when it's next read
+        """
+        if self.metadata_inheritance_cache_subsystem is not None:
+            self.metadata_inheritance_cache_subsystem.delete(key)
+        if self.request_cache is not None:
+            self.request_cache.data.get('metadata_inheritance', {}).pop(key, None)
+
+    def _update_cached_metadata_inheritance_subtree(self, location, key):
+        """
+        Unlocked version of update_cached_metadata_inheritance_subtree
+        """
+        tree = None
+        if self.metadata_inheritance_cache_subsystem is not None:
+            tree = self.metadata_inheritance_cache_subsystem.get(key)
+
+        location_url = location.url()
+        if not tree or location.category == 'course':
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return
+        if location_url not in tree:
+            # This block isn't attached to the course yet. Its metadata will be
+            # computed when its parent's children are updated.
+            return
+
+        # load the containers in this block's subtree, a level at a time
+        results_by_url = {}
+        to_load = set([location_url])
+        while to_load:
+            level = self._query_inheritance_records(location, names=set(Location(url).name for url in to_load))
+            to_load_next = set()
+            for url, result in level.iteritems():
+                if url in to_load:
+                    results_by_url[url] = result
+                    to_load_next.update(
+                        child for child in result.get('definition', {}).get('children', [])
+                        if child not in results_by_url and
+                        Location(child).category in self._block_types_with_children()
+                    )
+            to_load = to_load_next
+
+        if location_url not in results_by_url:
+            # the block has been removed, so we can't tell what changed under it
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return
+
+        self._inherit_metadata_down(results_by_url, location_url, tree[location_url], tree)
+        self._set_cached_metadata_inheritance_tree(key, tree)
+
     def _clean_item_data(self, item):
         """
         Renames the '_id' field in item to 'location'
@@ -565,6 +711,36 @@ class MongoModuleStore(ModuleStoreWriteBase):
         except ItemNotFoundError:
             return None
 
+    def get_courses_by_id(self, course_ids):
+        """
+        Returns a dict of course_id -> course descriptor for those of the given
+        course_ids which exist, fetching all of them in one query.
+        """
+        wanted = {}
+        for course_id in course_ids:
+            id_components = Location.parse_course_id(course_id)
+            wanted[(id_components['org'], id_components['course'], id_components['name'])] = course_id
+        if not wanted:
+            return {}
+
+        query = {
+            '_id.tag': 'i4x',
+            '_id.category': 'course',
+            '$or': [
+                {'_id.org': org, '_id.course': course, '_id.name': name}
+                for org, course, name in wanted
+            ],
+        }
+        # like _find_one, take the first revision of each course
+        items = {}
+        for item in self.collection.find(query, sort=[('revision', pymongo.ASCENDING)]):
+            key = (item['_id']['org'], item['_id']['course'], item['_id']['name'])
+            items.setdefault(key, item)
+
+        keys = items.keys()
+        modules = self._load_items([items[key] for key in keys], 0)
+        return {wanted[key]: module for key, module in zip(keys, modules)}
+
     def has_item(self, course_id, location):
         """
         Returns True if location exists in this ModuleStore.
@@ -803,15 +979,53 @@ class MongoModuleStore(ModuleStoreWriteBase):
                     static_tab['name'] = xblock.display_name
                     self.update_item(course, user)
 
-            # recompute (and update) the metadata inheritance tree which is cached
+            # update the part of the cached metadata inheritance tree under this block
             # was conditional on children or metadata having changed before dhm made one update to rule them all
-            self.refresh_cached_metadata_inheritance_tree(xblock.location)
+            self.update_cached_metadata_inheritance_subtree(xblock.location)
             # fire signal that we've written to DB
             self.fire_updated_modulestore_signal(get_course_id_no_run(xblock.location), xblock.location)
         except ItemNotFoundError:
             if not allow_not_found:
                 raise
 
+    def update_items(self, xblocks, user=None):
+        """
+        Persist each of xblocks, inserting those which aren't in the store yet
+        in batches of BULK_INSERT_BATCH_SIZE rather than one at a time. Those
+        which are (and static tabs, which also change their course) are
+        updated with update_item.
+        """
+        xblocks = list(xblocks)
+        existing = set()
+        for batch in _batches(xblocks, BULK_INSERT_BATCH_SIZE):
+            query = {'_id': {'$in': [namedtuple_to_son(Location(xblock.location)) for xblock in batch]}}
+            for item in self.collection.find(query, fields=['_id']):
+                existing.add(Location(item['_id']))
+
+        new_items = []
+        for xblock in xblocks:
+            location = Location(xblock.location)
+            if location in existing or xblock.category == 'static_tab':
+                self.update_item(xblock, user, allow_not_found=True)
+                continue
+            item = {
+                '_id': namedtuple_to_son(location),
+                'definition': {'data': xblock.get_explicitly_set_fields_by_scope()},
+                'metadata': own_metadata(xblock),
+            }
+            if xblock.has_children:
+                # convert all to urls
+                xblock.children = [child.url() if isinstance(child, Location) else child
+                                   for child in xblock.children]
+                item['definition']['children'] = xblock.children
+            new_items.append((location, item))
+
+        for batch in _batches(new_items, BULK_INSERT_BATCH_SIZE):
+            self.collection.insert([item for _, item in batch], safe=self.collection.safe)
+            for location, _ in batch:
+                self.update_cached_metadata_inheritance_subtree(location)
+                self.fire_updated_modulestore_signal(get_course_id_no_run(location), location)
+
     # pylint: disable=unused-argument
     def delete_item(self, location, **kwargs):
         """
@@ -833,8 +1047,10 @@ class MongoModuleStore(ModuleStoreWriteBase):
         # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
         # from overriding our default value set in the init method.
         self.collection.remove({'_id': Location(location).dict()}, safe=self.collection.safe)
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(Location(location))
+        # recompute (and update) the metadata inheritance tree which is cached. Leaf
+        # blocks don't contribute to it, so only removing a container can change it.
+        if Location(location).category in self._block_types_with_children():
+            self.refresh_cached_metadata_inheritance_tree(Location(location))
         self.fire_updated_modulestore_signal(get_course_id_no_run(Location(location)), Location(location))
 
     def get_parent_locations(self, location, course_id):
@@ -151,7 +151,7 @@ class DraftModuleStore(MongoModuleStore):
         except pymongo.errors.DuplicateKeyError:
             raise DuplicateItemError(original['_id'])
 
-        self.refresh_cached_metadata_inheritance_tree(draft_location)
+        self.update_cached_metadata_inheritance_subtree(draft_location)
         self.fire_updated_modulestore_signal(get_course_id_no_run(draft_location), draft_location)
 
         return self._load_items([original])[0]
@@ -176,6 +176,13 @@ class DraftModuleStore(MongoModuleStore):
         # don't allow locations to truly represent themselves as draft outside of this file
         xblock.location = as_published(xblock.location)
 
+    def update_items(self, xblocks, user=None):
+        """
+        Save each of xblocks as a draft (see update_item)
+        """
+        for xblock in xblocks:
+            self.update_item(xblock, user, allow_not_found=True)
+
     def delete_item(self, location, delete_all_versions=False, **kwargs):
         """
         Delete an item from this modulestore
@@ -8,18 +8,68 @@ class DefinitionLazyLoader(object):
     object doesn't force access during init but waits until client wants the
     definition. Only works if the modulestore is a split mongo store.
     """
-    def __init__(self, modulestore, definition_id):
+    def __init__(self, modulestore, definition_id, batch=None):
         """
         Simple placeholder for yet-to-be-fetched data
         :param modulestore: the pymongo db connection with the definitions
         :param definition_locator: the id of the record in the above to fetch
+        :param batch: an optional DefinitionBatch with which to fetch this definition
+        together with the other pending definitions of the same descriptor system
         """
         self.modulestore = modulestore
         self.definition_locator = DefinitionLocator(definition_id)
+        self.batch = batch
+        if batch is not None:
+            batch.add(definition_id)
 
     def fetch(self):
         """
         Fetch the definition. Note, the caller should replace this lazy
         loader pointer with the result so as not to fetch more than once
         """
+        if self.batch is not None:
+            return self.batch.get(self.definition_locator.definition_id)
         return self.modulestore.db_connection.get_definition(self.definition_locator.definition_id)
+
+
+class DefinitionBatch(object):
+    """
+    Collects the ids of lazily loaded definitions so that the first fetch of any
+    of them loads all the pending ones in a single query rather than one round trip
+    per xblock (e.g., rendering a sequence touches all its verticals and their children).
+    """
+    def __init__(self, modulestore):
+        self.modulestore = modulestore
+        self.pending = set()
+        self.definitions = {}
+
+    def add(self, definition_id):
+        """
+        Register a definition to be fetched with the next batch
+        """
+        self.pending.add(definition_id)
+
+    def get(self, definition_id):
+        """
+        Return the definition, fetching it and all other pending definitions if it
+        has not already been loaded. Each loaded definition is handed out only once
+        so that callers never share (and mutate) the same document; a definition shared
+        by several blocks is simply fetched again.
+        """
+        if definition_id not in self.definitions:
+            self.pending.add(definition_id)
+            self._fetch_pending()
+        return self.definitions.pop(definition_id, None)
+
+    def _fetch_pending(self):
+        """
+        Load all the pending definitions in one query
+        """
+        pending, self.pending = list(self.pending), set()
+        if len(pending) == 1:
+            definition = self.modulestore.db_connection.get_definition(pending[0])
+            if definition is not None:
+                self.definitions[definition['_id']] = definition
+            return
+        for definition in self.modulestore.db_connection.find_matching_definitions({'_id': {'$in': pending}}):
+            self.definitions[definition['_id']] = definition
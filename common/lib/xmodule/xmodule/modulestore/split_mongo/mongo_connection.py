@@ -1,17 +1,168 @@
 """
 Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
 """
+import threading
+import time
+from collections import OrderedDict
+
 import pymongo
+from bson import BSON
+
+# Default upper bound, in bytes of BSON, on the structures kept in memory per process
+DEFAULT_STRUCTURE_CACHE_SIZE = 64 * 1024 * 1024
+
+# Default number of seconds a cached structure is trusted for before it's re-read; this bounds how long
+# other processes can serve a structure after it's rewritten in place by `update_structure`
+DEFAULT_STRUCTURE_CACHE_TIMEOUT = 5 * 60
+
+
+class DocumentCache(object):
+    """
+    A thread-safe, size-bounded LRU cache of mongo documents, with an optional
+    second tier in a shared cache (anything with the django cache get/set/delete
+    api, e.g. memcached).
+
+    Documents are held BSON-encoded, so every `get` decodes a fresh copy and
+    callers can't mutate what other threads see. This also makes the size of
+    each entry exact, which is what `max_size` (in bytes) bounds.
+
+    If `timeout` is given, entries expire after that many seconds; otherwise
+    they are kept until evicted or deleted.
+
+    `hits`, `remote_hits` and `misses` count lookups answered from memory, from
+    the shared tier and by neither, to help size the cache.
+    """
+    def __init__(self, max_size, remote_cache=None, key_prefix='', timeout=None, tz_aware=True):
+        self.max_size = max_size
+        self.remote_cache = remote_cache
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.tz_aware = tz_aware
+        self.size = 0
+        self.hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remote_key(self, key):
+        """
+        Return the key used for `key` in the shared tier
+        """
+        return u'{}{}'.format(self.key_prefix, key)
+
+    def _decode(self, data):
+        """
+        Return a new document decoded from BSON `data`
+        """
+        return BSON(data).decode(tz_aware=self.tz_aware)
+
+    def _store(self, key, data):
+        """
+        Store encoded `data` in memory, evicting the least recently used
+        entries to stay within max_size. Caller must hold the lock.
+        """
+        self._discard(key)
+        if len(data) > self.max_size:
+            return
+        expires = time.time() + self.timeout if self.timeout is not None else None
+        self._entries[key] = (data, expires)
+        self.size += len(data)
+        while self.size > self.max_size:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def _discard(self, key):
+        """
+        Remove `key` from memory, if present. Caller must hold the lock.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def get(self, key):
+        """
+        Return a copy of the document cached under `key`, or None
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                data, expires = entry
+                if expires is None or expires > time.time():
+                    # re-insert to mark this entry as most recently used
+                    self._entries[key] = entry
+                    self.hits += 1
+                    return self._decode(data)
+                self.size -= len(data)
+
+        if self.remote_cache is not None:
+            data = self.remote_cache.get(self._remote_key(key))
+            if data is not None:
+                with self._lock:
+                    self.remote_hits += 1
+                    self._store(key, data)
+                return self._decode(data)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, document):
+        """
+        Cache `document` under `key`
+        """
+        data = BSON.encode(document)
+        with self._lock:
+            self._store(key, data)
+        if self.remote_cache is not None:
+            self.remote_cache.set(self._remote_key(key), data, self.timeout)
+
+    def delete(self, key):
+        """
+        Drop any cached document for `key`
+        """
+        with self._lock:
+            self._discard(key)
+        if self.remote_cache is not None:
+            self.remote_cache.delete(self._remote_key(key))
+
+    def stats(self):
+        """
+        Return a dict of the cache's counters and current size
+        """
+        return {
+            'hits': self.hits,
+            'remote_hits': self.remote_hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_size': self.max_size,
+        }
+
 
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
+        structure_cache_size=DEFAULT_STRUCTURE_CACHE_SIZE, structure_cache_timeout=DEFAULT_STRUCTURE_CACHE_TIMEOUT,
+        course_index_cache_timeout=0, remote_cache=None,
+        **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        Structures are almost always immutable once written, so they are cached
+        by id, up to `structure_cache_size` bytes, for `structure_cache_timeout`
+        seconds (None keeps them until evicted). The exception is the in-place
+        `update_structure`: it refreshes this process's copy and the shared
+        tier, but other processes may serve the old structure from memory until
+        their copy times out. Course indexes change on every write, so they are
+        only cached if `course_index_cache_timeout` (in seconds) is positive;
+        writes through this connection invalidate them, but other processes may
+        see the old index for up to that long. `remote_cache` is an optional
+        shared cache (e.g. memcached) used as a second tier for both.
         """
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
@@ -38,11 +189,29 @@ class MongoConnection(object):
         self.structures.write_concern = {'w': 1}
         self.definitions.write_concern = {'w': 1}
 
+        key_prefix = u'split.{}.{}.'.format(db, collection)
+        self.structure_cache = DocumentCache(
+            structure_cache_size, remote_cache, key_prefix + 'structure.',
+            timeout=structure_cache_timeout, tz_aware=tz_aware
+        )
+        if course_index_cache_timeout > 0:
+            self.course_index_cache = DocumentCache(
+                structure_cache_size, remote_cache, key_prefix + 'course_index.',
+                timeout=course_index_cache_timeout, tz_aware=tz_aware
+            )
+        else:
+            self.course_index_cache = None
+
     def get_structure(self, key):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return self.structures.find_one({'_id': key})
+        structure = self.structure_cache.get(key)
+        if structure is None:
+            structure = self.structures.find_one({'_id': key})
+            if structure is not None:
+                self.structure_cache.set(key, structure)
+        return structure
 
     def find_matching_structures(self, query):
         """
@@ -60,14 +229,25 @@ class MongoConnection(object):
     def update_structure(self, structure):
         """
         Update the db record for structure
+
+        Other processes keep any copy they hold in memory until it times out.
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        self.structure_cache.set(structure['_id'], structure)
 
     def get_course_index(self, key):
         """
         Get the course_index from the persistence mechanism whose id is the given key
         """
-        return self.course_index.find_one({'_id': key})
+        if self.course_index_cache is None:
+            return self.course_index.find_one({'_id': key})
+
+        course_index = self.course_index_cache.get(key)
+        if course_index is None:
+            course_index = self.course_index.find_one({'_id': key})
+            if course_index is not None:
+                self.course_index_cache.set(key, course_index)
+        return course_index
 
     def find_matching_course_indexes(self, query):
         """
@@ -81,18 +261,29 @@ class MongoConnection(object):
         Create the course_index in the db
         """
         self.course_index.insert(course_index)
+        self._invalidate_course_index(course_index['_id'])
 
     def update_course_index(self, course_index):
         """
         Update the db record for course_index
         """
         self.course_index.update({'_id': course_index['_id']}, course_index)
+        self._invalidate_course_index(course_index['_id'])
 
     def delete_course_index(self, key):
         """
         Delete the course_index from the persistence mechanism whose id is the given key
         """
-        return self.course_index.remove({'_id': key})
+        result = self.course_index.remove({'_id': key})
+        self._invalidate_course_index(key)
+        return result
+
+    def _invalidate_course_index(self, key):
+        """
+        Drop any cached copy of the course_index whose id is the given key
+        """
+        if self.course_index_cache is not None:
+            self.course_index_cache.delete(key)
 
     def get_definition(self, key):
         """
@@ -67,7 +67,9 @@ from .definition_lazy_loader import DefinitionLazyLoader
 from .caching_descriptor_system import CachingDescriptorSystem
 from xblock.fields import Scope
 from bson.objectid import ObjectId
-from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
+from xmodule.modulestore.split_mongo.mongo_connection import (
+    MongoConnection, DEFAULT_STRUCTURE_CACHE_SIZE, DEFAULT_STRUCTURE_CACHE_TIMEOUT
+)
 from xblock.core import XBlock
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -106,15 +108,31 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
                  i18n_service=None,
+                 structure_cache_size=DEFAULT_STRUCTURE_CACHE_SIZE,
+                 structure_cache_timeout=DEFAULT_STRUCTURE_CACHE_TIMEOUT,
+                 course_index_cache_timeout=0,
+                 structure_cache_subsystem=None,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_size: the max bytes of structures to keep in the process wide structure cache
+        :param structure_cache_timeout: seconds to cache structures for (None for no timeout); other
+            processes may see the old version of a structure rewritten in place for up to this long
+        :param course_index_cache_timeout: seconds to cache course indexes for; 0 disables caching them
+        :param structure_cache_subsystem: an optional shared cache (e.g. memcached) to use as a second
+            tier for structures and course indexes
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            structure_cache_size=structure_cache_size,
+            structure_cache_timeout=structure_cache_timeout,
+            course_index_cache_timeout=course_index_cache_timeout,
+            remote_cache=structure_cache_subsystem,
+            **doc_store_config
+        )
         self.db = self.db_connection.database
 
         # Code review question: How should I expire entries?
@@ -139,7 +157,8 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param system: a CachingDescriptorSystem
         :param base_block_ids: list of block_ids to fetch
         :param depth: how deep below these to prefetch
-        :param lazy: whether to fetch definitions or use placeholders
+        :param lazy: whether to fetch definitions or use placeholders. The placeholders share
+        the system's definition batch so the first one accessed fetches all of them at once.
         '''
         new_module_data = {}
         for block_id in base_block_ids:
@@ -152,7 +171,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         if lazy:
             for block in new_module_data.itervalues():
-                block['definition'] = DefinitionLazyLoader(self, block['definition'])
+                block['definition'] = DefinitionLazyLoader(self, block['definition'], system.definition_batch)
         else:
             # Load all descendants by id
             descendent_definitions = self.db_connection.find_matching_definitions({
@@ -242,8 +261,8 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         :param course_locator: any subclass of CourseLocator
         '''
-        # NOTE: if and when this uses cache, the update if changed logic will break if the cache
-        # holds the same objects as the descriptors!
+        # NOTE: db_connection caches structures, but every get returns a fresh copy; the update if
+        # changed logic would break if the cache held the same objects as the descriptors!
         if not course_locator.is_fully_specified():
             raise InsufficientSpecificationError('Not fully specified: %s' % course_locator)
 
@@ -1,8 +1,9 @@
 from pprint import pprint
 # pylint: disable=E0611
 from nose.tools import assert_equals, assert_raises, \
-    assert_not_equals, assert_false
+    assert_not_equals, assert_false, assert_true
 from itertools import ifilter
+from mock import patch
 # pylint: enable=E0611
 import pymongo
 import logging
@@ -15,6 +16,7 @@ from xblock.exceptions import InvalidScopeError
 from xmodule.tests import DATA_DIR
 from xmodule.modulestore import Location, MONGO_MODULESTORE_TYPE
 from xmodule.modulestore.mongo import MongoModuleStore, MongoKeyValueStore
+from xmodule.modulestore.mongo.base import metadata_cache_key
 from xmodule.modulestore.draft import DraftModuleStore
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
 from xmodule.contentstore.mongo import MongoContentStore
@@ -140,6 +142,13 @@ class TestMongoModuleStore(object):
         assert self.course_with_id_exists('edX/test_unicode/2012_Fall')
         assert self.course_with_id_exists('edX/toy/2012_Fall')
 
+    def test_get_courses_by_id(self):
+        courses = self.store.get_courses_by_id(['edX/toy/2012_Fall', 'edX/simple/2012_Fall', 'edX/missing/2012_Fall'])
+        assert_equals(sorted(courses.keys()), ['edX/simple/2012_Fall', 'edX/toy/2012_Fall'])
+        for course_id, course in courses.items():
+            assert_equals(course.id, course_id)
+            assert_equals(course.location, self.store.get_course(course_id).location)
+
     def test_loads(self):
         assert_not_equals(
             self.store.get_item("i4x://edX/toy/course/2012_Fall"),
@@ -310,6 +319,84 @@ class TestMongoModuleStore(object):
         assert_equals(len(course_locations), 1)
         assert_in(Location('i4x', 'edX', 'simple', 'course', '2012_Fall'), course_locations)
 
+    def test_update_cached_metadata_inheritance_subtree(self):
+        """
+        Updating the cached metadata inheritance tree under one container should
+        bring the entries beneath it back in line with a full computation, without
+        touching the rest of the tree
+        """
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=DictCache(),
+        )
+        chapter_location = Location('i4x', 'edX', 'toy', 'chapter', 'Overview')
+        sequence_url = Location('i4x', 'edX', 'toy', 'videosequence', 'Toy_Videos').url()
+        html_url = Location('i4x', 'edX', 'toy', 'html', 'toyhtml').url()
+        full_tree = store.compute_metadata_inheritance_tree(chapter_location)
+
+        cached_tree = store.get_cached_metadata_inheritance_tree(chapter_location)
+        cached_tree[sequence_url] = cached_tree[html_url] = {'stale': True}
+        cached_tree['i4x://edX/toy/html/elsewhere'] = {'untouched': True}
+
+        store.update_cached_metadata_inheritance_subtree(chapter_location)
+        updated_tree = store.get_cached_metadata_inheritance_tree(chapter_location)
+        assert_equals(full_tree[sequence_url], updated_tree[sequence_url])
+        assert_equals(full_tree[html_url], updated_tree[html_url])
+        assert_equals({'untouched': True}, updated_tree['i4x://edX/toy/html/elsewhere'])
+
+    def test_update_cached_metadata_inheritance_subtree_conflict(self):
+        """
+        An update of the cached metadata inheritance tree which runs while another
+        update of the course holds the lock should drop the tree rather than patch it
+        """
+        cache = DictCache()
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=cache,
+        )
+        chapter_location = Location('i4x', 'edX', 'toy', 'chapter', 'Overview')
+        key = metadata_cache_key(chapter_location)
+        store.get_cached_metadata_inheritance_tree(chapter_location)
+
+        cache.add(key + '.lock', True)
+        store.update_cached_metadata_inheritance_subtree(chapter_location)
+        assert_equals(None, cache.get(key))
+        assert_true(cache.get(key + '.conflict'))
+
+        # the update holding the lock drops the tree it wrote, too
+        cache.delete(key + '.lock')
+        store.get_cached_metadata_inheritance_tree(chapter_location)
+        with patch.object(store, '_update_cached_metadata_inheritance_subtree',
+                          side_effect=lambda location, key: cache.set(key + '.conflict', True)):
+            store.update_cached_metadata_inheritance_subtree(chapter_location)
+        assert_equals(None, cache.get(key))
+        assert_equals(None, cache.get(key + '.lock'))
+
+
+class DictCache(object):
+    """
+    A minimal in-memory stand-in for a django cache
+    """
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):  # pylint: disable=unused-argument
+        self.data[key] = value
+
+    def add(self, key, value, timeout=None):  # pylint: disable=unused-argument
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
 
 class TestMongoKeyValueStore(object):
     """
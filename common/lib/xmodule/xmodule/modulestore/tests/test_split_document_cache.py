@@ -0,0 +1,90 @@
+"""
+Tests for the split modulestore's in-process document cache
+"""
+import unittest
+
+from bson import BSON
+from bson.objectid import ObjectId
+from mock import Mock, patch
+
+from xmodule.modulestore.split_mongo.mongo_connection import DocumentCache
+
+
+class TestDocumentCache(unittest.TestCase):
+    """
+    Tests for DocumentCache
+    """
+    def setUp(self):
+        self.document = {'_id': ObjectId(), 'root': 'course', 'blocks': {'course': {'fields': {}}}}
+        self.size = len(BSON.encode(self.document))
+
+    def test_get_returns_copies(self):
+        cache = DocumentCache(10 * self.size)
+        cache.set('key', self.document)
+        first = cache.get('key')
+        self.assertEqual(first, self.document)
+        first['blocks']['course']['fields']['changed'] = True
+        self.assertEqual(cache.get('key'), self.document)
+
+    def test_counters(self):
+        cache = DocumentCache(10 * self.size)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', self.document)
+        cache.get('key')
+        cache.get('key')
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['size'], self.size)
+
+    def test_evicts_least_recently_used(self):
+        cache = DocumentCache(2 * self.size)
+        cache.set('a', self.document)
+        cache.set('b', self.document)
+        cache.get('a')
+        cache.set('c', self.document)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.size, 2 * self.size)
+
+    def test_oversized_documents_not_cached(self):
+        cache = DocumentCache(self.size - 1)
+        cache.set('key', self.document)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+    def test_delete(self):
+        cache = DocumentCache(10 * self.size)
+        cache.set('key', self.document)
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+    @patch('xmodule.modulestore.split_mongo.mongo_connection.time')
+    def test_timeout(self, mock_time):
+        mock_time.time.return_value = 100
+        cache = DocumentCache(10 * self.size, timeout=5)
+        cache.set('key', self.document)
+        mock_time.time.return_value = 104
+        self.assertIsNotNone(cache.get('key'))
+        mock_time.time.return_value = 106
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+    def test_remote_tier(self):
+        remote = {}
+        remote_cache = Mock()
+        remote_cache.get.side_effect = remote.get
+        remote_cache.set.side_effect = lambda key, value, timeout: remote.__setitem__(key, value)
+
+        writer = DocumentCache(10 * self.size, remote_cache, key_prefix='test.')
+        writer.set('key', self.document)
+        self.assertIn('test.key', remote)
+
+        reader = DocumentCache(10 * self.size, remote_cache, key_prefix='test.')
+        self.assertEqual(reader.get('key'), self.document)
+        self.assertEqual(reader.get('key'), self.document)
+        self.assertEqual(reader.remote_hits, 1)
+        self.assertEqual(reader.hits, 1)
@@ -0,0 +1,49 @@
+"""
+Tests for batched fetching of lazily loaded split mongo definitions
+"""
+import unittest
+
+from bson.objectid import ObjectId
+from mock import Mock
+
+from xmodule.modulestore.split_mongo.definition_lazy_loader import DefinitionLazyLoader, DefinitionBatch
+
+
+class TestDefinitionBatch(unittest.TestCase):
+    """
+    Tests for DefinitionBatch
+    """
+    def setUp(self):
+        self.definitions = {}
+        for category in ('chapter', 'sequential', 'problem'):
+            definition_id = ObjectId()
+            self.definitions[definition_id] = {'_id': definition_id, 'category': category, 'fields': {}}
+        self.modulestore = Mock()
+        self.modulestore.db_connection.find_matching_definitions.side_effect = lambda query: [
+            dict(self.definitions[definition_id]) for definition_id in query['_id']['$in']
+        ]
+        self.modulestore.db_connection.get_definition.side_effect = lambda key: dict(self.definitions[key])
+
+    def test_single_query(self):
+        batch = DefinitionBatch(self.modulestore)
+        loaders = [DefinitionLazyLoader(self.modulestore, definition_id, batch) for definition_id in self.definitions]
+        for loader in loaders:
+            self.assertEqual(loader.fetch(), self.definitions[loader.definition_locator.definition_id])
+        self.assertEqual(self.modulestore.db_connection.find_matching_definitions.call_count, 1)
+        self.assertFalse(self.modulestore.db_connection.get_definition.called)
+
+    def test_shared_definition(self):
+        batch = DefinitionBatch(self.modulestore)
+        definition_id = self.definitions.keys()[0]
+        first = DefinitionLazyLoader(self.modulestore, definition_id, batch)
+        second = DefinitionLazyLoader(self.modulestore, definition_id, batch)
+        first_definition = first.fetch()
+        second_definition = second.fetch()
+        self.assertEqual(first_definition, second_definition)
+        self.assertIsNot(first_definition, second_definition)
+
+    def test_unbatched(self):
+        definition_id = self.definitions.keys()[0]
+        loader = DefinitionLazyLoader(self.modulestore, definition_id)
+        self.assertEqual(loader.fetch(), self.definitions[definition_id])
+        self.assertEqual(self.modulestore.db_connection.get_definition.call_count, 1)
@@ -3,6 +3,8 @@ Tests around our XML modulestore, including importing
 well-formed and not-well-formed XML.
 """
 import os.path
+import shutil
+import tempfile
 import unittest
 from glob import glob
 from mock import patch
@@ -101,3 +103,39 @@ class TestXMLModuleStore(unittest.TestCase):
         self.assertEqual(len(course_locations), 2)
         for course_number in ['toy', 'simple']:
             self.assertIn(Location('i4x', 'edX', course_number, 'course', '2012_Fall'), course_locations)
+
+    def test_course_snapshot(self):
+        """
+        A course loaded from its snapshot matches the parsed course until the course changes
+        """
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir)
+        shutil.copytree(os.path.join(DATA_DIR, 'toy'), os.path.join(data_dir, 'toy'))
+        snapshot_dir = os.path.join(data_dir, 'snapshots')
+
+        parsed = XMLModuleStore(data_dir, course_dirs=['toy'], snapshot_dir=snapshot_dir)
+        self.assertTrue(parsed.save_course_snapshot('toy'))
+
+        with patch.object(XMLModuleStore, 'load_course') as load_course:
+            loaded = XMLModuleStore(data_dir, course_dirs=['toy'], snapshot_dir=snapshot_dir)
+        self.assertFalse(load_course.called)
+
+        course_id = 'edX/toy/2012_Fall'
+        self.assertEqual(set(loaded.modules[course_id]), set(parsed.modules[course_id]))
+        course = loaded.get_course(course_id)
+        self.assertEqual(course.display_name, parsed.get_course(course_id).display_name)
+        self.assertEqual(
+            [child.location for child in course.get_children()],
+            [child.location for child in parsed.get_course(course_id).get_children()]
+        )
+        # metadata inherited from the course's policy survives the snapshot
+        chapter = course.get_children()[0]
+        self.assertEqual(chapter.graceperiod, parsed.get_instance(course_id, chapter.location).graceperiod)
+        self.assertIsNotNone(chapter.graceperiod)
+
+        # a changed course is parsed again
+        with open(os.path.join(data_dir, 'toy', 'html', 'toyhtml.html'), 'a') as html_file:
+            html_file.write('<p>changed</p>')
+        with patch.object(XMLModuleStore, 'load_course', wraps=loaded.load_course) as load_course:
+            XMLModuleStore(data_dir, course_dirs=['toy'], snapshot_dir=snapshot_dir)
+        self.assertTrue(load_course.called)
@@ -1,3 +1,4 @@
+import cPickle as pickle
 import hashlib
 import itertools
 import json
@@ -6,6 +7,7 @@ import os
 import re
 import sys
 import glob
+import tempfile
 
 from collections import defaultdict
 from cStringIO import StringIO
@@ -24,12 +26,12 @@ from xmodule.tabs import CourseTabList
 
 from xblock.fields import ScopeIds
 from xblock.field_data import DictFieldData
-from xblock.runtime import DictKeyValueStore, IdReader, IdGenerator
+from xblock.runtime import DictKeyValueStore, IdReader, IdGenerator, KvsFieldData
 
 from . import ModuleStoreReadBase, Location, XML_MODULESTORE_TYPE
 
 from .exceptions import ItemNotFoundError
-from .inheritance import compute_inherited_metadata, inheriting_field_data
+from .inheritance import compute_inherited_metadata, inheriting_field_data, InheritanceKeyValueStore
 
 edx_xml_parser = etree.XMLParser(dtd_validation=False, load_dtd=False,
                                  remove_comments=True, remove_blank_text=True)
@@ -38,6 +40,9 @@ etree.set_default_parser(edx_xml_parser)
 
 log = logging.getLogger(__name__)
 
+# Change whenever what a course snapshot holds changes, so old snapshots are ignored
+SNAPSHOT_FORMAT_VERSION = 1
+
 
 # VS[compat]
 # TODO (cpennington): Remove this once all fall 2012 courses have been imported
@@ -348,13 +353,50 @@ class ParentTracker(object):
         return list(self._parents[child])
 
 
+def _tree_fingerprint(root, skip_dirs=()):
+    """
+    A digest of the paths, sizes and mtimes of root's subdirectories and files
+    (other than those under the top level skip_dirs), which changes whenever
+    anything under root is added, removed or written.
+    """
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [dirname for dirname in dirnames if dirname not in skip_dirs]
+        dirnames.sort()
+        for name in [''] + sorted(filenames):
+            file_path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update(u'{0}\0{1}\0{2!r}\0'.format(
+                os.path.relpath(file_path, root), stat.st_size, stat.st_mtime
+            ).encode('utf-8'))
+    return digest.hexdigest()
+
+
+_CODE_FINGERPRINT = []
+
+
+def _code_fingerprint():
+    """
+    A digest of the xmodule package's source files, so that snapshots of
+    courses parsed by other code aren't used.
+    """
+    if not _CODE_FINGERPRINT:
+        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _CODE_FINGERPRINT.append(_tree_fingerprint(package_dir))
+    return _CODE_FINGERPRINT[0]
+
+
 class XMLModuleStore(ModuleStoreReadBase):
     """
     An XML backed ModuleStore
     """
     def __init__(
         self, data_dir, default_class=None, course_dirs=None, course_ids=None,
-        load_error_modules=True, i18n_service=None, **kwargs
+        load_error_modules=True, i18n_service=None, snapshot_dir=None, **kwargs
     ):
         """
         Initialize an XMLModuleStore from data_dir
@@ -366,6 +408,12 @@ class XMLModuleStore(ModuleStoreReadBase):
 
         course_dirs or course_ids: If specified, the list of course_dirs or course_ids to load. Otherwise,
             load all courses. Note, providing both
+
+        snapshot_dir: If specified, a directory of course snapshots (see
+            save_course_snapshot) to load courses from instead of parsing
+            them, when a course hasn't changed since its snapshot was saved.
+            Snapshots are pickles, so only the deployment should be able to
+            write to this directory.
         """
         super(XMLModuleStore, self).__init__(**kwargs)
 
@@ -373,6 +421,8 @@ class XMLModuleStore(ModuleStoreReadBase):
         self.modules = defaultdict(dict)  # course_id -> dict(location -> XBlock)
         self.courses = {}  # course_dir -> XBlock for the course
         self.errored_courses = {}  # course_dir -> errorlog, for dirs that failed to load
+        self.snapshot_dir = path(snapshot_dir) if snapshot_dir is not None else None
+        self._policies = {}  # course_id -> the course's policy
 
         self.load_error_modules = load_error_modules
 
@@ -414,7 +464,10 @@ class XMLModuleStore(ModuleStoreReadBase):
         errorlog = make_error_tracker()
         course_descriptor = None
         try:
-            course_descriptor = self.load_course(course_dir, course_ids, errorlog.tracker)
+            if self.snapshot_dir is not None:
+                course_descriptor = self.load_course_snapshot(course_dir, course_ids, errorlog)
+            if course_descriptor is None:
+                course_descriptor = self.load_course(course_dir, course_ids, errorlog.tracker)
         except Exception as e:
             msg = "ERROR: Failed to load course '{0}': {1}".format(
                 course_dir.encode("utf-8"), unicode(e)
@@ -525,30 +578,8 @@ class XMLModuleStore(ModuleStoreReadBase):
             if course_ids is not None and course_id not in course_ids:
                 return None
 
-            def get_policy(usage_id):
-                """
-                Return the policy dictionary to be applied to the specified XBlock usage
-                """
-                return policy.get(policy_key(usage_id), {})
-
-            services = {}
-            if self.i18n_service:
-                services['i18n'] = self.i18n_service
-
-            system = ImportSystem(
-                xmlstore=self,
-                course_id=course_id,
-                course_dir=course_dir,
-                error_tracker=tracker,
-                parent_tracker=self.parent_trackers[course_id],
-                load_error_modules=self.load_error_modules,
-                get_policy=get_policy,
-                mixins=self.xblock_mixins,
-                default_class=self.default_class,
-                select=self.xblock_select,
-                field_data=self.field_data,
-                services=services,
-            )
+            self._policies[course_id] = policy
+            system = self._make_import_system(course_id, course_dir, policy, tracker)
 
             course_descriptor = system.process_xml(etree.tostring(course_data, encoding='unicode'))
 
@@ -577,6 +608,167 @@ class XMLModuleStore(ModuleStoreReadBase):
             log.debug('========> Done with course import from {0}'.format(course_dir))
             return course_descriptor
 
+    def _make_import_system(self, course_id, course_dir, policy, tracker):
+        """
+        Return the ImportSystem for loading the course course_id from course_dir
+        """
+        def get_policy(usage_id):
+            """
+            Return the policy dictionary to be applied to the specified XBlock usage
+            """
+            return policy.get(policy_key(usage_id), {})
+
+        services = {}
+        if self.i18n_service:
+            services['i18n'] = self.i18n_service
+
+        return ImportSystem(
+            xmlstore=self,
+            course_id=course_id,
+            course_dir=course_dir,
+            error_tracker=tracker,
+            parent_tracker=self.parent_trackers[course_id],
+            load_error_modules=self.load_error_modules,
+            get_policy=get_policy,
+            mixins=self.xblock_mixins,
+            default_class=self.default_class,
+            select=self.xblock_select,
+            field_data=self.field_data,
+            services=services,
+        )
+
+    def _snapshot_path(self, course_dir):
+        """
+        Where the snapshot of the course in course_dir is saved
+        """
+        return self.snapshot_dir / u'{0}.snapshot'.format(course_dir)
+
+    def _snapshot_fingerprint(self, course_dir):
+        """
+        What a snapshot of the course in course_dir must have been saved with to
+        still be the course this store would load: it changes when any of the
+        course's files (other than its static files, which aren't loaded) or
+        of the loading code change, or the store is set up differently.
+        """
+        return hashlib.sha1(json.dumps([
+            SNAPSHOT_FORMAT_VERSION,
+            _tree_fingerprint(self.data_dir / course_dir, skip_dirs=('static',)),
+            _code_fingerprint(),
+            self.load_error_modules,
+            repr(self.default_class),
+            [repr(mixin) for mixin in self.xblock_mixins],
+        ])).hexdigest()
+
+    def save_course_snapshot(self, course_dir):
+        """
+        Save a snapshot of the loaded course from course_dir to snapshot_dir,
+        from which later stores can load it (see load_course_snapshot) without
+        parsing it again.
+
+        Returns False (and saves nothing) if the course can't be snapshotted
+        because it failed to load or has blocks whose field data isn't one of
+        those the xml loading gives them.
+        """
+        course_descriptor = self.courses.get(course_dir)
+        if course_descriptor is None:
+            return False
+        course_id = course_descriptor.id
+
+        blocks = []
+        for usage_id, block in self.modules[course_id].iteritems():
+            field_data = block._field_data  # pylint: disable=protected-access
+            if isinstance(field_data, DictFieldData):
+                stored_fields = ('dict', field_data._data, None)  # pylint: disable=protected-access
+            elif isinstance(field_data, KvsFieldData) and isinstance(block.xblock_kvs, InheritanceKeyValueStore):
+                stored_fields = (
+                    'kvs', block.xblock_kvs._fields, block.xblock_kvs.inherited_settings  # pylint: disable=protected-access
+                )
+            else:
+                log.info(u'Not snapshotting %s: %s has unsupported field data', course_dir, usage_id)
+                return False
+            block_class = getattr(block, 'unmixed_class', block.__class__)
+            blocks.append((
+                usage_id, block.scope_ids, block_class.__module__, block_class.__name__,
+                getattr(block, 'data_dir', None),
+            ) + stored_fields)
+
+        snapshot = {
+            'fingerprint': self._snapshot_fingerprint(course_dir),
+            'course_id': course_id,
+            'course_usage_id': course_descriptor.scope_ids.usage_id,
+            'policy': self._policies.get(course_id, {}),
+            'errors': self._location_errors[course_descriptor.scope_ids.usage_id].errors,
+            'parents': self.parent_trackers[course_id]._parents,  # pylint: disable=protected-access
+            'blocks': blocks,
+        }
+
+        if not os.path.isdir(self.snapshot_dir):
+            os.makedirs(self.snapshot_dir)
+        # write it to a temporary file and rename that into place so loaders never see a partial snapshot
+        handle, temp_path = tempfile.mkstemp(prefix='.', dir=self.snapshot_dir)
+        try:
+            with os.fdopen(handle, 'wb') as snapshot_file:
+                pickle.dump(snapshot, snapshot_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self._snapshot_path(course_dir))
+        except (pickle.PicklingError, TypeError):
+            log.info(u'Not snapshotting %s: it has field values which can\'t be pickled', course_dir, exc_info=True)
+            os.remove(temp_path)
+            return False
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True
+
+    def load_course_snapshot(self, course_dir, course_ids, errorlog):
+        """
+        Load the course in course_dir from its snapshot in snapshot_dir into
+        this module store, adding the errors from loading it to errorlog.
+
+        Returns the CourseDescriptor for the course, or None if there's no
+        snapshot of the course as it is now (or the course isn't one of
+        course_ids).
+        """
+        snapshot_path = self._snapshot_path(course_dir)
+        if not os.path.exists(snapshot_path):
+            return None
+        try:
+            with open(snapshot_path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except Exception:  # pylint: disable=broad-except
+            log.warning(u'Ignoring unreadable course snapshot %s', snapshot_path, exc_info=True)
+            return None
+        if snapshot.get('fingerprint') != self._snapshot_fingerprint(course_dir):
+            log.info(u'Ignoring out of date course snapshot %s', snapshot_path)
+            return None
+
+        course_id = snapshot['course_id']
+        if course_ids is not None and course_id not in course_ids:
+            return None
+
+        log.debug('========> Loading course from snapshot {0}'.format(snapshot_path))
+        errorlog.errors.extend(snapshot['errors'])
+        self._policies[course_id] = snapshot['policy']
+        self.parent_trackers[course_id]._parents.update(snapshot['parents'])  # pylint: disable=protected-access
+        system = self._make_import_system(course_id, course_dir, snapshot['policy'], errorlog.tracker)
+
+        modules = {}
+        for (usage_id, scope_ids, class_module, class_name, data_dir,
+             kind, fields, inherited_settings) in snapshot['blocks']:
+            block_class = getattr(import_module(class_module), class_name)
+            if kind == 'dict':
+                field_data = DictFieldData(fields)
+            else:
+                field_data = KvsFieldData(InheritanceKeyValueStore(
+                    initial_values=fields, inherited_settings=inherited_settings
+                ))
+            block = system.construct_xblock_from_class(block_class, scope_ids, field_data)
+            if data_dir is not None:
+                block.data_dir = data_dir
+            modules[usage_id] = block
+        self.modules[course_id].update(modules)
+        return modules[snapshot['course_usage_id']]
+
     def load_extra_content(self, system, course_descriptor, category, base_dir, course_dir, url_name):
         self._load_extra_content(system, course_descriptor, category, base_dir, course_dir)
 
@@ -12,8 +12,13 @@ from json import dumps
 import json
 import datetime
 import os
+from functools import partial
+from fs.memoryfs import MemoryFS
+from multiprocessing.pool import ThreadPool
 from path import path
 import shutil
+import tarfile
+from xmodule.util.tarball import add_string_to_tar
 
 DRAFT_DIR = "drafts"
 PUBLISHED_DIR = "published"
@@ -45,7 +50,8 @@ class EdxJSONEncoder(json.JSONEncoder):
             return super(EdxJSONEncoder, self).default(obj)
 
 
-def export_to_xml(modulestore, contentstore, course_location, root_dir, course_dir, draft_modulestore=None):
+def export_to_xml(modulestore, contentstore, course_location, root_dir, course_dir, draft_modulestore=None,
+                  workers=1):
     """
     Export all modules from `modulestore` and content from `contentstore` as xml to `root_dir`.
 
@@ -56,13 +62,99 @@ def export_to_xml(modulestore, contentstore, course_location, root_dir, course_d
     `course_dir`: The name of the directory inside `root_dir` to write the course content to
     `draft_modulestore`: An optional `DraftModuleStore` that contains draft content, which will be exported
         alongside the public content in the course.
+    `workers`: If more than 1, the static assets are copied by this many threads while the modules are
+        being exported.
     """
+    fs = OSFS(root_dir)
+    export_fs = fs.makeopendir(course_dir)
+    # the assets policy is written here
+    export_fs.makeopendir('policies')
+
+    export_assets = None
+    if contentstore:
+        export_assets = partial(
+            contentstore.export_all_for_course,
+            course_location,
+            root_dir + '/' + course_dir + '/static/',
+            root_dir + '/' + course_dir + '/policies/assets.json',
+            workers=workers,
+        )
+
+    _export_concurrently(
+        export_assets,
+        partial(_export_modules, modulestore, course_location, export_fs, draft_modulestore),
+        workers > 1
+    )
+
+
+def export_to_tarball(modulestore, contentstore, course_location, fileobj, course_dir, draft_modulestore=None,
+                      workers=1):
+    """
+    Export the course as export_to_xml does, but as a gzipped tar file with `course_dir` as its top
+    directory, written to `fileobj`.
+
+    Nothing is staged on disk: the static assets are streamed from `contentstore` into the tar file and
+    the modules' xml is written to memory and added after them. If `workers` is more than 1, the assets are
+    streamed while the modules are being exported.
+    """
+    export_fs = MemoryFS()
+    tar_file = tarfile.open(fileobj=fileobj, mode='w|gz')
+    try:
+        export_assets = None
+        if contentstore:
+            export_assets = partial(
+                contentstore.export_all_for_course_to_tar,
+                course_location,
+                tar_file,
+                course_dir + '/static',
+                course_dir + '/policies/assets.json',
+            )
+
+        _export_concurrently(
+            export_assets,
+            partial(_export_modules, modulestore, course_location, export_fs, draft_modulestore),
+            workers > 1
+        )
 
+        for file_path in sorted(export_fs.walkfiles()):
+            add_string_to_tar(tar_file, course_dir + file_path, export_fs.getcontents(file_path))
+    finally:
+        tar_file.close()
+
+
+def _export_concurrently(export_assets, export_modules, concurrent):
+    """
+    Call export_assets (unless it's None) and export_modules, at the same time if concurrent.
+
+    The modules are always exported by the calling thread, since the modulestores keep per-request state
+    in thread locals.
+    """
+    if export_assets is None:
+        export_modules()
+    elif not concurrent:
+        export_assets()
+        export_modules()
+    else:
+        pool = ThreadPool(1)
+        try:
+            assets_exported = pool.apply_async(export_assets)
+            export_modules()
+            # reraises anything export_assets raised
+            assets_exported.get()
+        finally:
+            pool.close()
+            pool.join()
+
+
+def _export_modules(modulestore, course_location, export_fs, draft_modulestore=None):
+    """
+    Export the course at `course_location` in `modulestore`, its extra content, policies and
+    drafts (from `draft_modulestore`, if given) to the filesystem `export_fs`
+    """
     course_id = course_location.course_id
     course = modulestore.get_course(course_id)
 
-    fs = OSFS(root_dir)
-    export_fs = course.runtime.export_fs = fs.makeopendir(course_dir)
+    course.runtime.export_fs = export_fs
 
     root = lxml.etree.Element('unknown')
     course.add_xml_to_node(root)
@@ -70,14 +162,7 @@ def export_to_xml(modulestore, contentstore, course_location, root_dir, course_d
     with export_fs.open('course.xml', 'w') as course_xml:
         lxml.etree.ElementTree(root).write(course_xml)
 
-    # export the static assets
     policies_dir = export_fs.makeopendir('policies')
-    if contentstore:
-        contentstore.export_all_for_course(
-            course_location,
-            root_dir + '/' + course_dir + '/static/',
-            root_dir + '/' + course_dir + '/policies/assets.json',
-        )
 
     # export the static tabs
     export_extra_content(export_fs, modulestore, course_id, course_location, 'static_tab', 'tabs', '.html')
@@ -1,6 +1,11 @@
+import hashlib
 import logging
 import os
 import mimetypes
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from path import path
 import json
 
@@ -15,11 +20,130 @@ import xblock
 
 log = logging.getLogger(__name__)
 
+# incremental imports stream static files of at least this many bytes, this many bytes at a time
+STREAM_FILE_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class ImportTimings(object):
+    """
+    Accumulates how many seconds each phase of an import took.
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time the block as (part of) the phase called name
+        """
+        started = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - started
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            log.info(u'import phase %s took %.2fs', name, elapsed)
+
+    def __unicode__(self):
+        return u', '.join(u'{}: {:.2f}s'.format(name, seconds) for name, seconds in self.phases.iteritems())
+
+
+def _file_md5(file_path):
+    """
+    The md5 hex digest of the file's content, read in chunks
+    """
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _file_chunks(file_path):
+    """
+    Yield the content of the file in chunks
+    """
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), ''):
+            yield chunk
+
+
+def _import_static_file(static_content_store, content_path, content_loc, displayname, mime_type,
+                        fullname_with_subpath, locked, existing=None):
+    """
+    Save the file at content_path, with a thumbnail if it's an image, as content_loc.
+
+    If `existing` (the contentstore's attributes of the asset already at
+    content_loc) is given, files with the same content and type as it aren't
+    saved again, only their other attributes are updated if they changed. Large
+    files are streamed into the contentstore rather than read into memory.
+
+    Returns False if the file was skipped as an unreadable hidden file.
+    """
+    filename = os.path.basename(content_path)
+    try:
+        # only hash the file if there's a stored asset it could be the same as
+        if existing and existing.get('md5') and existing.get('contentType') == mime_type and \
+                existing['md5'] == _file_md5(content_path):
+            attrs = {'displayname': displayname, 'locked': locked, 'import_path': fullname_with_subpath}
+            # assets saved before 'locked' existed don't have it
+            stored = dict({'locked': False}, **existing)
+            changed = dict((attr, value) for attr, value in attrs.iteritems() if stored.get(attr) != value)
+            if changed:
+                static_content_store.set_attrs(content_loc, changed)
+            return True
+
+        if existing is not None and os.path.getsize(content_path) >= STREAM_FILE_SIZE:
+            data = _file_chunks(content_path)
+            thumbnail_source = content_path
+        else:
+            with open(content_path, 'rb') as f:
+                data = f.read()
+            thumbnail_source = None
+    except IOError:
+        if filename.startswith('._'):
+            # OS X "companion files". See
+            # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
+            return False
+        # Not a 'hidden file', then re-raise exception
+        raise
+
+    content = StaticContent(
+        content_loc, displayname, mime_type, data,
+        import_path=fullname_with_subpath, locked=locked
+    )
+
+    # first let's save a thumbnail so we can get back a thumbnail location
+    thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(
+        content, tempfile_path=thumbnail_source
+    )
+
+    if thumbnail_content is not None:
+        content.thumbnail_location = thumbnail_location
+
+    # then commit the content
+    try:
+        static_content_store.save(content)
+    except Exception as err:
+        log.exception('Error importing {0}, error={1}'.format(
+            fullname_with_subpath, err
+        ))
+    return True
+
 
 def import_static_content(
         modules, course_loc, course_data_path, static_content_store,
-        target_location_namespace, subpath='static', verbose=False):
+        target_location_namespace, subpath='static', verbose=False,
+        incremental=False, workers=1):
+    """
+    Import the files under course_data_path/subpath into static_content_store.
 
+    incremental: don't save files whose content is already in the store, and
+        stream large files into it
+
+    workers: how many files to save at once
+    """
     remap_dict = {}
 
     # now import all static assets
@@ -35,6 +159,11 @@ def import_static_content(
     verbose = True
     mimetypes_list = mimetypes.types_map.values()
 
+    if incremental:
+        existing_assets, _count = static_content_store.get_all_content_for_course(target_location_namespace)
+        existing_assets = dict((asset['_id']['name'], asset) for asset in existing_assets)
+
+    static_files = []
     for dirname, _, filenames in os.walk(static_dir):
         for filename in filenames:
 
@@ -48,17 +177,6 @@ def import_static_content(
             if verbose:
                 log.debug('importing static content %s...', content_path)
 
-            try:
-                with open(content_path, 'rb') as f:
-                    data = f.read()
-            except IOError:
-                if filename.startswith('._'):
-                    # OS X "companion files". See
-                    # http://www.diigo.com/annotated/0c936fda5da4aa1159c189cea227e174
-                    continue
-                # Not a 'hidden file', then re-raise exception
-                raise
-
             # strip away leading path from the name
             fullname_with_subpath = content_path.replace(static_dir, '')
             if fullname_with_subpath.startswith('/'):
@@ -76,25 +194,25 @@ def import_static_content(
             # Check extracted contentType in list of all valid mimetypes
             if not mime_type or mime_type not in mimetypes_list:
                 mime_type = mimetypes.guess_type(filename)[0]   # Assign guessed mimetype
-            content = StaticContent(
-                content_loc, displayname, mime_type, data,
-                import_path=fullname_with_subpath, locked=locked
-            )
 
-            # first let's save a thumbnail so we can get back a thumbnail location
-            thumbnail_content, thumbnail_location = static_content_store.generate_thumbnail(content)
+            existing = existing_assets.get(content_loc.name, {}) if incremental else None
+            static_files.append((
+                content_path, content_loc, displayname, mime_type, fullname_with_subpath, locked, existing
+            ))
 
-            if thumbnail_content is not None:
-                content.thumbnail_location = thumbnail_location
-
-            # then commit the content
-            try:
-                static_content_store.save(content)
-            except Exception as err:
-                log.exception('Error importing {0}, error={1}'.format(
-                    fullname_with_subpath, err
-                ))
+    import_file = lambda args: _import_static_file(static_content_store, *args)
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            imported = pool.map(import_file, static_files)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        imported = [import_file(args) for args in static_files]
 
+    for (_, content_loc, _, _, fullname_with_subpath, _, _), was_imported in zip(static_files, imported):
+        if was_imported:
             # store the remapping information which will be needed
             # to subsitute in the module data
             remap_dict[fullname_with_subpath] = content_loc.name
@@ -107,7 +225,7 @@ def import_from_xml(
         default_class='xmodule.raw_module.RawDescriptor',
         load_error_modules=True, static_content_store=None,
         target_location_namespace=None, verbose=False, draft_store=None,
-        do_import_static=True):
+        do_import_static=True, incremental=False, workers=1, timings=None):
     """
     Import the specified xml data_dir into the "store" modulestore,
     using org and course as the location org and course.
@@ -130,16 +248,31 @@ def import_from_xml(
         time the course is loaded. Static content for some courses may also be
         served directly by nginx, instead of going through django.
 
-    """
+    :param incremental:
+        if True, static files whose content is already in the static content
+        store aren't saved again, large static files are streamed into it,
+        and the modules which aren't in the store yet are inserted in batches
+        (where the store supports that).
 
-    xml_module_store = XMLModuleStore(
-        data_dir,
-        default_class=default_class,
-        course_dirs=course_dirs,
-        load_error_modules=load_error_modules,
-        xblock_mixins=store.xblock_mixins,
-        xblock_select=store.xblock_select,
-    )
+    :param workers:
+        how many static files to save concurrently.
+
+    :param timings:
+        an ImportTimings to add the time each phase of the import took to.
+
+    """
+    if timings is None:
+        timings = ImportTimings()
+
+    with timings.phase('parse'):
+        xml_module_store = XMLModuleStore(
+            data_dir,
+            default_class=default_class,
+            course_dirs=course_dirs,
+            load_error_modules=load_error_modules,
+            xblock_mixins=store.xblock_mixins,
+            xblock_select=store.xblock_select,
+        )
 
     # NOTE: the XmlModuleStore does not implement get_items()
     # which would be a preferable means to enumerate the entire collection
@@ -208,12 +341,13 @@ def import_from_xml(
                             # note, add 'progress' when we can support it on Edge
                         ]
 
-                    import_module(
-                        module, store, course_data_path, static_content_store,
-                        course_location,
-                        target_location_namespace or course_location,
-                        do_import_static=do_import_static
-                    )
+                    with timings.phase('course'):
+                        import_module(
+                            module, store, course_data_path, static_content_store,
+                            course_location,
+                            target_location_namespace or course_location,
+                            do_import_static=do_import_static
+                        )
 
                     course_items.append(module)
 
@@ -225,11 +359,13 @@ def import_from_xml(
                     _namespace_rename = course_location
 
                 # first pass to find everything in /static/
-                import_static_content(
-                    xml_module_store.modules[course_id], course_location,
-                    course_data_path, static_content_store,
-                    _namespace_rename, subpath='static', verbose=verbose
-                )
+                with timings.phase('static'):
+                    import_static_content(
+                        xml_module_store.modules[course_id], course_location,
+                        course_data_path, static_content_store,
+                        _namespace_rename, subpath='static', verbose=verbose,
+                        incremental=incremental, workers=workers
+                    )
 
             elif verbose and not do_import_static:
                 log.debug(
@@ -254,46 +390,61 @@ def import_from_xml(
                 else:
                     _namespace_rename = course_location
 
-                import_static_content(
-                    xml_module_store.modules[course_id], course_location,
-                    course_data_path, static_content_store,
-                    _namespace_rename, subpath=simport, verbose=verbose
-                )
+                with timings.phase('static_import'):
+                    import_static_content(
+                        xml_module_store.modules[course_id], course_location,
+                        course_data_path, static_content_store,
+                        _namespace_rename, subpath=simport, verbose=verbose,
+                        incremental=incremental, workers=workers
+                    )
 
             # finally loop through all the modules
-            for module in xml_module_store.modules[course_id].itervalues():
-                if module.scope_ids.block_type == 'course':
-                    # we've already saved the course module up at the top
-                    # of the loop so just skip over it in the inner loop
-                    continue
-
-                # remap module to the new namespace
-                if target_location_namespace is not None:
-                    module = remap_namespace(module, target_location_namespace)
-
-                if verbose:
-                    log.debug('importing module location {loc}'.format(
-                        loc=module.location
-                    ))
+            with timings.phase('modules'):
+                modules = []
+                for module in xml_module_store.modules[course_id].itervalues():
+                    if module.scope_ids.block_type == 'course':
+                        # we've already saved the course module up at the top
+                        # of the loop so just skip over it in the inner loop
+                        continue
+
+                    # remap module to the new namespace
+                    if target_location_namespace is not None:
+                        module = remap_namespace(module, target_location_namespace)
+
+                    if verbose:
+                        log.debug('importing module location {loc}'.format(
+                            loc=module.location
+                        ))
 
-                import_module(
-                    module, store, course_data_path, static_content_store,
-                    course_location,
-                    target_location_namespace if target_location_namespace else course_location,
-                    do_import_static=do_import_static
-                )
+                    if incremental and hasattr(store, 'update_items'):
+                        prepare_module_for_import(
+                            module, course_location,
+                            target_location_namespace if target_location_namespace else course_location,
+                            do_import_static=do_import_static
+                        )
+                        modules.append(module)
+                    else:
+                        import_module(
+                            module, store, course_data_path, static_content_store,
+                            course_location,
+                            target_location_namespace if target_location_namespace else course_location,
+                            do_import_static=do_import_static
+                        )
+                if modules:
+                    store.update_items(modules, '**replace_user**')
 
             # now import any 'draft' items
             if draft_store is not None:
-                import_course_draft(
-                    xml_module_store,
-                    store,
-                    draft_store,
-                    course_data_path,
-                    static_content_store,
-                    course_location,
-                    target_location_namespace if target_location_namespace else course_location
-                )
+                with timings.phase('drafts'):
+                    import_course_draft(
+                        xml_module_store,
+                        store,
+                        draft_store,
+                        course_data_path,
+                        static_content_store,
+                        course_location,
+                        target_location_namespace if target_location_namespace else course_location
+                    )
 
         finally:
             # turn back on all write signalling on stores that need it
@@ -304,6 +455,7 @@ def import_from_xml(
                     target_location_namespace if target_location_namespace is not None else course_location
                 )
 
+    log.info(u'imported %s in %s', data_dir, unicode(timings))
     return xml_module_store, course_items
 
 
@@ -314,6 +466,18 @@ def import_module(
 
     logging.debug(u'processing import of module {}...'.format(module.location.url()))
 
+    prepare_module_for_import(
+        module, source_course_location, dest_course_location, do_import_static=do_import_static
+    )
+
+    store.update_item(module, '**replace_user**', allow_not_found=allow_not_found)
+
+
+def prepare_module_for_import(module, source_course_location, dest_course_location, do_import_static=True):
+    """
+    Make the changes to module which import_module makes before saving it
+    """
+
     if do_import_static and 'data' in module.fields and isinstance(module.fields['data'], xblock.fields.String):
         # we want to convert all 'non-portable' links in the module_data
         # (if it is a string) to portable strings (e.g. /static/)
@@ -329,8 +493,6 @@ def import_module(
     if 'index_in_children_list' in getattr(module, 'xml_attributes', []):
         del module.xml_attributes['index_in_children_list']
 
-    store.update_item(module, '**replace_user**', allow_not_found=allow_not_found)
-
 
 def import_course_draft(
         xml_module_store, store, draft_store, course_data_path,
@@ -0,0 +1,59 @@
+"""
+Tests for the local disk tier of the asset cache
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from xmodule.contentstore.disk_cache import DiskContentCache
+
+
+class DiskContentCacheTest(unittest.TestCase):
+    """
+    Tests for DiskContentCache
+    """
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+    def test_add_and_get(self):
+        cache = DiskContentCache(self.root, max_size=100)
+        self.assertIsNone(cache.get('abc123'))
+        path = cache.add('abc123', StringIO('x' * 10))
+        self.assertEqual(cache.get('abc123'), path)
+        with open(path, 'rb') as cached:
+            self.assertEqual(cached.read(), 'x' * 10)
+        self.assertEqual(cache.size, 10)
+
+    def test_evicts_least_recently_used(self):
+        cache = DiskContentCache(self.root, max_size=25)
+        cache.add('aa1', StringIO('x' * 10))
+        cache.add('bb2', StringIO('x' * 10))
+        cache.get('aa1')
+        cache.add('cc3', StringIO('x' * 10))
+        self.assertIsNotNone(cache.get('aa1'))
+        self.assertIsNone(cache.get('bb2'))
+        self.assertIsNotNone(cache.get('cc3'))
+        self.assertEqual(cache.size, 20)
+
+    def test_too_big(self):
+        cache = DiskContentCache(self.root, max_size=5)
+        self.assertIsNone(cache.add('abc123', StringIO('x' * 10)))
+        self.assertIsNone(cache.get('abc123'))
+        self.assertEqual(cache.size, 0)
+
+    def test_remove(self):
+        cache = DiskContentCache(self.root, max_size=100)
+        path = cache.add('abc123', StringIO('x' * 10))
+        cache.remove('abc123')
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(cache.get('abc123'))
+        self.assertEqual(cache.size, 0)
+
+    def test_reloads_existing_files(self):
+        DiskContentCache(self.root, max_size=100).add('abc123', StringIO('x' * 10))
+        cache = DiskContentCache(self.root, max_size=100)
+        self.assertEqual(cache.size, 10)
+        self.assertIsNotNone(cache.get('abc123'))
@@ -0,0 +1,25 @@
+"""
+Helpers for writing tar files without staging their content on disk.
+"""
+import tarfile
+import time
+from cStringIO import StringIO
+
+
+def tar_member_name(name):
+    """
+    name as tarfile wants it: a utf-8 encoded string
+    """
+    if isinstance(name, unicode):
+        return name.encode('utf-8')
+    return name
+
+
+def add_string_to_tar(tar_file, name, data):
+    """
+    Add a file called name containing the (byte) string data to tar_file
+    """
+    info = tarfile.TarInfo(tar_member_name(name))
+    info.size = len(data)
+    info.mtime = time.time()
+    tar_file.addfile(info, StringIO(data))
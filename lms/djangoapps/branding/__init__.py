@@ -11,8 +11,15 @@ def get_visible_courses():
     """
     _courses = modulestore().get_courses()
 
-    courses = [c for c in _courses
-               if isinstance(c, CourseDescriptor)]
+    return filter_visible_courses([c for c in _courses if isinstance(c, CourseDescriptor)])
+
+
+def filter_visible_courses(courses):
+    """
+    Return those of the given courses (CourseDescriptors or anything else with their
+    id, number and location) that should be visible in this branded instance, sorted
+    by course number
+    """
     courses = sorted(courses, key=lambda course: course.number)
 
     subdomain = microsite.get_value('subdomain', 'default')
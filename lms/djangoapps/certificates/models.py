@@ -131,14 +131,35 @@ def certificate_status_for_student(student, course_id):
     try:
         generated_certificate = GeneratedCertificate.objects.get(
             user=student, course_id=course_id)
-        d = {'status': generated_certificate.status,
-             'mode': generated_certificate.mode}
-        if generated_certificate.grade:
-            d['grade'] = generated_certificate.grade
-        if generated_certificate.status == CertificateStatuses.downloadable:
-            d['download_url'] = generated_certificate.download_url
-
-        return d
     except GeneratedCertificate.DoesNotExist:
-        pass
-    return {'status': CertificateStatuses.unavailable, 'mode': GeneratedCertificate.MODES.honor}
+        generated_certificate = None
+    return _certificate_status(generated_certificate)
+
+
+def certificate_statuses_for_student(student, course_ids):
+    """
+    Returns a dict of course_id -> the dictionary that
+    certificate_status_for_student would return for that course, for all
+    the given course ids at once.
+    """
+    certificates = {
+        generated_certificate.course_id: generated_certificate
+        for generated_certificate in GeneratedCertificate.objects.filter(user=student, course_id__in=course_ids)
+    }
+    return {course_id: _certificate_status(certificates.get(course_id)) for course_id in course_ids}
+
+
+def _certificate_status(generated_certificate):
+    """
+    The status dictionary (see certificate_status_for_student) for the
+    given GeneratedCertificate, or for a missing one if it's None.
+    """
+    if generated_certificate is None:
+        return {'status': CertificateStatuses.unavailable, 'mode': GeneratedCertificate.MODES.honor}
+    d = {'status': generated_certificate.status,
+         'mode': generated_certificate.mode}
+    if generated_certificate.grade:
+        d['grade'] = generated_certificate.grade
+    if generated_certificate.status == CertificateStatuses.downloadable:
+        d['download_url'] = generated_certificate.download_url
+    return d
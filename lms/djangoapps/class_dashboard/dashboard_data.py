@@ -3,7 +3,6 @@ Computes the data to display on the Instructor Dashboard
 """
 
 from courseware import models
-from django.db.models import Count
 from django.utils.translation import ugettext as _
 
 from xmodule.course_module import CourseDescriptor
@@ -11,6 +10,14 @@ from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.inheritance import own_metadata
 
 
+def _with_max_grades(rows):
+    """Yield the ProblemGradeCount `rows`, with a max_grade of None where they have none."""
+    for row in rows:
+        if row['max_grade'] == models.ProblemGradeCount.NO_MAX_GRADE:
+            row['max_grade'] = None
+        yield row
+
+
 def get_problem_grade_distribution(course_id):
     """
     Returns the grade distribution per problem for the course
@@ -22,22 +29,22 @@ def get_problem_grade_distribution(course_id):
         'grade_distrib' - array of tuples (`grade`,`count`).
     """
 
-    # Aggregate query on studentmodule table for grade data for all problems in course
-    db_query = models.StudentModule.objects.filter(
+    # Grade counts for all problems in course, kept up to date as students are graded
+    models.ModuleCountChange.apply(course_id)
+    db_query = models.ProblemGradeCount.objects.filter(
         course_id__exact=course_id,
-        grade__isnull=False,
-        module_type__exact="problem",
-    ).values('module_state_key', 'grade', 'max_grade').annotate(count_grade=Count('grade'))
+        count__gt=0,
+    ).values('module_state_key', 'grade', 'max_grade', 'count')
 
     prob_grade_distrib = {}
 
     # Loop through resultset building data for each problem
-    for row in db_query:
+    for row in _with_max_grades(db_query):
         curr_problem = row['module_state_key']
 
         # Build set of grade distributions for each problem that has student responses
         if curr_problem in prob_grade_distrib:
-            prob_grade_distrib[curr_problem]['grade_distrib'].append((row['grade'], row['count_grade']))
+            prob_grade_distrib[curr_problem]['grade_distrib'].append((row['grade'], row['count']))
 
             if (prob_grade_distrib[curr_problem]['max_grade'] != row['max_grade']) and \
                     (prob_grade_distrib[curr_problem]['max_grade'] < row['max_grade']):
@@ -46,7 +53,7 @@ def get_problem_grade_distribution(course_id):
         else:
             prob_grade_distrib[curr_problem] = {
                 'max_grade': row['max_grade'],
-                'grade_distrib': [(row['grade'], row['count_grade'])]
+                'grade_distrib': [(row['grade'], row['count'])]
             }
 
     return prob_grade_distrib
@@ -61,16 +68,17 @@ def get_sequential_open_distrib(course_id):
     Outputs a dict mapping the 'module_id' to the number of students that have opened that subsection/sequential.
     """
 
-    # Aggregate query on studentmodule table for "opening a subsection" data
-    db_query = models.StudentModule.objects.filter(
+    # "Opening a subsection" counts, kept up to date as students open them
+    models.ModuleCountChange.apply(course_id)
+    db_query = models.SequentialOpenCount.objects.filter(
         course_id__exact=course_id,
-        module_type__exact="sequential",
-    ).values('module_state_key').annotate(count_sequential=Count('module_state_key'))
+        count__gt=0,
+    ).values('module_state_key', 'count')
 
     # Build set of "opened" data for each subsection that has "opened" data
     sequential_open_distrib = {}
     for row in db_query:
-        sequential_open_distrib[row['module_state_key']] = row['count_sequential']
+        sequential_open_distrib[row['module_state_key']] = row['count']
 
     return sequential_open_distrib
 
@@ -90,22 +98,23 @@ def get_problem_set_grade_distrib(course_id, problem_set):
       'grade_distrib' - array of tuples (`grade`,`count`) ordered by `grade`
     """
 
-    # Aggregate query on studentmodule table for grade data for set of problems in course
-    db_query = models.StudentModule.objects.filter(
+    # Grade counts for set of problems in course, kept up to date as students are graded
+    models.ModuleCountChange.apply(course_id)
+    db_query = models.ProblemGradeCount.objects.filter(
         course_id__exact=course_id,
-        grade__isnull=False,
-        module_type__exact="problem",
+        count__gt=0,
         module_state_key__in=problem_set,
     ).values(
         'module_state_key',
         'grade',
         'max_grade',
-    ).annotate(count_grade=Count('grade')).order_by('module_state_key', 'grade')
+        'count',
+    ).order_by('module_state_key', 'grade')
 
     prob_grade_distrib = {}
 
     # Loop through resultset building data for each problem
-    for row in db_query:
+    for row in _with_max_grades(db_query):
         if row['module_state_key'] not in prob_grade_distrib:
             prob_grade_distrib[row['module_state_key']] = {
                 'max_grade': 0,
@@ -113,7 +122,7 @@ def get_problem_set_grade_distrib(course_id, problem_set):
             }
 
         curr_grade_distrib = prob_grade_distrib[row['module_state_key']]
-        curr_grade_distrib['grade_distrib'].append((row['grade'], row['count_grade']))
+        curr_grade_distrib['grade_distrib'].append((row['grade'], row['count']))
 
         if curr_grade_distrib['max_grade'] < row['max_grade']:
             curr_grade_distrib['max_grade'] = row['max_grade']
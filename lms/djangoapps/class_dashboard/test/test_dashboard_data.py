@@ -4,12 +4,14 @@ Tests for class dashboard (Metrics tab in instructor dashboard)
 
 import json
 
+from django.core.management import call_command
 from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
 
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from courseware.tests.tests import TEST_DATA_MONGO_MODULESTORE
+from courseware import models
 from courseware.tests.factories import StudentModuleFactory
 from student.tests.factories import UserFactory, CourseEnrollmentFactory, AdminFactory
 from capa.tests.response_xml_factory import StringResponseXMLFactory
@@ -121,6 +123,59 @@ class TestGetProblemGradeDistribution(ModuleStoreTestCase):
                 sum_attempts += item[1]
             self.assertEquals(USER_COUNT, sum_attempts)
 
+    def test_counts_follow_student_modules(self):
+        problem_url = models.StudentModule.objects.filter(course_id=self.course.id, module_type='problem')[0].module_state_key
+        before = dict(get_problem_set_grade_distrib(self.course.id, [problem_url])[problem_url]['grade_distrib'])
+
+        # regrade a student, and have a new student open and answer the problem
+        module = models.StudentModule.objects.get(course_id=self.course.id, module_state_key=problem_url,
+                                                  student=self.users[-1])
+        module.grade = 0
+        module.max_grade = 0.5
+        module.save()
+        StudentModuleFactory.create(course_id=self.course.id, module_state_key=problem_url, grade=0, max_grade=0.5)
+        StudentModuleFactory.create(course_id=self.course.id, module_type='sequential', module_state_key=problem_url)
+
+        after = dict(get_problem_set_grade_distrib(self.course.id, [problem_url])[problem_url]['grade_distrib'])
+        sequential_open_distrib = get_sequential_open_distrib(self.course.id)
+        self.assertEquals(after[1], before[1] - 1)
+        self.assertEquals(after[0], before.get(0, 0) + 2)
+        self.assertEquals(USER_COUNT + 1, sequential_open_distrib[problem_url])
+
+        # rebuilding from the StudentModules gives the same counts
+        models.CourseModuleCounts.rebuild(self.course.id)
+        self.assertEquals(after, dict(get_problem_set_grade_distrib(self.course.id, [problem_url])[problem_url]['grade_distrib']))
+
+    def test_changes_are_applied_when_read(self):
+        problem_url = 'i4x://org/course/problem/no_max_grade'
+        counts = models.ProblemGradeCount.objects.filter(course_id=self.course.id, module_state_key=problem_url)
+        for _ in xrange(2):
+            StudentModuleFactory.create(course_id=self.course.id, module_state_key=problem_url, grade=1, max_grade=None)
+
+        # saving a StudentModule doesn't touch the shared count rows
+        self.assertFalse(counts.exists())
+        self.assertEquals(2, models.ModuleCountChange.objects.filter(module_state_key=problem_url).count())
+
+        prob_grade_distrib = get_problem_set_grade_distrib(self.course.id, [problem_url])
+        self.assertEquals({'max_grade': None, 'grade_distrib': [(1, 2)]}, prob_grade_distrib[problem_url])
+        self.assertEquals([2], [count.count for count in counts])
+        self.assertFalse(models.ModuleCountChange.objects.filter(course_id=self.course.id).exists())
+
+    def test_changes_are_applied_periodically(self):
+        problem_url = 'i4x://org/course/problem/no_max_grade'
+        StudentModuleFactory.create(course_id=self.course.id, module_state_key=problem_url, grade=1, max_grade=None)
+
+        call_command('apply_module_count_changes')
+        self.assertFalse(models.ModuleCountChange.objects.exists())
+        self.assertEquals(
+            [(1, models.ProblemGradeCount.NO_MAX_GRADE, 1)],
+            [
+                (count.grade, count.max_grade, count.count)
+                for count in models.ProblemGradeCount.objects.filter(course_id=self.course.id,
+                                                                     module_state_key=problem_url)
+            ]
+        )
+
     def test_get_d3_problem_grade_distrib(self):
 
         d3_data = get_d3_problem_grade_distrib(self.course.id)
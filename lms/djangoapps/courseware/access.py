@@ -16,6 +16,7 @@ from xblock.core import XBlock
 
 from student.models import CourseEnrollmentAllowed
 from external_auth.models import ExternalAuthMap
+from courseware.catalog import CourseSummary
 from courseware.masquerade import is_masquerading_as_student
 from django.utils.timezone import UTC
 from student.models import CourseEnrollment
@@ -68,7 +69,7 @@ def has_access(user, obj, action, course_context=None):
 
     # delegate the work to type-specific functions.
     # (start with more specific types, then get more general)
-    if isinstance(obj, CourseDescriptor):
+    if isinstance(obj, (CourseDescriptor, CourseSummary)):
         return _has_access_course_desc(user, obj, action)
 
     if isinstance(obj, ErrorDescriptor):
@@ -96,7 +97,7 @@ def has_access(user, obj, action, course_context=None):
 # ================ Implementation helpers ================================
 def _has_access_course_desc(user, course, action):
     """
-    Check if user has access to a course descriptor.
+    Check if user has access to a course descriptor (or the CourseSummary of one).
 
     Valid actions:
 
@@ -0,0 +1,75 @@
+"""
+A cached summary of the courses in the course catalog.
+
+The index and "find courses" pages only need a few fields of each course, but
+loading every CourseDescriptor on each request takes time proportional to the
+size of the catalog.  A CourseSummary keeps just those fields.  The summaries of
+all the courses are cached until a course or about item of any course changes
+(see xmodule.modulestore.django.course_listing_version), or for at most
+COURSE_CATALOG_CACHE_TIMEOUT seconds.
+"""
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test.client import RequestFactory
+from django.utils.translation import get_language
+
+from xmodule.course_module import CourseDescriptor
+from xmodule.modulestore.django import modulestore, course_listing_version
+
+
+class CourseSummary(object):
+    """
+    The parts of a CourseDescriptor which the catalog pages and their access
+    checks (has_access(user, summary, 'see_exists') and the like) use.
+    """
+    # CourseDescriptor attributes copied into the summary
+    FIELDS = (
+        'location', 'id', 'org', 'number',
+        'display_name_with_default', 'display_number_with_default', 'display_org_with_default',
+        'static_asset_path', 'course_image',
+        'start', 'start_date_is_still_default', 'start_date_text', 'days_early_for_beta',
+        'enrollment_start', 'enrollment_end', 'enrollment_domain', 'ispublic',
+        # these depend on the time, and so may be as old as the cached summary
+        'is_newish', 'sorting_score',
+    )
+    # about sections (see courseware.courses.get_course_about_section) which
+    # the course listing shows, rendered into the summary's attributes. The
+    # summaries are shared by every user, so they're rendered anonymously.
+    ABOUT_SECTIONS = ('title', 'short_description', 'university')
+
+    def __init__(self, course):
+        # courseware.courses imports this module
+        from courseware.courses import get_course_about_section
+
+        for name in self.FIELDS:
+            setattr(self, name, getattr(course, name))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = {}
+        for section_key in self.ABOUT_SECTIONS:
+            setattr(self, section_key, get_course_about_section(course, section_key, request))
+        self._class_tags = course._class_tags  # pylint: disable=protected-access
+        if hasattr(course, 'data_dir'):
+            self.data_dir = course.data_dir
+
+    def __repr__(self):
+        return "CourseSummary({!r})".format(self.id)
+
+
+def get_course_catalog():
+    """
+    Return a list of CourseSummaries of all the courses in the modulestore.
+    """
+    # start_date_text and the about sections are translated, so each language gets its own summaries
+    cache_key = u'courseware.catalog.{}.{}'.format(course_listing_version(), get_language())
+    timeout = settings.COURSE_CATALOG_CACHE_TIMEOUT
+    summaries = cache.get(cache_key) if timeout else None
+    if summaries is None:
+        summaries = [
+            CourseSummary(course) for course in modulestore().get_courses()
+            if isinstance(course, CourseDescriptor)
+        ]
+        if timeout:
+            cache.set(cache_key, summaries, timeout)
+    return summaries
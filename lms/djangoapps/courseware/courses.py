@@ -16,6 +16,7 @@ from xmodule.modulestore.exceptions import ItemNotFoundError, InvalidLocationErr
 from static_replace import replace_static_urls
 
 from courseware.access import has_access
+from courseware.catalog import get_course_catalog
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module
 import branding
@@ -130,10 +131,11 @@ def find_file(filesystem, dirs, filename):
     raise ResourceNotFoundError(u"Could not find {0}".format(filename))
 
 
-def get_course_about_section(course, section_key):
+def get_course_about_section(course, section_key, request=None):
     """
     This returns the snippet of html to be rendered on the course about page,
-    given the key for the section.
+    given the key for the section. It's rendered for the user of `request`,
+    which defaults to the current request.
 
     Valid keys:
     - overview
@@ -167,7 +169,8 @@ def get_course_about_section(course, section_key):
 
         try:
 
-            request = get_request_for_thread()
+            if request is None:
+                request = get_request_for_thread()
 
             loc = course.location.replace(category='about', name=section_key)
 
@@ -309,9 +312,11 @@ def get_courses_by_university(user, domain=None):
 
 def get_courses(user, domain=None):
     '''
-    Returns a list of courses available, sorted by course.number
+    Returns a list of courses available, sorted by course.number. The courses are
+    CourseSummaries (see courseware.catalog), which have the CourseDescriptor
+    attributes the catalog pages use.
     '''
-    courses = branding.get_visible_courses()
+    courses = branding.filter_visible_courses(get_course_catalog())
     courses = [c for c in courses if has_access(user, c, 'see_exists')]
 
     courses = sorted(courses, key=lambda course: course.number)
@@ -1,31 +1,203 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import islice
+import hashlib
 import json
 import random
 import logging
+import threading
 
 from contextlib import contextmanager
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import get_cache, InvalidCacheBackendError
 from django.db import transaction
+from django.http import Http404
 from django.test.client import RequestFactory
 
 from dogapi import dog_stats_api
 
 from courseware import courses
-from courseware.model_data import FieldDataCache
+from courseware.access import has_access
+from courseware.model_data import FieldDataCache, chunks
 from student.models import anonymous_id_for_user
 from submissions import api as sub_api
 from xmodule import graders
 from xmodule.graders import Score
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import modulestore, course_content_version
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
+from xblock.fields import Scope
 from .models import StudentModule
 from .module_render import get_module_for_descriptor
 
 log = logging.getLogger("edx.courseware")
 
+# Number of students graded together by iterate_grades_for. Each batch shares
+# one set of StudentModule queries, so this bounds the memory used per batch.
+GRADING_BATCH_SIZE = 100
+
+# Number of StudentModules read at a time by answer_distributions.
+ANSWER_DISTRIBUTION_CHUNK_SIZE = 1000
+
+# Max scores are keyed by problem content, so they never go stale; this only
+# bounds how long unused entries stay around.
+MAX_SCORES_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# How many problems' MaxScoresCache keys each process remembers
+MAX_SCORES_KEY_CACHE_SIZE = 10000
+
+# (course content version, problem location url) -> MaxScoresCache key, least recently used first
+_MAX_SCORES_KEYS = OrderedDict()
+_MAX_SCORES_KEYS_LOCK = threading.Lock()
+
+
+class MaxScoresCache(object):
+    """
+    A cache of the max scores of scorable problems, shared by every student
+    and process that grades the course.
+
+    Finding the max score of a problem the student hasn't attempted means
+    creating the whole XModule (for capa, parsing the XML and possibly running
+    its scripts). A problem's max score depends only on its published content
+    and settings, so entries are keyed by the problem's location and a hash of
+    those fields: publishing or importing a new version of a problem gives it
+    a new key, and old values are never read. Each process computes the hash
+    of a problem once per version of its course (see course_content_version).
+
+    Values are read in bulk with `fetch_from_remote`, and values computed
+    during grading are written back together with `push_to_remote`. Imports
+    fill in the values ahead of time with `fill_max_scores`.
+    """
+    def __init__(self):
+        self._keys = {}
+        self._course_versions = {}
+        self._max_scores = {}
+        self._max_scores_updates = {}
+
+    @staticmethod
+    def _remote_cache():
+        """
+        Return the django cache that max scores are stored in.
+        """
+        try:
+            return get_cache('course_max_scores')
+        except InvalidCacheBackendError:
+            return get_cache('default')
+
+    def _key(self, descriptor):
+        """
+        Return the remote cache key for the current version of `descriptor`.
+        """
+        location_url = descriptor.location.url()
+        if location_url not in self._keys:
+            process_key = (self._course_version(descriptor.location), location_url)
+            with _MAX_SCORES_KEYS_LOCK:
+                key = _MAX_SCORES_KEYS.pop(process_key, None)
+            if key is None:
+                version = json.dumps(
+                    [
+                        descriptor.get_explicitly_set_fields_by_scope(Scope.content),
+                        descriptor.get_explicitly_set_fields_by_scope(Scope.settings),
+                    ],
+                    sort_keys=True,
+                    default=unicode,
+                )
+                key = 'max_score.{}'.format(
+                    hashlib.md5(location_url.encode('utf-8') + version.encode('utf-8')).hexdigest()
+                )
+            with _MAX_SCORES_KEYS_LOCK:
+                _MAX_SCORES_KEYS[process_key] = key
+                if len(_MAX_SCORES_KEYS) > MAX_SCORES_KEY_CACHE_SIZE:
+                    _MAX_SCORES_KEYS.popitem(last=False)
+            self._keys[location_url] = key
+        return self._keys[location_url]
+
+    def _course_version(self, location):
+        """
+        Return the course_content_version of the course containing location,
+        looking it up once per course.
+        """
+        course = (location.org, location.course)
+        if course not in self._course_versions:
+            self._course_versions[course] = course_content_version(location)
+        return self._course_versions[course]
+
+    def fetch_from_remote(self, descriptors):
+        """
+        Load the cached max scores for all scorable `descriptors` in one round trip.
+        """
+        keys = [self._key(descriptor) for descriptor in descriptors if descriptor.has_score]
+        if keys:
+            self._max_scores.update(self._remote_cache().get_many(keys))
+
+    def get(self, descriptor):
+        """
+        Return the cached max score for `descriptor`, or None if it isn't known.
+        """
+        return self._max_scores.get(self._key(descriptor))
+
+    def set(self, descriptor, max_score):
+        """
+        Record the max score for `descriptor`, to be saved by `push_to_remote`.
+        """
+        key = self._key(descriptor)
+        if self._max_scores.get(key) != max_score:
+            self._max_scores[key] = max_score
+            self._max_scores_updates[key] = max_score
+
+    def push_to_remote(self):
+        """
+        Save the max scores that were computed since the last push.
+        """
+        if self._max_scores_updates:
+            self._remote_cache().set_many(self._max_scores_updates, MAX_SCORES_CACHE_TIMEOUT)
+            self._max_scores_updates = {}
+
+
+def fill_max_scores(course_id):
+    """
+    Compute and cache the max scores of the course's scorable problems that
+    aren't cached yet, so that grading the first students after an import
+    doesn't have to create every problem.
+
+    Problems are created as an anonymous user, which saves no student state.
+    Problems that aren't released yet, and problems that always recalculate
+    their grades, are skipped; the former are filled in when they're first
+    graded. Returns the number of max scores that were computed.
+    """
+    course = courses.get_course_by_id(course_id)
+    descriptors = [
+        descriptor for descriptor in course.grading_context['all_descriptors']
+        if descriptor.has_score and not descriptor.always_recalculate_grades
+    ]
+    max_scores_cache = MaxScoresCache()
+    max_scores_cache.fetch_from_remote(descriptors)
+
+    user = AnonymousUser()
+    request = RequestFactory().get('/')
+    request.user = user
+    request.session = {}
+    field_data_cache = FieldDataCache([], course_id, user)
+
+    filled = 0
+    for descriptor in descriptors:
+        if max_scores_cache.get(descriptor) is not None:
+            continue
+        try:
+            problem = get_module_for_descriptor(user, request, descriptor, field_data_cache, course_id)
+            max_score = problem.max_score() if problem is not None else None
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Cannot compute the max score of %s', descriptor.location.url())
+            continue
+        if max_score is not None:
+            max_scores_cache.set(descriptor, max_score)
+            filled += 1
+
+    max_scores_cache.push_to_remote()
+    return filled
+
 
 def yield_dynamic_descriptor_descendents(descriptor, module_creator):
     """
@@ -77,10 +249,17 @@ def answer_distributions(course_id):
     not be aware of problems that are not visible to the user being used to
     generate the report.
 
+    The records are read in chunks of ANSWER_DISTRIBUTION_CHUNK_SIZE, and only
+    the answers are kept, so memory use depends on the number of distinct
+    answers rather than the number of submissions. Problem names come from one
+    walk of the course descriptor tree (what a staff member sees, whatever
+    their A/B test groups); problems that aren't in the tree are looked up
+    individually.
+
     This method will try to use a read-replica database if one is available.
     """
     # dict: { module.module_state_key : (url_name, display_name) }
-    state_keys_to_problem_info = {}  # For caching, used by url_and_display_name
+    state_keys_to_problem_info = _problem_info_for_course(course_id)
 
     def url_and_display_name(module_state_key):
         """
@@ -109,14 +288,17 @@ def answer_distributions(course_id):
     # Iterate through all problems submitted for this course in no particular
     # order, and build up our answer_counts dict that we will eventually return
     answer_counts = defaultdict(lambda: defaultdict(int))
-    for module in StudentModule.all_submitted_problems_read_only(course_id):
+    submitted_problems = StudentModule.all_submitted_problems_read_only(course_id)
+    for module_id, module_state_key, student_id, state in _iterate_in_chunks(
+            submitted_problems.values_list('id', 'module_state_key', 'student_id', 'state'),
+            ANSWER_DISTRIBUTION_CHUNK_SIZE
+    ):
         try:
-            state_dict = json.loads(module.state) if module.state else {}
-            raw_answers = state_dict.get("student_answers", {})
+            raw_answers = _student_answers_from_state(state)
         except ValueError:
             log.error(
                 "Answer Distribution: Could not parse module state for " +
-                "StudentModule id={}, course={}".format(module.id, course_id)
+                "StudentModule id={}, course={}".format(module_id, course_id)
             )
             continue
 
@@ -130,7 +312,7 @@ def answer_distributions(course_id):
             answer = unicode(raw_answer)
 
             try:
-                url, display_name = url_and_display_name(module.module_state_key)
+                url, display_name = url_and_display_name(module_state_key)
             except ItemNotFoundError:
                 msg = "Answer Distribution: Item {} referenced in StudentModule {} " + \
                       "for user {} in course {} not found; " + \
@@ -138,7 +320,7 @@ def answer_distributions(course_id):
                       "was later deleted from the course. This answer will be " + \
                       "omitted from the answer distribution CSV."
                 log.warning(
-                    msg.format(module.module_state_key, module.id, module.student_id, course_id)
+                    msg.format(module_state_key, module_id, student_id, course_id)
                 )
                 continue
 
@@ -146,17 +328,116 @@ def answer_distributions(course_id):
 
     return answer_counts
 
+
+def _problem_info_for_course(course_id):
+    """
+    Return a dict mapping the location of every descriptor in the course tree
+    to its (url_name, display_name), found with a single walk of the tree.
+    Returns an empty dict if the course can't be loaded.
+    """
+    try:
+        course = courses.get_course_by_id(course_id, depth=None)
+    except Http404:
+        return {}
+
+    problem_info = {}
+    descriptors = [course]
+    while descriptors:
+        descriptor = descriptors.pop()
+        problem_info[descriptor.location.url()] = (descriptor.url_name, descriptor.display_name_with_default)
+        descriptors.extend(descriptor.get_children())
+    return problem_info
+
+
+def _iterate_in_chunks(queryset, chunk_size):
+    """
+    Yield the results of `queryset`, a values_list query whose first value is
+    the primary key, in primary key order, reading at most `chunk_size` of them
+    from the database at a time.
+    """
+    last_pk = None
+    while True:
+        chunk_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_queryset[:chunk_size])
+        for item in chunk:
+            yield item
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1][0]
+
+
+_STUDENT_ANSWERS_KEY = '"student_answers":'
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _student_answers_from_state(state):
+    """
+    Return the "student_answers" dict from a JSON serialized capa module state,
+    without decoding the rest of the state (which can be much bigger, e.g. the
+    correct map and input state). Raises ValueError if the state, or its
+    student_answers, isn't a valid JSON object.
+    """
+    if not state:
+        return {}
+
+    # JSON strings escape their quotes, so the key can only appear in the
+    # serialized state as a key. Capa only uses it as a key of the state
+    # itself; if it appears more than once, some nested object has one too,
+    # so fall back to decoding everything.
+    key_index = state.find(_STUDENT_ANSWERS_KEY)
+    if key_index != -1 and state.find(_STUDENT_ANSWERS_KEY, key_index + 1) == -1:
+        value_index = json.decoder.WHITESPACE.match(state, key_index + len(_STUDENT_ANSWERS_KEY)).end()
+        try:
+            raw_answers, _ = _JSON_DECODER.raw_decode(state, value_index)
+        except ValueError:
+            pass
+        else:
+            if isinstance(raw_answers, dict):
+                return raw_answers
+
+    state_dict = json.loads(state)
+    if not isinstance(state_dict, dict):
+        raise ValueError("Module state is not a JSON object")
+    student_answers = state_dict.get('student_answers', {})
+    if not isinstance(student_answers, dict):
+        raise ValueError("Module state's student_answers is not a JSON object")
+    return student_answers
+
+
+def _graded_section_descendents(course):
+    """
+    Return a dict mapping the location url of each graded section of `course`
+    to the list of its descendants, for the sections whose descendants are the
+    same for every student (i.e. none of them has dynamic children).
+    """
+    section_descendents = {}
+    for sections in course.grading_context['graded_sections'].itervalues():
+        for section in sections:
+            section_descriptor = section['section_descriptor']
+            descendents = list(yield_dynamic_descriptor_descendents(section_descriptor, lambda descriptor: None))
+            if not any(descriptor.has_dynamic_children() for descriptor in descendents):
+                section_descendents[section_descriptor.location.url()] = descendents
+    return section_descendents
+
+
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, prefetch_student_modules=False, student_modules=None,
+          max_scores_cache=None, section_descendents=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
     """
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        return _grade(
+            student, request, course, keep_raw_scores, prefetch_student_modules, student_modules, max_scores_cache,
+            section_descendents
+        )
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _grade(student, request, course, keep_raw_scores, prefetch_student_modules=False, student_modules=None,
+           max_scores_cache=None, section_descendents=None):
     """
     Unwrapped version of "grade"
 
@@ -174,12 +455,41 @@ def _grade(student, request, course, keep_raw_scores):
       make up the final grade. (For display)
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
+    - prefetch_student_modules : if True, all of the student's state for the
+      graded parts of the course is loaded up front into a single
+      FieldDataCache, which is then shared by the section checks, get_score
+      and module creation. This keeps the number of queries constant instead
+      of growing with the number of sections and problems.
+    - student_modules : optional dict of module_state_key -> StudentModule
+      already loaded for this student (see get_score). Modules are still
+      created one at a time, but only for problems that can't be scored from
+      these rows.
+    - max_scores_cache : optional MaxScoresCache that has already been
+      fetched for this course. If not given, one is created, fetched and
+      pushed for this call.
+    - section_descendents : optional dict from _graded_section_descendents,
+      so that the descendants of those sections needn't be walked again for
+      each student.
 
     More information on the format is in the docstring for CourseGrader.
     """
     grading_context = course.grading_context
     raw_scores = []
 
+    if prefetch_student_modules:
+        with manual_transaction():
+            course_field_data_cache = FieldDataCache(grading_context['all_descriptors'], course.id, student)
+        student_modules = course_field_data_cache.student_modules()
+    else:
+        course_field_data_cache = None
+
+    if max_scores_cache is None:
+        max_scores_cache = MaxScoresCache()
+        max_scores_cache.fetch_from_remote(grading_context['all_descriptors'])
+        push_max_scores = True
+    else:
+        push_max_scores = False
+
     # Dict of item_ids -> (earned, possible) point tuples. This *only* grabs
     # scores that were registered with the submissions API, which for the moment
     # means only openassessment (edx-ora2)
@@ -210,7 +520,12 @@ def _grade(student, request, course, keep_raw_scores):
                     for descriptor in section['xmoduledescriptors']
                 )
 
-            if not should_grade_section:
+            if not should_grade_section and student_modules is not None:
+                should_grade_section = any(
+                    descriptor.location.url() in student_modules
+                    for descriptor in section['xmoduledescriptors']
+                )
+            elif not should_grade_section:
                 with manual_transaction():
                     should_grade_section = StudentModule.objects.filter(
                         student=student,
@@ -228,14 +543,24 @@ def _grade(student, request, course, keep_raw_scores):
                     '''creates an XModule instance given a descriptor'''
                     # TODO: We need the request to pass into here. If we could forego that, our arguments
                     # would be simpler
-                    with manual_transaction():
-                        field_data_cache = FieldDataCache([descriptor], course.id, student)
+                    if course_field_data_cache is not None:
+                        field_data_cache = course_field_data_cache
+                    else:
+                        with manual_transaction():
+                            field_data_cache = FieldDataCache([descriptor], course.id, student)
                     return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
 
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
+                descendents = None
+                if section_descendents is not None:
+                    descendents = section_descendents.get(section_descriptor.location.url())
+                if descendents is None:
+                    descendents = yield_dynamic_descriptor_descendents(section_descriptor, create_module)
+
+                for module_descriptor in descendents:
 
                     (correct, total) = get_score(
-                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores
+                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores,
+                        student_modules=student_modules, max_scores_cache=max_scores_cache
                     )
                     if correct is None and total is None:
                         continue
@@ -268,6 +593,9 @@ def _grade(student, request, course, keep_raw_scores):
 
         totaled_scores[section_format] = format_scores
 
+    if push_max_scores:
+        max_scores_cache.push_to_remote()
+
     grade_summary = course.grader.grade(totaled_scores, generate_random_scores=settings.GENERATE_PROFILE_SCORES)
 
     # We round the grade here, to make sure that the grade is an whole percentage and
@@ -351,6 +679,9 @@ def _progress_summary(student, request, course):
             return None
 
     submissions_scores = sub_api.get_scores(course.id, anonymous_id_for_user(student, course.id))
+    student_modules = field_data_cache.student_modules()
+    max_scores_cache = MaxScoresCache()
+    max_scores_cache.fetch_from_remote(field_data_cache.descriptors)
 
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
@@ -375,7 +706,8 @@ def _progress_summary(student, request, course):
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
                     course_id = course.id
                     (correct, total) = get_score(
-                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores
+                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores,
+                        student_modules=student_modules, max_scores_cache=max_scores_cache
                     )
                     if correct is None and total is None:
                         continue
@@ -404,10 +736,13 @@ def _progress_summary(student, request, course):
             'sections': sections
         })
 
+    max_scores_cache.push_to_remote()
+
     return chapters
 
 
-def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None):
+def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None, student_modules=None,
+              max_scores_cache=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -421,6 +756,14 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
            Can return None if user doesn't have access, or if something else went wrong.
     scores_cache: A dict of location names to (earned, possible) point tuples.
            If an entry is found in this cache, it takes precedence.
+    student_modules: A dict of module_state_keys to the StudentModules that were
+           prefetched for this user and course. If given, it is used instead of
+           querying the database, and a missing entry means the user has no
+           StudentModule for the problem.
+    max_scores_cache: A MaxScoresCache. If given, it is used to look up the max
+           score of problems the user hasn't been graded on, instead of creating
+           the problem, and it is updated with any max score that has to be
+           computed.
     """
     scores_cache = scores_cache or {}
 
@@ -447,18 +790,30 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if student_modules is not None:
+        student_module = student_modules.get(location_url)
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+        except StudentModule.DoesNotExist:
+            student_module = None
+
+    cached_max_score = max_scores_cache.get(problem_descriptor) if max_scores_cache is not None else None
 
     if student_module is not None and student_module.max_grade is not None:
         correct = student_module.grade if student_module.grade is not None else 0
         total = student_module.max_grade
+    elif cached_max_score is not None:
+        # module_creator would return None for a problem this user can't load,
+        # so check that here rather than creating the problem.
+        if not has_access(user, problem_descriptor, 'load', course_id):
+            return (None, None)
+        correct = 0.0
+        total = cached_max_score
     else:
         # If the problem was not in the cache, or hasn't been graded yet,
         # we need to instantiate the problem.
@@ -475,6 +830,9 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         if total is None:
             return (None, None)
 
+        if max_scores_cache is not None:
+            max_scores_cache.set(problem_descriptor, total)
+
     # Now we re-weight the problem, if specified
     weight = problem_descriptor.weight
     if weight is not None:
@@ -500,6 +858,40 @@ def manual_transaction():
         transaction.commit()
 
 
+def _batches(iterable, batch_size):
+    """
+    Yields lists of at most batch_size items from iterable, without reading
+    the whole iterable into memory.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _student_modules_for_students(course_id, students, chunk_size=500):
+    """
+    Return a dict mapping each student's id to a dict of
+    module_state_key -> StudentModule, for all of those students' modules in
+    the course.
+
+    Only the columns that grading needs are loaded (the potentially large
+    `state` blob is deferred), and students are queried in chunks of
+    `chunk_size` to stay within database parameter limits.
+    """
+    student_modules = dict((student.id, {}) for student in students)
+    for student_ids in chunks(student_modules.keys(), chunk_size):
+        queryset = StudentModule.objects.filter(
+            course_id=course_id,
+            student__in=student_ids,
+        ).only('student', 'module_state_key', 'grade', 'max_grade')
+        for student_module in queryset:
+            student_modules[student_module.student_id][student_module.module_state_key] = student_module
+    return student_modules
+
+
 def iterate_grades_for(course_id, students):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
@@ -517,6 +909,18 @@ def iterate_grades_for(course_id, students):
     - grade_breakdown : A breakdown of the major components that
         make up the final grade. (For display)
     - raw_scores: contains scores for every graded module
+
+    Students are graded in batches of GRADING_BATCH_SIZE. The StudentModule
+    scores for a whole batch are loaded together, and the descendants of each
+    graded section are listed once for the run, so each student's section
+    scores are aggregated in memory from those rows. XModules are only created
+    for problems that always recalculate their grades, problems with no stored
+    or cached max score, and sections with dynamic children (whose problems
+    depend on the student).
+
+    Each student still goes through grade(), rather than a separate batch
+    grader, so that the gradesets are computed exactly as the progress page
+    and the instructor dashboard compute them.
     """
     course = courses.get_course_by_id(course_id)
 
@@ -525,25 +929,40 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
-        with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
-            try:
-                request.user = student
-                # Grading calls problem rendering, which calls masquerading,
-                # which checks session vars -- thus the empty session dict below.
-                # It's not pretty, but untangling that is currently beyond the
-                # scope of this feature.
-                request.session = {}
-                gradeset = grade(student, request, course)
-                yield student, gradeset, ""
-            except Exception as exc:  # pylint: disable=broad-except
-                # Keep marching on even if this student couldn't be graded for
-                # some reason, but log it for future reference.
-                log.exception(
-                    'Cannot grade student %s (%s) in course %s because of exception: %s',
-                    student.username,
-                    student.id,
-                    course_id,
-                    exc.message
-                )
-                yield student, {}, exc.message
+    # Max scores are shared by every student, so fetch them once for the run.
+    max_scores_cache = MaxScoresCache()
+    max_scores_cache.fetch_from_remote(course.grading_context['all_descriptors'])
+    section_descendents = _graded_section_descendents(course)
+
+    for batch in _batches(students, GRADING_BATCH_SIZE):
+        student_modules = _student_modules_for_students(course_id, batch)
+        for student in batch:
+            with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
+                try:
+                    request.user = student
+                    # Grading calls problem rendering, which calls masquerading,
+                    # which checks session vars -- thus the empty session dict below.
+                    # It's not pretty, but untangling that is currently beyond the
+                    # scope of this feature.
+                    request.session = {}
+                    gradeset = grade(
+                        student, request, course,
+                        student_modules=student_modules[student.id],
+                        max_scores_cache=max_scores_cache,
+                        section_descendents=section_descendents
+                    )
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Keep marching on even if this student couldn't be graded for
+                    # some reason, but log it for future reference.
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        course_id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
+
+        # Save any max scores that had to be computed for this batch
+        max_scores_cache.push_to_remote()
@@ -0,0 +1,30 @@
+"""
+Command to apply the pending changes to the grade and "opened" counts that the class dashboard shows.
+"""
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courseware.models import ModuleCountChange
+
+
+class Command(BaseCommand):
+    """
+    Apply the ModuleCountChanges recorded for the given courses (or for all
+    courses with pending changes, if none are given) to their
+    ProblemGradeCounts and SequentialOpenCounts.
+
+    The class dashboard applies a course's changes whenever it's viewed. Run
+    this periodically (e.g. from cron) so that the changes of courses whose
+    dashboard nobody views don't pile up.
+    """
+    help = dedent(__doc__).strip()
+    args = '[<course_id> ...]'
+
+    def handle(self, *args, **options):
+        course_ids = args or ModuleCountChange.objects.values_list('course_id', flat=True).distinct()
+        for course_id in course_ids:
+            with transaction.commit_on_success():
+                ModuleCountChange.apply(course_id)
+            self.stdout.write("Applied count changes for {}\n".format(course_id))
@@ -0,0 +1,73 @@
+"""
+Command to save snapshots of the XML courses for LMS processes to load at startup.
+"""
+from optparse import make_option
+from textwrap import dedent
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from path import path
+
+from xmodule.modulestore.django import create_modulestore_instance
+
+XML_MODULESTORE_ENGINE = 'xmodule.modulestore.xml.XMLModuleStore'
+
+
+def xml_modulestore_configs(stores):
+    """
+    Return the configurations of the XMLModuleStores among stores (a MODULESTORE
+    setting), including those inside mixed modulestores.
+    """
+    configs = []
+    for config in stores.itervalues():
+        if config['ENGINE'] == XML_MODULESTORE_ENGINE:
+            configs.append(config)
+        elif 'stores' in config.get('OPTIONS', {}):
+            configs.extend(xml_modulestore_configs(config['OPTIONS']['stores']))
+    return configs
+
+
+class Command(BaseCommand):
+    """
+    Parse the courses of each XMLModuleStore in settings.MODULESTORE which has a
+    snapshot_dir and save their snapshots there, so that the processes started
+    afterwards load the courses from the snapshots rather than parsing them.
+
+    Run this during a deploy, after the course data and the code are in place;
+    a course which has changed since its snapshot was saved is parsed as usual.
+    """
+    help = dedent(__doc__).strip()
+    args = '[<course_dir> ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--snapshot-dir',
+                    help='Save the snapshots here rather than in the configured snapshot_dir'),
+    )
+
+    def handle(self, *args, **options):
+        configs = xml_modulestore_configs(settings.MODULESTORE)
+        if not configs:
+            raise CommandError("There are no XMLModuleStores in settings.MODULESTORE")
+
+        for config in configs:
+            store_options = dict(config.get('OPTIONS', {}))
+            snapshot_dir = options.get('snapshot_dir') or store_options.get('snapshot_dir')
+            if not snapshot_dir:
+                self.stdout.write("Skipping the store for {}, which has no snapshot_dir\n".format(
+                    store_options.get('data_dir')
+                ))
+                continue
+            # parse the courses rather than loading the snapshots being replaced
+            store_options['snapshot_dir'] = None
+            if args:
+                store_options['course_dirs'] = args
+            store = create_modulestore_instance(config['ENGINE'], config.get('DOC_STORE_CONFIG', {}), store_options)
+            store.snapshot_dir = path(snapshot_dir)
+
+            for course_dir in sorted(store.courses):
+                if store.save_course_snapshot(course_dir):
+                    self.stdout.write("Saved a snapshot of {}\n".format(course_dir))
+                else:
+                    self.stdout.write("Couldn't snapshot {}\n".format(course_dir))
+            for course_dir in sorted(store.errored_courses):
+                self.stdout.write("Couldn't load {}\n".format(course_dir))
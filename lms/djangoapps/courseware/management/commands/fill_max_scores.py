@@ -0,0 +1,29 @@
+"""
+Command to cache the max scores of the problems in courses before they're graded.
+"""
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand
+
+from courseware.grades import fill_max_scores
+from xmodule.modulestore.django import modulestore
+
+
+class Command(BaseCommand):
+    """
+    Cache the max scores of the problems in the given courses (or in all
+    courses, if none are given), so that grading doesn't have to create the
+    problems a student hasn't attempted.
+
+    The LMS `import` command does this for the courses it imports. Run this
+    after importing or publishing a course from Studio, which can't create LMS
+    problems itself; otherwise the new max scores are cached when the problems
+    are first graded.
+    """
+    help = dedent(__doc__).strip()
+    args = '[<course_id> ...]'
+
+    def handle(self, *args, **options):
+        course_ids = args or [course.location.course_id for course in modulestore().get_courses()]
+        for course_id in course_ids:
+            self.stdout.write("Filled {} max scores for {}\n".format(fill_max_scores(course_id), course_id))
@@ -0,0 +1,31 @@
+"""
+Command to build the grade and "opened" counts that the class dashboard shows.
+"""
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courseware.models import CourseModuleCounts
+from xmodule.modulestore.django import modulestore
+
+
+class Command(BaseCommand):
+    """
+    Build the ProblemGradeCounts and SequentialOpenCounts of the given courses
+    (or of all courses, if none are given) from their StudentModules.
+
+    Run this once, after the counts are first deployed, so that they include
+    the StudentModules saved before then. From then on the counts are kept up
+    to date as StudentModules are saved, so it's only needed again if they
+    were changed some other way (e.g. directly in the database).
+    """
+    help = dedent(__doc__).strip()
+    args = '[<course_id> ...]'
+
+    def handle(self, *args, **options):
+        course_ids = args or [course.location.course_id for course in modulestore().get_courses()]
+        for course_id in course_ids:
+            with transaction.commit_on_success():
+                CourseModuleCounts.rebuild(course_id)
+            self.stdout.write("Rebuilt counts for {}\n".format(course_id))
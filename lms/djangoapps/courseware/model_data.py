@@ -3,7 +3,9 @@ Classes to provide the LMS runtime data storage to XBlocks
 """
 
 import json
-from collections import defaultdict
+import threading
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
 from itertools import chain
 from .models import (
     StudentModule,
@@ -13,12 +15,15 @@ from .models import (
 )
 import logging
 
+from django.conf import settings
 from django.db import DatabaseError
 from django.contrib.auth.models import User
 
 from xblock.runtime import KeyValueStore
 from xblock.exceptions import KeyValueMultiSaveError, InvalidScopeError
 from xblock.fields import Scope, UserScope
+from xmodule.modulestore import Location
+from xmodule.modulestore.django import course_content_version
 
 log = logging.getLogger(__name__)
 
@@ -38,12 +43,58 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+class FieldDataPrefetchPlan(object):
+    """
+    What a FieldDataCache needs to load for a set of descriptors: for each
+    scope, the names of the fields in that scope, and the ids of only those
+    descriptors which have fields in it (usage ids, or block types for
+    Scope.preferences).
+    """
+    def __init__(self, descriptors):
+        self.field_names = defaultdict(set)
+        self.block_ids = defaultdict(set)
+        for descriptor in descriptors:
+            for field in descriptor.fields.values():
+                self.field_names[field.scope].add(field.name)
+                if field.scope in (Scope.user_state, Scope.user_state_summary):
+                    self.block_ids[field.scope].add(str(descriptor.scope_ids.usage_id))
+                elif field.scope == Scope.preferences:
+                    self.block_ids[field.scope].add(descriptor.scope_ids.block_type)
+
+
+# Prefetch plans of descriptor subtrees, keyed by the course, the root of the
+# subtree, the depth and the version of the course's content
+_PREFETCH_PLANS = OrderedDict()
+_PREFETCH_PLANS_LOCK = threading.Lock()
+
+
+def _cached_prefetch_plan(plan_key):
+    """
+    Return the cached prefetch plan for plan_key, or None.
+    """
+    with _PREFETCH_PLANS_LOCK:
+        plan = _PREFETCH_PLANS.pop(plan_key, None)
+        if plan is not None:
+            _PREFETCH_PLANS[plan_key] = plan
+        return plan
+
+
+def _cache_prefetch_plan(plan_key, plan, size):
+    """
+    Remember plan for plan_key, keeping at most size plans.
+    """
+    with _PREFETCH_PLANS_LOCK:
+        _PREFETCH_PLANS[plan_key] = plan
+        while len(_PREFETCH_PLANS) > size:
+            _PREFETCH_PLANS.popitem(last=False)
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
     for a module and its decendants
     """
-    def __init__(self, descriptors, course_id, user, select_for_update=False):
+    def __init__(self, descriptors, course_id, user, select_for_update=False, prefetch_plan=None):
         '''
         Find any courseware.models objects that are needed by any descriptor
         in descriptors. Attempts to minimize the number of queries to the database.
@@ -51,25 +102,44 @@ class FieldDataCache(object):
         state will have a StudentModule.
 
         Arguments
-        descriptors: A list of XModuleDescriptors.
+        descriptors: A list of XModuleDescriptors, or a function returning one
+            (which is only called if the list is needed)
         course_id: The id of the current course
         user: The user for which to cache data
         select_for_update: True if rows should be locked until end of transaction
+        prefetch_plan: The FieldDataPrefetchPlan of descriptors, if already known
         '''
         self.cache = {}
-        self.descriptors = descriptors
+        self._descriptors = descriptors
         self.select_for_update = select_for_update
         self.course_id = course_id
         self.user = user
+        # The stored values of the field objects, by id, as of when they were loaded or last saved
+        self._saved_values = {}
+        # The field objects whose saves are deferred, by id, with the keys of their changed fields
+        self._dirty = OrderedDict()
+        self._writing_behind = False
 
         if user.is_authenticated():
-            for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
+            if prefetch_plan is None:
+                prefetch_plan = FieldDataPrefetchPlan(self.descriptors)
+            for scope, field_names in prefetch_plan.field_names.items():
+                for field_object in self._retrieve_fields(scope, field_names, prefetch_plan.block_ids[scope]):
                     self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+                    self._saved_values[id(field_object)] = _stored_value(field_object)
+
+    @property
+    def descriptors(self):
+        """
+        The descriptors whose data this cache holds
+        """
+        if callable(self._descriptors):
+            self._descriptors = self._descriptors()
+        return self._descriptors
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
-                                         descriptor_filter=lambda descriptor: True,
+                                         descriptor_filter=None,
                                          select_for_update=False):
         """
         course_id: the course in the context of which we want StudentModules.
@@ -78,8 +148,12 @@ class FieldDataCache(object):
         depth is the number of levels of descendent modules to load StudentModules for, in addition to
             the supplied descriptor. If depth is None, load all descendent StudentModules
         descriptor_filter is a function that accepts a descriptor and return wether the StudentModule
-            should be cached
+            should be cached (by default, all of them are)
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
+
+        Without a descriptor_filter, the FieldDataPrefetchPlan of the subtree is
+        kept (for each version of the course's content) so that later calls
+        needn't walk the tree unless they use the cache's descriptors.
         """
 
         def get_child_descriptors(descriptor, depth, descriptor_filter):
@@ -105,9 +179,23 @@ class FieldDataCache(object):
 
             return descriptors
 
-        descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
+        plan_cache_size = settings.FIELD_DATA_PREFETCH_PLAN_CACHE_SIZE
+        if descriptor_filter is not None or not plan_cache_size or not isinstance(descriptor.location, Location):
+            # only the old style modulestores announce changes to their courses
+            descriptors = get_child_descriptors(descriptor, depth, descriptor_filter or (lambda descriptor: True))
+            return FieldDataCache(descriptors, course_id, user, select_for_update)
+
+        walk = lambda: get_child_descriptors(descriptor, depth, lambda descriptor: True)
+        descriptors, plan = walk, None
+        if user.is_authenticated():
+            plan_key = (course_id, descriptor.location.url(), depth, course_content_version(descriptor.location))
+            plan = _cached_prefetch_plan(plan_key)
+            if plan is None:
+                descriptors = walk()
+                plan = FieldDataPrefetchPlan(descriptors)
+                _cache_prefetch_plan(plan_key, plan, plan_cache_size)
 
-        return FieldDataCache(descriptors, course_id, user, select_for_update)
+        return FieldDataCache(descriptors, course_id, user, select_for_update, prefetch_plan=plan)
 
     def _query(self, model_class, **kwargs):
         """
@@ -134,15 +222,17 @@ class FieldDataCache(object):
         )
         return res
 
-    def _retrieve_fields(self, scope, fields):
+    def _retrieve_fields(self, scope, field_names, block_ids):
         """
-        Queries the database for all of the fields in the specified scope
+        Queries the database for the fields named field_names in the specified
+        scope of the blocks in block_ids (the usage ids for Scope.user_state and
+        Scope.user_state_summary, or the block types for Scope.preferences)
         """
         if scope == Scope.user_state:
             return self._chunked_query(
                 StudentModule,
                 'module_state_key__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                block_ids,
                 course_id=self.course_id,
                 student=self.user.pk,
             )
@@ -150,36 +240,26 @@ class FieldDataCache(object):
             return self._chunked_query(
                 XModuleUserStateSummaryField,
                 'usage_id__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
-                field_name__in=set(field.name for field in fields),
+                block_ids,
+                field_name__in=field_names,
             )
         elif scope == Scope.preferences:
             return self._chunked_query(
                 XModuleStudentPrefsField,
                 'module_type__in',
-                set(descriptor.scope_ids.block_type for descriptor in self.descriptors),
+                block_ids,
                 student=self.user.pk,
-                field_name__in=set(field.name for field in fields),
+                field_name__in=field_names,
             )
         elif scope == Scope.user_info:
             return self._query(
                 XModuleStudentInfoField,
                 student=self.user.pk,
-                field_name__in=set(field.name for field in fields),
+                field_name__in=field_names,
             )
         else:
             return []
 
-    def _fields_to_cache(self):
-        """
-        Returns a map of scopes to fields in that scope that should be cached
-        """
-        scope_map = defaultdict(set)
-        for descriptor in self.descriptors:
-            for field in descriptor.fields.values():
-                scope_map[field.scope].add(field)
-        return scope_map
-
     def _cache_key_from_kvs_key(self, key):
         """
         Return the key used in the FieldDataCache for the specified KeyValueStore key
@@ -207,6 +287,17 @@ class FieldDataCache(object):
         elif scope == Scope.user_info:
             return (scope, field_object.field_name)
 
+    def student_modules(self):
+        """
+        Return a dict mapping module_state_key -> StudentModule for every
+        StudentModule currently held in this cache.
+        """
+        return dict(
+            (cache_key[1], field_object)
+            for cache_key, field_object in self.cache.iteritems()
+            if cache_key[0] == Scope.user_state
+        )
+
     def find(self, key):
         '''
         Look for a model data object using an DjangoKeyValueStore.Key object
@@ -261,8 +352,102 @@ class FieldDataCache(object):
 
         cache_key = self._cache_key_from_kvs_key(key)
         self.cache[cache_key] = field_object
+        self._saved_values[id(field_object)] = _stored_value(field_object)
         return field_object
 
+    def save_field_objects(self, field_objects):
+        """
+        Save the field objects in `field_objects`, a dict mapping each field
+        object to the list of KeyValueStore keys of the fields changed in it.
+        Field objects whose stored values are the same as when they were loaded
+        or last saved aren't written.
+
+        Inside `write_behind`, the field objects are only saved when it ends.
+
+        Raises KeyValueMultiSaveError, with the names of the fields which
+        were saved, if a save fails.
+        """
+        if self._writing_behind:
+            for field_object, keys in field_objects.items():
+                self._dirty.setdefault(id(field_object), (field_object, []))[1].extend(keys)
+        else:
+            self._save(OrderedDict(
+                (id(field_object), (field_object, list(keys)))
+                for field_object, keys in field_objects.items()
+            ))
+
+    def discard(self, field_object):
+        """
+        Forget any deferred save of `field_object` (because it's being deleted).
+        """
+        self._dirty.pop(id(field_object), None)
+
+    def flush(self):
+        """
+        Save the field objects whose saves were deferred by `write_behind`.
+
+        Raises KeyValueMultiSaveError, with the names of the fields which were
+        saved, if a save fails. The field objects which weren't saved stay
+        deferred, so a later flush will try them again.
+        """
+        self._save(self._dirty)
+
+    @contextmanager
+    def write_behind(self):
+        """
+        Defer saving field objects until the end of the block, so that each
+        changed field object is written once however many times it was
+        saved, and unchanged ones aren't written at all.
+
+        If the block raises an exception, the deferred saves are still made
+        (as they would have been without write_behind), but a failure to save
+        them is only logged, so that the block's exception is the one raised.
+        """
+        if self._writing_behind:
+            yield
+            return
+        self._writing_behind = True
+        try:
+            yield
+        except Exception:
+            self._writing_behind = False
+            try:
+                self.flush()
+            except KeyValueMultiSaveError:
+                # already logged by _save
+                pass
+            raise
+        self._writing_behind = False
+        self.flush()
+
+    def _save(self, pending):
+        """
+        Save the field objects in `pending`, an OrderedDict mapping the ids of
+        field objects to the field objects and the keys of their changed
+        fields. Each one is removed from `pending` once it has been saved.
+        """
+        saved_fields = []
+        for object_id, (field_object, keys) in pending.items():
+            stored_value = _stored_value(field_object)
+            if stored_value != self._saved_values.get(object_id):
+                try:
+                    field_object.save()
+                except DatabaseError:
+                    log.exception('Error saving fields %r', keys)
+                    raise KeyValueMultiSaveError(saved_fields)
+                self._saved_values[object_id] = stored_value
+            del pending[object_id]
+            saved_fields.extend(key.field_name for key in keys)
+
+
+def _stored_value(field_object):
+    """
+    The parts of a field object which DjangoKeyValueStore and the grade events change
+    """
+    if isinstance(field_object, StudentModule):
+        return (field_object.state, field_object.grade, field_object.max_grade)
+    return field_object.value
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -320,7 +505,6 @@ class DjangoKeyValueStore(KeyValueStore):
           xblock.KvsFieldData._key : value
 
         """
-        saved_fields = []
         # field_objects maps a field_object to a list of associated fields
         field_objects = dict()
         for field in kv_dict:
@@ -345,16 +529,7 @@ class DjangoKeyValueStore(KeyValueStore):
             # we don't have to worry about conflicts
                 field_object.value = json.dumps(kv_dict[field])
 
-        for field_object in field_objects:
-            try:
-                # Save the field object that we made above
-                field_object.save()
-                # If save is successful on this scope, add the saved fields to
-                # the list of successful saves
-                saved_fields.extend([field.field_name for field in field_objects[field_object]])
-            except DatabaseError:
-                log.exception('Error saving fields %r', field_objects[field_object])
-                raise KeyValueMultiSaveError(saved_fields)
+        self._field_data_cache.save_field_objects(field_objects)
 
     def delete(self, key):
         if key.scope not in self._allowed_scopes:
@@ -368,8 +543,9 @@ class DjangoKeyValueStore(KeyValueStore):
             state = json.loads(field_object.state)
             del state[key.field_name]
             field_object.state = json.dumps(state)
-            field_object.save()
+            self._field_data_cache.save_field_objects({field_object: [key]})
         else:
+            self._field_data_cache.discard(field_object)
             field_object.delete()
 
     def has(self, key):
@@ -12,10 +12,13 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
+from collections import defaultdict
+
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 
 
@@ -251,3 +254,192 @@ class OfflineComputedGradeLog(models.Model):
 
     def __unicode__(self):
         return "[OCGLog] %s: %s" % (self.course_id, self.created)
+
+
+class ProblemGradeCount(models.Model):
+    """
+    The number of StudentModules of a problem that have each grade (and
+    max_grade). These are the histograms the class dashboard shows, kept up to
+    date as StudentModules are saved so they needn't be computed from the whole
+    StudentModule table. See CourseModuleCounts.
+    """
+    # Stands for a max_grade of None, which can't be part of a unique key
+    NO_MAX_GRADE = -1.0
+
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    grade = models.FloatField()
+    max_grade = models.FloatField(default=NO_MAX_GRADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('course_id', 'module_state_key', 'grade', 'max_grade'),)
+
+
+class SequentialOpenCount(models.Model):
+    """
+    The number of StudentModules of a sequential, i.e. the number of students
+    who have opened it. Kept up to date like ProblemGradeCount.
+    """
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('course_id', 'module_state_key'),)
+
+
+class ModuleCountChange(models.Model):
+    """
+    A change to a ProblemGradeCount or SequentialOpenCount which hasn't been
+    applied yet. Every student of a course shares the count rows, so saving a
+    StudentModule just records its changes here; they're applied in bulk, by
+    `apply`, before the counts are read, and periodically by the
+    `apply_module_count_changes` management command.
+    """
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_type = models.CharField(max_length=32)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    grade = models.FloatField(null=True, blank=True)
+    max_grade = models.FloatField(default=ProblemGradeCount.NO_MAX_GRADE)
+    delta = models.IntegerField()
+
+    # The number of changes applied at a time
+    BATCH_SIZE = 1000
+
+    @classmethod
+    def record(cls, module, grade, delta):
+        """Record that the count of `module` (a StudentModule) with `grade`, a (grade, max_grade) pair, changes by `delta`."""
+        grade, max_grade = grade or (None, None)
+        cls.objects.create(
+            course_id=module.course_id,
+            module_type=module.module_type,
+            module_state_key=module.module_state_key,
+            grade=grade,
+            max_grade=ProblemGradeCount.NO_MAX_GRADE if max_grade is None else max_grade,
+            delta=delta,
+        )
+
+    @classmethod
+    def apply(cls, course_id):
+        """Apply the recorded changes of the course to its counts. Must be called in a transaction."""
+        while True:
+            # lock the changes, so that concurrent calls don't apply them twice
+            changes = list(
+                cls.objects.select_for_update().filter(course_id=course_id).order_by('id')[:cls.BATCH_SIZE]
+            )
+            if not changes:
+                return
+            deltas = defaultdict(int)
+            for change in changes:
+                deltas[(change.module_type, change.module_state_key, change.grade, change.max_grade)] += change.delta
+            for (module_type, module_state_key, grade, max_grade), delta in deltas.iteritems():
+                if not delta:
+                    continue
+                if module_type == 'sequential':
+                    _add_to_count(SequentialOpenCount, delta, course_id=course_id, module_state_key=module_state_key)
+                else:
+                    _add_to_count(ProblemGradeCount, delta, course_id=course_id, module_state_key=module_state_key,
+                                  grade=grade, max_grade=max_grade)
+            cls.objects.filter(id__in=[change.id for change in changes]).delete()
+
+
+def _add_to_count(model, delta, **key):
+    """Add `delta` to the count of the `model` row with the given key, creating it if need be."""
+    if model.objects.filter(**key).update(count=F('count') + delta):
+        return
+    savepoint = transaction.savepoint()
+    try:
+        model.objects.create(count=delta, **key)
+    except IntegrityError:
+        # created concurrently
+        transaction.savepoint_rollback(savepoint)
+        model.objects.filter(**key).update(count=F('count') + delta)
+    else:
+        transaction.savepoint_commit(savepoint)
+
+
+class CourseModuleCounts(models.Model):
+    """
+    Records that the ProblemGradeCounts and SequentialOpenCounts of a course
+    have been built from its StudentModules, by the `rebuild_module_counts`
+    management command. From then on, they're updated (through
+    ModuleCountChanges) as StudentModules are saved and deleted. Changes that
+    bypass the model (e.g. queryset updates) aren't counted, so the counts can
+    be rebuilt with the same command.
+    """
+    course_id = models.CharField(max_length=255, unique=True)
+    built = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def rebuild(cls, course_id):
+        """Replace the counts for the course with ones computed from its StudentModules."""
+        # the StudentModules already reflect the changes not yet applied
+        ModuleCountChange.objects.filter(course_id=course_id).delete()
+
+        ProblemGradeCount.objects.filter(course_id=course_id).delete()
+        ProblemGradeCount.objects.bulk_create([
+            ProblemGradeCount(
+                course_id=course_id,
+                module_state_key=row['module_state_key'],
+                grade=row['grade'],
+                max_grade=ProblemGradeCount.NO_MAX_GRADE if row['max_grade'] is None else row['max_grade'],
+                count=row['count'],
+            )
+            for row in StudentModule.objects.filter(
+                course_id=course_id,
+                grade__isnull=False,
+                module_type='problem',
+            ).values('module_state_key', 'grade', 'max_grade').annotate(count=Count('id'))
+        ])
+
+        SequentialOpenCount.objects.filter(course_id=course_id).delete()
+        SequentialOpenCount.objects.bulk_create([
+            SequentialOpenCount(
+                course_id=course_id,
+                module_state_key=row['module_state_key'],
+                count=row['count'],
+            )
+            for row in StudentModule.objects.filter(
+                course_id=course_id,
+                module_type='sequential',
+            ).values('module_state_key').annotate(count=Count('id'))
+        ])
+
+        counts, created = cls.objects.get_or_create(course_id=course_id)
+        if not created:
+            counts.save()
+
+
+@receiver(post_init, sender=StudentModule)
+def remember_counted_grade(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Remember the grade a StudentModule from the database is counted under."""
+    instance._counted_grade = (instance.grade, instance.max_grade) if instance.pk else None  # pylint: disable=protected-access
+
+
+@receiver(post_save, sender=StudentModule)
+def update_module_counts_on_save(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """Count a new StudentModule, or move a changed one to its new grade."""
+    if instance.module_type == 'sequential':
+        if created:
+            ModuleCountChange.record(instance, None, 1)
+    elif instance.module_type == 'problem':
+        old_grade = None if created else getattr(instance, '_counted_grade', None)
+        new_grade = (instance.grade, instance.max_grade)
+        if old_grade != new_grade:
+            if old_grade is not None and old_grade[0] is not None:
+                ModuleCountChange.record(instance, old_grade, -1)
+            if new_grade[0] is not None:
+                ModuleCountChange.record(instance, new_grade, 1)
+    instance._counted_grade = (instance.grade, instance.max_grade)  # pylint: disable=protected-access
+
+
+@receiver(post_delete, sender=StudentModule)
+def update_module_counts_on_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Stop counting a deleted StudentModule."""
+    if instance.module_type == 'sequential':
+        ModuleCountChange.record(instance, None, -1)
+    elif instance.module_type == 'problem':
+        counted_grade = getattr(instance, '_counted_grade', None)
+        if counted_grade is not None and counted_grade[0] is not None:
+            ModuleCountChange.record(instance, counted_grade, -1)
@@ -37,7 +37,7 @@ from xmodule.modulestore import Location
 from xmodule.modulestore.django import modulestore, ModuleI18nService
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
-from xmodule_modifiers import replace_course_urls, replace_jump_to_id_urls, replace_static_urls, add_staff_markup, wrap_xblock
+from xmodule_modifiers import rewrite_urls, add_staff_markup, wrap_xblock
 from xmodule.lti_module import LTIModule
 from xmodule.x_module import XModuleDescriptor
 
@@ -308,7 +308,7 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
         student_module.grade = event.get('value')
         student_module.max_grade = event.get('max_value')
         # Save all changes to the underlying KeyValueStore
-        student_module.save()
+        field_data_cache.save_field_objects({student_module: []})
 
         # Bin score into range and increment stats
         score_bucket = get_score_bucket(student_module.grade, student_module.max_grade)
@@ -346,28 +346,23 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
     # prefix is going to have to be specific to the module, not the directory
     # that the xml was loaded from
 
-    # Rewrite urls beginning in /static to point to course-specific content
-    block_wrappers.append(partial(
-        replace_static_urls,
-        getattr(descriptor, 'data_dir', None),
-        course_id=course_id,
-        static_asset_path=static_asset_path or descriptor.static_asset_path
-    ))
-
-    # Allow URLs of the form '/course/' refer to the root of multicourse directory
-    #   hierarchy of this course
-    block_wrappers.append(partial(replace_course_urls, course_id))
-
-    # this will rewrite intra-courseware links (/jump_to_id/<id>). This format
-    # is an improvement over the /course/... format for studio authored courses,
-    # because it is agnostic to course-hierarchy.
+    # Rewrite, in one pass:
+    #  - urls beginning in /static to point to course-specific content
+    #  - urls of the form '/course/' to refer to the root of multicourse directory
+    #    hierarchy of this course
+    #  - intra-courseware links (/jump_to_id/<id>). This format is an improvement
+    #    over the /course/... format for studio authored courses, because it is
+    #    agnostic to course-hierarchy.
     # NOTE: module_id is empty string here. The 'module_id' will get assigned in the replacement
     # function, we just need to specify something to get the reverse() to work.
-    block_wrappers.append(partial(
-        replace_jump_to_id_urls,
-        course_id,
-        reverse('jump_to_id', kwargs={'course_id': course_id, 'module_id': ''}),
-    ))
+    jump_to_id_base_url = reverse('jump_to_id', kwargs={'course_id': course_id, 'module_id': ''})
+    url_rewriter = static_replace.get_url_rewriter(
+        getattr(descriptor, 'data_dir', None),
+        course_id=course_id,
+        static_asset_path=static_asset_path or descriptor.static_asset_path,
+        jump_to_id_base_url=jump_to_id_base_url,
+    )
+    block_wrappers.append(partial(rewrite_urls, url_rewriter))
 
     if settings.FEATURES.get('DISPLAY_DEBUG_INFO_TO_STAFF'):
         if has_access(user, descriptor, 'staff', course_id):
@@ -401,12 +396,7 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
         # TODO (cpennington): This should be removed when all html from
         # a module is coming through get_html and is therefore covered
         # by the replace_static_urls code below
-        replace_urls=partial(
-            static_replace.replace_static_urls,
-            data_directory=getattr(descriptor, 'data_dir', None),
-            course_id=course_id,
-            static_asset_path=static_asset_path or descriptor.static_asset_path,
-        ),
+        replace_urls=url_rewriter.replace_static_urls,
         replace_course_urls=partial(
             static_replace.replace_course_urls,
             course_id=course_id
@@ -414,7 +404,7 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
         replace_jump_to_id_urls=partial(
             static_replace.replace_jump_to_id_urls,
             course_id=course_id,
-            jump_to_id_base_url=reverse('jump_to_id', kwargs={'course_id': course_id, 'module_id': ''})
+            jump_to_id_base_url=jump_to_id_base_url
         ),
         node_path=settings.NODE_PATH,
         publish=publish,
@@ -611,7 +601,8 @@ def _invoke_xblock_handler(request, course_id, usage_id, handler, suffix, user):
 
     req = django_to_webob_request(request)
     try:
-        with tracker.get_tracker().context(tracking_context_name, tracking_context):
+        # Handlers often save the same state several times, so write it once at the end
+        with tracker.get_tracker().context(tracking_context_name, tracking_context), field_data_cache.write_behind():
             resp = instance.handle(handler, req, suffix)
 
     except NoSuchHandlerError:
@@ -4,15 +4,18 @@ Tests for course access
 """
 import mock
 
+from django.core.cache import cache
 from django.http import Http404
 from django.test.utils import override_settings
 from student.tests.factories import UserFactory
-from xmodule.modulestore.django import get_default_store_name_for_current_request
+from xmodule.modulestore.django import get_default_store_name_for_current_request, modulestore
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory
 from xmodule.tests.xml import factories as xml
 from xmodule.tests.xml import XModuleXmlImportTest
 
+from courseware.access import has_access
+from courseware.catalog import get_course_catalog
 from courseware.courses import (
     get_course_by_id,
     get_course,
@@ -182,3 +185,38 @@ class CoursesRenderTest(ModuleStoreTestCase):
             )
             course_about = get_course_about_section(course, 'short_description')
             self.assertIn("this module is temporarily unavailable", course_about)
+
+
+@override_settings(MODULESTORE=TEST_DATA_MONGO_MODULESTORE, COURSE_CATALOG_CACHE_TIMEOUT=300)
+class CourseCatalogTestCase(ModuleStoreTestCase):
+    """Tests for the cached course catalog."""
+
+    def test_catalog_cached_until_course_changes(self):
+        cache.clear()
+        course = CourseFactory.create(org='edX', course='999', display_name='Robot Super Course')
+        self.assertEqual([summary.id for summary in get_course_catalog()], [course.id])
+
+        with mock.patch('courseware.catalog.modulestore') as mock_modulestore:
+            summaries = get_course_catalog()
+            self.assertFalse(mock_modulestore.called)
+        self.assertEqual(summaries[0].display_name_with_default, 'Robot Super Course')
+        self.assertEqual(summaries[0].title, 'Robot Super Course')
+        self.assertEqual(summaries[0].university, 'edX')
+        self.assertEqual(summaries[0].location, course.location)
+        self.assertTrue(has_access(UserFactory.create(), summaries[0], 'see_exists'))
+
+        course.display_name = 'Robot Course'
+        modulestore().update_item(course)
+        self.assertEqual(get_course_catalog()[0].display_name_with_default, 'Robot Course')
+
+    @mock.patch('courseware.courses.get_request_for_thread')
+    def test_catalog_rendered_anonymously(self, mock_get_request):
+        # the summaries are shared, so they mustn't depend on whose request built them
+        mock_get_request.return_value = get_request_for_user(UserFactory.create())
+        cache.clear()
+        CourseFactory.create(org='edX', course='998', display_name='Robot Course')
+        with mock.patch('courseware.courses.get_module', return_value=None) as mock_get_module:
+            get_course_catalog()
+        self.assertTrue(mock_get_module.called)
+        for args, _ in mock_get_module.call_args_list:
+            self.assertTrue(args[0].is_anonymous())
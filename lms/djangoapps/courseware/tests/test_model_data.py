@@ -17,7 +17,9 @@ from courseware.tests.factories import StudentPrefsFactory, StudentInfoFactory
 
 from xblock.fields import Scope, BlockScope, ScopeIds
 from xmodule.modulestore import Location
+from xmodule.modulestore.django import modulestore_update_signal
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.db import DatabaseError
 from xblock.core import KeyValueMultiSaveError
 
@@ -179,6 +181,32 @@ class TestStudentModuleStorage(OtherUserFailureTestMixin, TestCase):
                 self.kvs.set_many(kv_dict)
         self.assertEquals(len(exception_context.exception.saved_field_names), 0)
 
+    def test_set_unchanged_field(self):
+        "Test that setting a field to the value it has doesn't write the StudentModule"
+        with patch('django.db.models.Model.save', side_effect=DatabaseError) as mock_save:
+            self.kvs.set(user_state_key('a_field'), 'a_value')
+        self.assertFalse(mock_save.called)
+
+    def test_write_behind(self):
+        "Test that changes made inside write_behind are saved once, at its end"
+        with patch('django.db.models.Model.save') as mock_save:
+            with self.field_data_cache.write_behind():
+                self.kvs.set(user_state_key('a_field'), 'new_value')
+                self.kvs.set(user_state_key('b_field'), 'new_value')
+                self.assertFalse(mock_save.called)
+        self.assertEquals(1, mock_save.call_count)
+
+    def test_write_behind_failure(self):
+        "Test that changes which fail to save at the end of write_behind can be flushed later"
+        with patch('django.db.models.Model.save', side_effect=DatabaseError):
+            with self.assertRaises(KeyValueMultiSaveError):
+                with self.field_data_cache.write_behind():
+                    self.kvs.set(user_state_key('a_field'), 'new_value')
+        self.assertEquals('a_value', json.loads(StudentModule.objects.all()[0].state)['a_field'])
+
+        self.field_data_cache.flush()
+        self.assertEquals('new_value', json.loads(StudentModule.objects.all()[0].state)['a_field'])
+
 
 class TestMissingStudentModule(TestCase):
     def setUp(self):
@@ -216,6 +244,41 @@ class TestMissingStudentModule(TestCase):
         self.assertFalse(self.kvs.has(user_state_key('a_field')))
 
 
+class TestPrefetchPlan(TestCase):
+    """
+    Tests of which queries a FieldDataCache makes, and of the reuse of its prefetch plans
+    """
+    def setUp(self):
+        self.user = UserFactory.create(username='user')
+        self.descriptor = mock_descriptor([mock_field(Scope.user_state, 'a_field')])
+        self.descriptor.location = location('usage_id')
+        self.descriptor.get_children.return_value = []
+        self.descriptor.get_required_module_descriptors.return_value = []
+
+    def test_only_used_scopes_queried(self):
+        with self.assertNumQueries(1):
+            FieldDataCache([self.descriptor], course_id, self.user)
+
+    @override_settings(FIELD_DATA_PREFETCH_PLAN_CACHE_SIZE=10)
+    def test_plan_reused_until_course_changes(self):
+        # start from a version of the course no other test has planned for
+        modulestore_update_signal.send(None, modulestore=None, course_id=None, location=location('other_id'))
+        StudentModuleFactory.create(student=self.user)
+
+        for _ in range(2):
+            field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, self.user, self.descriptor)
+            self.assertEquals(1, len(field_data_cache.student_modules()))
+        self.assertEquals(1, self.descriptor.get_children.call_count)
+
+        # the descriptors are still there for those who ask
+        self.assertEquals([self.descriptor], field_data_cache.descriptors)
+        self.assertEquals(2, self.descriptor.get_children.call_count)
+
+        modulestore_update_signal.send(None, modulestore=None, course_id=None, location=location('other_id'))
+        FieldDataCache.cache_for_descriptor_descendents(course_id, self.user, self.descriptor)
+        self.assertEquals(3, self.descriptor.get_children.call_count)
+
+
 class StorageTestBase(object):
     """
     A base class for that gets subclassed when testing each of the scopes.
@@ -233,7 +233,7 @@ class TestCourseGrader(TestSubmittingProblems):
         store.update_item(self.course, '**replace_user**')
         self.refresh_course()
 
-    def get_grade_summary(self):
+    def get_grade_summary(self, prefetch_student_modules=False):
         """
         calls grades.grade for current user and course.
 
@@ -250,7 +250,10 @@ class TestCourseGrader(TestSubmittingProblems):
             reverse('progress', kwargs={'course_id': self.course.id})
         )
 
-        return grades.grade(self.student_user, fake_request, self.course)
+        return grades.grade(
+            self.student_user, fake_request, self.course,
+            prefetch_student_modules=prefetch_student_modules
+        )
 
     def get_progress_summary(self):
         """
@@ -478,6 +481,89 @@ class TestCourseGrader(TestSubmittingProblems):
         self.check_grade_percent(0.67)
         self.assertEqual(self.get_grade_summary()['grade'], 'B')
 
+    def test_prefetched_grade_matches(self):
+        """
+        Check that grading with prefetched student modules gives the same
+        result as grading with per-problem lookups.
+        """
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.submit_question_answer('p3', {'2_1': 'Incorrect'})
+        self.assertEqual(
+            self.get_grade_summary(prefetch_student_modules=True),
+            self.get_grade_summary()
+        )
+
+    def test_batched_grade_matches(self):
+        """
+        Check that iterate_grades_for, which loads scores for a batch of
+        students at once, gives the same gradeset as grading the student alone.
+        """
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.submit_question_answer('p3', {'2_1': 'Incorrect'})
+        [(student, gradeset, err_msg)] = list(grades.iterate_grades_for(self.course.id, [self.student_user]))
+        self.assertEqual(err_msg, "")
+        self.assertEqual(gradeset, self.get_grade_summary())
+
+    def test_batched_grade_walks_sections_once(self):
+        """
+        Check that iterate_grades_for lists the problems of each graded
+        section once for the run, rather than once per student.
+        """
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        course = modulestore().get_course(self.course.id)
+        num_sections = sum(len(sections) for sections in course.grading_context['graded_sections'].itervalues())
+        with patch('courseware.grades.yield_dynamic_descriptor_descendents',
+                   wraps=grades.yield_dynamic_descriptor_descendents) as mock_walk:
+            results = list(grades.iterate_grades_for(self.course.id, [self.student_user] * 3))
+        self.assertEqual([err_msg for _, _, err_msg in results], [""] * 3)
+        self.assertEqual(mock_walk.call_count, num_sections)
+        self.assertEqual(results[0][1], self.get_grade_summary())
+
+    def test_max_scores_cached(self):
+        """
+        Check that once the max scores of unattempted problems are known,
+        grading doesn't create those problems again.
+        """
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        grade_summary = self.get_grade_summary()
+        with patch('courseware.grades.get_module_for_descriptor') as mock_get_module:
+            self.assertEqual(self.get_grade_summary(), grade_summary)
+            self.assertFalse(mock_get_module.called)
+
+    def test_max_scores_filled_ahead(self):
+        """
+        Check that fill_max_scores caches the max scores of every problem, so
+        that grading doesn't create them.
+        """
+        self.basic_setup()
+        grades.MaxScoresCache._remote_cache().clear()  # pylint: disable=protected-access
+        self.assertEqual(grades.fill_max_scores(self.course.id), 3)
+        self.assertEqual(grades.fill_max_scores(self.course.id), 0)
+        self.assertFalse(StudentModule.objects.exists())
+        with patch('courseware.grades.get_module_for_descriptor') as mock_get_module:
+            grade_summary = self.get_grade_summary()
+            self.assertFalse(mock_get_module.called)
+        self.assertEqual(grade_summary, self.get_grade_summary())
+
+    def test_max_scores_keys_remembered(self):
+        """
+        Check that the max scores cache keys of problems aren't computed again
+        until their course changes.
+        """
+        self.basic_setup()
+        grade_summary = self.get_grade_summary()
+        with patch('courseware.grades.hashlib') as mock_hashlib:
+            self.assertEqual(self.get_grade_summary(), grade_summary)
+            self.assertFalse(mock_hashlib.md5.called)
+        with patch('courseware.grades.course_content_version', return_value='new version'):
+            with patch('courseware.grades.hashlib', wraps=grades.hashlib) as mock_hashlib:
+                self.assertEqual(self.get_grade_summary(), grade_summary)
+                self.assertTrue(mock_hashlib.md5.called)
+
     def test_submissions_api_overrides_scores(self):
         """
         Check that answering incorrectly is graded properly.
@@ -972,6 +1058,26 @@ class TestAnswerDistributions(TestSubmittingProblems):
             }
         )
 
+    @patch('courseware.grades.ANSWER_DISTRIBUTION_CHUNK_SIZE', 2)
+    def test_read_in_chunks(self):
+        # More submissions than fit in one chunk, so they're read in several
+        self.submit_question_answer('p1', {'2_1': u'Correct'})
+        self.submit_question_answer('p2', {'2_1': u'Incorrect'})
+        self.submit_question_answer('p3', {'2_1': u'Correct'})
+
+        with patch.object(modulestore(), 'get_items') as mock_get_items:
+            distributions = grades.answer_distributions(self.course.id)
+        # all the problems are found by walking the course
+        self.assertFalse(mock_get_items.called)
+        self.assertEqual(
+            distributions,
+            {
+                ('p1', 'p1', 'i4x-MITx-100-problem-p1_2_1'): {'Correct': 1},
+                ('p2', 'p2', 'i4x-MITx-100-problem-p2_2_1'): {'Incorrect': 1},
+                ('p3', 'p3', 'i4x-MITx-100-problem-p3_2_1'): {'Correct': 1},
+            }
+        )
+
     def test_other_data_types(self):
         # We'll submit one problem, and then muck with the student_answers
         # dict inside its state to try different data types (str, int, float,
@@ -1033,7 +1139,7 @@ class TestAnswerDistributions(TestSubmittingProblems):
         # Submit p2
         self.submit_question_answer('p2', {'2_1': u'Incorrect'})
 
-        for new_p1_state in ('{"student_answers": {}}', "invalid json!", None):
+        for new_p1_state in ('{"student_answers": {}}', "invalid json!", None, '[]', '{"student_answers": 1}'):
             prb1.state = new_p1_state
             prb1.save()
 
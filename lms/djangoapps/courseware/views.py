@@ -688,7 +688,7 @@ def _progress(request, course_id, student_id):
 
     courseware_summary = grades.progress_summary(student, request, course)
     studio_url = get_studio_url(course_id, 'settings/grading')
-    grade_summary = grades.grade(student, request, course)
+    grade_summary = grades.grade(student, request, course, prefetch_student_modules=True)
 
     if courseware_summary is None:
         #This means the student didn't have access to the course (which the instructor requested)
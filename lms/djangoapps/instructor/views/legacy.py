@@ -3,6 +3,7 @@ Instructor Views
 """
 from contextlib import contextmanager
 import csv
+import itertools
 import json
 import logging
 import os
@@ -256,7 +257,7 @@ def instructor_dashboard(request, course_id):
 
     elif 'Download CSV of answer distributions' in action:
         track.views.server_track(request, "dump-answer-dist-csv", {}, page="idashboard")
-        return return_csv('answer_dist_{0}.csv'.format(course_id), get_answers_distribution(request, course_id))
+        return stream_csv('answer_dist_{0}.csv'.format(course_id), get_answers_distribution(request, course_id))
 
     elif 'Dump description of graded assignments configuration' in action:
         # what is "graded assignments configuration"?
@@ -1617,7 +1618,7 @@ def get_answers_distribution(request, course_id):
 
     Return a dict with two keys:
     'header': a header row
-    'data': a list of rows
+    'data': a generator of rows
     """
     course = get_course_with_access(request.user, course_id, 'staff')
 
@@ -1626,14 +1627,35 @@ def get_answers_distribution(request, course_id):
     d = {}
     d['header'] = ['url_name', 'display name', 'answer id', 'answer', 'count']
 
-    d['data'] = [
+    d['data'] = (
         [url_name, display_name, answer_id, a, answers[a]]
         for (url_name, display_name, answer_id), answers in sorted(dist.items())
         for a in answers
-    ]
+    )
     return d
 
 
+def stream_csv(filename, datatable):
+    """
+    Outputs a CSV file from the contents of a datatable, like return_csv, but
+    writes each row as the response is sent, so `datatable['data']` can be a
+    generator and the rows never all need to be in memory.
+    """
+    def csv_lines():
+        """Yield the CSV file a line at a time."""
+        line = StringIO()
+        writer = csv.writer(line, dialect='excel', quotechar='"', quoting=csv.QUOTE_ALL)
+        for datarow in itertools.chain([datatable['header']], datatable['data']):
+            writer.writerow([s if isinstance(s, str) else unicode(s).encode('utf-8') for s in datarow])
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+
+    response = HttpResponse(csv_lines(), mimetype='text/csv')
+    response['Content-Disposition'] = 'attachment; filename={0}'.format(filename)
+    return response
+
+
 #-----------------------------------------------------------------------------
 
 
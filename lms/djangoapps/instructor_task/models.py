@@ -12,7 +12,6 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
-from cStringIO import StringIO
 from gzip import GzipFile
 from uuid import uuid4
 import csv
@@ -20,6 +19,7 @@ import json
 import hashlib
 import os
 import os.path
+import tempfile
 import urllib
 
 from boto.s3.connection import S3Connection
@@ -192,9 +192,8 @@ class InstructorTask(models.Model):
 class ReportStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for reports
-    download. Should probably refactor later to create a ReportFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    download. `store_rows()` accepts any iterable of rows, so a report can be
+    written from a generator without holding the whole dataset in memory.
     """
     @classmethod
     def from_config(cls):
@@ -297,18 +296,55 @@ class S3ReportStore(ReportStore):
     def store_rows(self, course_id, filename, rows):
         """
         Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        strings), write a gzip'd csv file to a temporary file, and then upload
+        that file. `rows` may be any iterable (e.g. a generator), so the rows
+        never all have to be in memory at once.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
+        with tempfile.TemporaryFile() as temp_file:
+            gzip_file = GzipFile(fileobj=temp_file, mode="wb")
+            csv.writer(gzip_file).writerows(rows)
+            gzip_file.close()
+
+            key = self.key_for(course_id, filename)
+            key.content_encoding = "gzip"
+            key.content_type = "text/csv"
+            key.set_contents_from_file(
+                temp_file,
+                headers={
+                    "Content-Encoding": "gzip",
+                    "Content-Type": "text/csv",
+                },
+                rewind=True
+            )
+
+    def rows_for(self, course_id, filename):
+        """
+        Return an iterator over the rows of a csv file stored by `store_rows()`,
+        or None if there is no such file. The file is downloaded to a temporary
+        file rather than into memory.
+        """
+        key = self.key_for(course_id, filename)
+        if not key.exists():
+            return None
+        return self._rows_from_key(key)
+
+    def _rows_from_key(self, key):
+        """
+        Yield the rows of the gzipped csv file in S3 `key`, through a temporary
+        file which is closed once the rows are exhausted (or the generator is).
+        """
+        with tempfile.TemporaryFile() as temp_file:
+            key.get_contents_to_file(temp_file)
+            temp_file.seek(0)
+            for row in csv.reader(GzipFile(fileobj=temp_file, mode="rb")):
+                yield row
 
-        self.store(course_id, filename, output_buffer)
+    def delete(self, course_id, filename):
+        """Delete the given file, if it exists."""
+        self.key_for(course_id, filename).delete()
 
     def links_for(self, course_id):
         """
@@ -320,6 +356,8 @@ class S3ReportStore(ReportStore):
             [
                 (key.key.split("/")[-1], key.generate_url(expires_in=300))
                 for key in self.bucket.list(prefix=course_dir.key)
+                # files in subdirectories (e.g. partial reports) aren't for download
+                if "/" not in key.key[len(course_dir.key):]
             ],
             reverse=True
         )
@@ -369,12 +407,7 @@ class LocalFSReportStore(ReportStore):
         assumed to be a StringIO objecd (or anything that can flush its contents
         to string using `.getvalue()`).
         """
-        full_path = self.path_to(course_id, filename)
-        directory = os.path.dirname(full_path)
-        if not os.path.exists(directory):
-            os.mkdir(directory)
-
-        with open(full_path, "wb") as f:
+        with self._open_for_writing(course_id, filename) as f:
             f.write(buff.getvalue())
 
     def store_rows(self, course_id, filename, rows):
@@ -382,9 +415,41 @@ class LocalFSReportStore(ReportStore):
         Given a course_id, filename, and rows (each row is an iterable of strings),
         write this data out.
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        with self._open_for_writing(course_id, filename) as f:
+            csv.writer(f).writerows(rows)
+
+    def _open_for_writing(self, course_id, filename):
+        """Open the file for the given course and filename, creating its directory if need be."""
+        full_path = self.path_to(course_id, filename)
+        directory = os.path.dirname(full_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        return open(full_path, "wb")
+
+    def rows_for(self, course_id, filename):
+        """
+        Return an iterator over the rows of a csv file stored by `store_rows()`,
+        or None if there is no such file.
+        """
+        full_path = self.path_to(course_id, filename)
+        if not os.path.exists(full_path):
+            return None
+        return self._rows_from_path(full_path)
+
+    def _rows_from_path(self, full_path):
+        """
+        Yield the rows of the csv file at `full_path`, closing it once the rows
+        are exhausted (or the generator is).
+        """
+        with open(full_path, "rb") as csv_file:
+            for row in csv.reader(csv_file):
+                yield row
+
+    def delete(self, course_id, filename):
+        """Delete the given file, if it exists."""
+        full_path = self.path_to(course_id, filename)
+        if os.path.exists(full_path):
+            os.remove(full_path)
 
     def links_for(self, course_id):
         """
@@ -401,6 +466,8 @@ class LocalFSReportStore(ReportStore):
             [
                 (filename, ("file://" + urllib.quote(os.path.join(course_dir, filename))))
                 for filename in os.listdir(course_dir)
+                # subdirectories (e.g. of partial reports) aren't for download
+                if os.path.isfile(os.path.join(course_dir, filename))
             ],
             reverse=True
         )
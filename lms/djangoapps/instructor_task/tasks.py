@@ -16,7 +16,9 @@ The task definition then calls the traversal function, passing in the three argu
 above, along with the id value for an InstructorTask object.  The InstructorTask
 object contains a 'task_input' row which is a JSON-encoded dict containing
 a problem URL and optionally a student.  These are used to set up the initial value
-of the query for traversing StudentModule objects.
+of the query for traversing StudentModule objects.  When there are many StudentModule
+objects to traverse, the traversal is split into subtasks, each of which visits a
+range of them (see update_problem_module_state_subtask).
 
 """
 from django.conf import settings
@@ -26,11 +28,13 @@ from functools import partial
 from instructor_task.tasks_helper import (
     run_main_task,
     BaseInstructorTask,
-    perform_module_state_update,
+    perform_delegate_module_state_update,
+    perform_module_state_update_subtask,
     rescore_problem_module_state,
     reset_attempts_module_state,
     delete_problem_module_state,
     push_grades_to_s3,
+    push_grade_rows_for_students,
 )
 from bulk_email.tasks import perform_delegate_email_batches
 
@@ -62,7 +66,8 @@ def rescore_problem(entry_id, xmodule_instance_args):
         """Filter that matches problems which are marked as being done"""
         return modules_to_update.filter(state__contains='"done": true')
 
-    visit_fcn = partial(perform_module_state_update, update_fcn, filter_fcn)
+    visit_fcn = partial(perform_delegate_module_state_update, update_problem_module_state_subtask,
+                        xmodule_instance_args, update_fcn, filter_fcn)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -84,7 +89,8 @@ def reset_problem_attempts(entry_id, xmodule_instance_args):
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('reset')
     update_fcn = partial(reset_attempts_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    visit_fcn = partial(perform_delegate_module_state_update, update_problem_module_state_subtask,
+                        xmodule_instance_args, update_fcn, None)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
@@ -106,10 +112,33 @@ def delete_problem_state(entry_id, xmodule_instance_args):
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('deleted')
     update_fcn = partial(delete_problem_module_state, xmodule_instance_args)
-    visit_fcn = partial(perform_module_state_update, update_fcn, None)
+    visit_fcn = partial(perform_delegate_module_state_update, update_problem_module_state_subtask,
+                        xmodule_instance_args, update_fcn, None)
     return run_main_task(entry_id, visit_fcn, action_name)
 
 
+# The update functions used by the module state update tasks, keyed by their action names,
+# so subtasks can be told which update to do.
+MODULE_STATE_UPDATE_FUNCTIONS = {
+    'rescored': rescore_problem_module_state,
+    'reset': reset_attempts_module_state,
+    'deleted': delete_problem_module_state,
+}
+
+
+@task  # pylint: disable=E1102
+def update_problem_module_state_subtask(entry_id, course_id, module_state_key, action_name,
+                                        xmodule_instance_args, module_ids, subtask_status_dict):
+    """
+    Does one chunk of the work of rescore_problem, reset_problem_attempts or delete_problem_state
+    (depending on `action_name`): updates the StudentModules with ids `module_ids`.
+    """
+    update_fcn = partial(MODULE_STATE_UPDATE_FUNCTIONS[action_name], xmodule_instance_args)
+    return perform_module_state_update_subtask(
+        update_fcn, entry_id, course_id, module_state_key, action_name, module_ids, subtask_status_dict
+    )
+
+
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
 def send_bulk_course_email(entry_id, _xmodule_instance_args):
     """Sends emails to recipients enrolled in a course.
@@ -137,5 +166,15 @@ def calculate_grades_csv(entry_id, xmodule_instance_args):
     Grade a course and push the results to an S3 bucket for download.
     """
     action_name = ugettext_noop('graded')
-    task_fn = partial(push_grades_to_s3, xmodule_instance_args)
+    task_fn = partial(push_grades_to_s3, calculate_grades_csv_subtask)
     return run_main_task(entry_id, task_fn, action_name)
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def calculate_grades_csv_subtask(entry_id, course_id, report_name, part_number, student_ids, subtask_status_dict):
+    """
+    Grade some of a course's students for the grade report started by `calculate_grades_csv`.
+    """
+    return push_grade_rows_for_students(
+        entry_id, course_id, report_name, part_number, student_ids, subtask_status_dict
+    )
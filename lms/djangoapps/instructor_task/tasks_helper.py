@@ -4,14 +4,18 @@ running state of a course.
 
 """
 import json
+import traceback
 import urllib
 from datetime import datetime
+from itertools import chain, count
 from time import time
 
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import transaction, reset_queries
 from dogapi import dog_stats_api
 from pytz import UTC
@@ -24,6 +28,12 @@ from courseware.models import StudentModule
 from courseware.model_data import FieldDataCache
 from courseware.module_render import get_module_for_descriptor_internal
 from instructor_task.models import ReportStore, InstructorTask, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    queue_subtasks_for_query,
+    check_subtask_is_valid,
+    update_subtask_status,
+)
 from student.models import CourseEnrollment
 
 # define different loggers for use within tasks and on client side
@@ -32,6 +42,9 @@ TASK_LOG = get_task_logger(__name__)
 # define value to use when no task_id is provided:
 UNKNOWN_TASK_ID = 'unknown-task_id'
 
+# define the most often (in seconds) that perform_module_state_update reports its progress
+PROGRESS_UPDATE_INTERVAL = 1
+
 # define values for update functions to use to return status to perform_module_state_update
 UPDATE_STATUS_SUCCEEDED = 'succeeded'
 UPDATE_STATUS_FAILED = 'failed'
@@ -207,6 +220,113 @@ def run_main_task(entry_id, task_fcn, action_name):
     return task_progress
 
 
+def perform_delegate_module_state_update(subtask_class, xmodule_instance_args, update_fcn, filter_fcn,
+                                         entry_id, course_id, task_input, action_name):
+    """
+    Performs generic update of StudentModule instances, like `perform_module_state_update`, but
+    splits the work into subtasks when there are many StudentModules to update.
+
+    If the update is for a single student, or there are at most `INSTRUCTOR_TASK_MODULES_PER_TASK`
+    StudentModules to update, the update is done by this task with `perform_module_state_update`.
+    Otherwise the StudentModules are split into chunks of consecutive ids, and a subtask of
+    `subtask_class` is queued for each chunk.  The subtasks are passed the `action_name` and
+    `xmodule_instance_args`, which they use to reconstruct the update function (see
+    `perform_module_state_update_subtask`), and they record their progress in the InstructorTask
+    `entry_id`, just like the subtasks that send bulk email.
+
+    Returns the task progress, as `perform_module_state_update` does.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    if len(entry.subtasks) > 0:
+        # This task was already run (e.g. celery lost its connection to the
+        # broker and requeued it), so its subtasks are already doing the work.
+        TASK_LOG.warning("Task %s has already defined subtasks: %s", entry.task_id, entry.subtasks)
+        return json.loads(entry.task_output)
+
+    module_state_key = task_input.get('problem_url')
+    # fail now if the problem doesn't exist, rather than in every subtask:
+    modulestore().get_instance(course_id, module_state_key)
+
+    modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
+    if task_input.get('student') is not None or \
+            modules_to_update.count() <= settings.INSTRUCTOR_TASK_MODULES_PER_TASK:
+        return perform_module_state_update(update_fcn, filter_fcn, entry_id, course_id, task_input, action_name)
+
+    def _create_module_state_subtask(module_list, initial_subtask_status):
+        """Creates a subtask to update the given StudentModules."""
+        return subtask_class.subtask(
+            (
+                entry_id,
+                course_id,
+                module_state_key,
+                action_name,
+                xmodule_instance_args,
+                [module['pk'] for module in module_list],
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+        )
+
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_module_state_subtask,
+        modules_to_update,
+        [],
+        settings.INSTRUCTOR_TASK_MODULES_PER_QUERY,
+        settings.INSTRUCTOR_TASK_MODULES_PER_TASK,
+    )
+
+
+def _get_modules_to_update(course_id, task_input, filter_fcn):
+    """
+    Returns the query for the StudentModules to update for the `problem_url` in `task_input`,
+    limited to the `student` in `task_input` if there is one, and filtered by `filter_fcn`
+    if it is not None.
+    """
+    module_state_key = task_input.get('problem_url')
+    student_identifier = task_input.get('student')
+
+    # find the module in question
+    modules_to_update = StudentModule.objects.filter(course_id=course_id,
+                                                     module_state_key=module_state_key)
+
+    # give the option of updating an individual student. If not specified,
+    # then updates all students who have responded to a problem so far
+    student = None
+    if student_identifier is not None:
+        # if an identifier is supplied, then look for the student,
+        # and let it throw an exception if none is found.
+        if "@" in student_identifier:
+            student = User.objects.get(email=student_identifier)
+        elif student_identifier is not None:
+            student = User.objects.get(username=student_identifier)
+
+    if student is not None:
+        modules_to_update = modules_to_update.filter(student_id=student.id)
+
+    if filter_fcn is not None:
+        modules_to_update = filter_fcn(modules_to_update)
+
+    return modules_to_update
+
+
+def _visit_student_modules(update_fcn, module_descriptor, modules_to_update, action_name):
+    """
+    Calls `update_fcn` on each of `modules_to_update` with the `module_descriptor`, which is
+    shared by all of them, and yields the update status returned for each.
+    """
+    # Each update needs the module's student, so fetch them along with the modules.
+    for module_to_update in modules_to_update.select_related('student').iterator():
+        # There is no try here:  if there's an error, we let it throw, and the task will
+        # be marked as FAILED, with a stack trace.
+        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=['action:{name}'.format(name=action_name)]):
+            update_status = update_fcn(module_descriptor, module_to_update)
+        if update_status not in (UPDATE_STATUS_SUCCEEDED, UPDATE_STATUS_FAILED, UPDATE_STATUS_SKIPPED):
+            raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
+        yield update_status
+
+
 def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, task_input, action_name):
     """
     Performs generic update by visiting StudentModule instances with the update_fcn provided.
@@ -225,6 +345,8 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     the update is successful; False indicates the update on the particular student module failed.
     A raised exception indicates a fatal condition -- that no other student modules should be considered.
 
+    Progress is reported to celery at most every PROGRESS_UPDATE_INTERVAL seconds.
+
     The return value is a dict containing the task's results, with the following keys:
 
           'attempted': number of attempts made
@@ -245,31 +367,11 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
     start_time = time()
 
     module_state_key = task_input.get('problem_url')
-    student_identifier = task_input.get('student')
 
     # find the problem descriptor:
     module_descriptor = modulestore().get_instance(course_id, module_state_key)
 
-    # find the module in question
-    modules_to_update = StudentModule.objects.filter(course_id=course_id,
-                                                     module_state_key=module_state_key)
-
-    # give the option of updating an individual student. If not specified,
-    # then updates all students who have responded to a problem so far
-    student = None
-    if student_identifier is not None:
-        # if an identifier is supplied, then look for the student,
-        # and let it throw an exception if none is found.
-        if "@" in student_identifier:
-            student = User.objects.get(email=student_identifier)
-        elif student_identifier is not None:
-            student = User.objects.get(username=student_identifier)
-
-    if student is not None:
-        modules_to_update = modules_to_update.filter(student_id=student.id)
-
-    if filter_fcn is not None:
-        modules_to_update = filter_fcn(modules_to_update)
+    modules_to_update = _get_modules_to_update(course_id, task_input, filter_fcn)
 
     # perform the main loop
     num_attempted = 0
@@ -293,28 +395,79 @@ def perform_module_state_update(update_fcn, filter_fcn, _entry_id, course_id, ta
 
     task_progress = get_task_progress()
     _get_current_task().update_state(state=PROGRESS, meta=task_progress)
-    for module_to_update in modules_to_update:
+    last_update_time = time()
+    for update_status in _visit_student_modules(update_fcn, module_descriptor, modules_to_update, action_name):
         num_attempted += 1
-        # There is no try here:  if there's an error, we let it throw, and the task will
-        # be marked as FAILED, with a stack trace.
-        with dog_stats_api.timer('instructor_tasks.module.time.step', tags=['action:{name}'.format(name=action_name)]):
-            update_status = update_fcn(module_descriptor, module_to_update)
-            if update_status == UPDATE_STATUS_SUCCEEDED:
-                # If the update_fcn returns true, then it performed some kind of work.
-                # Logging of failures is left to the update_fcn itself.
-                num_succeeded += 1
-            elif update_status == UPDATE_STATUS_FAILED:
-                num_failed += 1
-            elif update_status == UPDATE_STATUS_SKIPPED:
-                num_skipped += 1
-            else:
-                raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
+        if update_status == UPDATE_STATUS_SUCCEEDED:
+            # If the update_fcn returns true, then it performed some kind of work.
+            # Logging of failures is left to the update_fcn itself.
+            num_succeeded += 1
+        elif update_status == UPDATE_STATUS_FAILED:
+            num_failed += 1
+        else:
+            num_skipped += 1
 
-        # update task status:
-        task_progress = get_task_progress()
-        _get_current_task().update_state(state=PROGRESS, meta=task_progress)
+        # update task status, but not so often that it floods the result backend:
+        if time() - last_update_time >= PROGRESS_UPDATE_INTERVAL:
+            _get_current_task().update_state(state=PROGRESS, meta=get_task_progress())
+            last_update_time = time()
 
-    return task_progress
+    return get_task_progress()
+
+
+def perform_module_state_update_subtask(update_fcn, entry_id, course_id, module_state_key, action_name,
+                                        module_ids, subtask_status_dict):
+    """
+    Performs generic update of the StudentModules with ids `module_ids`, as a subtask of the
+    InstructorTask `entry_id` (see `perform_delegate_module_state_update`).
+
+    The problem descriptor for `module_state_key` is loaded once and shared by all the updates.
+    The counts of updated StudentModules are recorded in the InstructorTask when the subtask is
+    done.  An exception counts the StudentModules that hadn't been updated yet as failed, and
+    fails the subtask.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    TASK_LOG.info("Preparing to update %d modules of %s as subtask %s for instructor task %d",
+                  len(module_ids), module_state_key, current_task_id, entry_id)
+
+    # Fails this subtask immediately if it's unknown to the InstructorTask or already done.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    counts = {
+        UPDATE_STATUS_SUCCEEDED: 0,
+        UPDATE_STATUS_FAILED: 0,
+        UPDATE_STATUS_SKIPPED: 0,
+    }
+
+    def record_status(state):
+        """Record the counts in the InstructorTask."""
+        subtask_status.increment(
+            succeeded=counts[UPDATE_STATUS_SUCCEEDED],
+            failed=counts[UPDATE_STATUS_FAILED],
+            skipped=counts[UPDATE_STATUS_SKIPPED],
+            state=state,
+        )
+        # perform_module_state_update counts skipped modules as attempted too:
+        subtask_status.attempted += counts[UPDATE_STATUS_SKIPPED]
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+
+    try:
+        module_descriptor = modulestore().get_instance(course_id, module_state_key)
+        modules_to_update = StudentModule.objects.filter(id__in=module_ids).order_by('id')
+        for update_status in _visit_student_modules(update_fcn, module_descriptor, modules_to_update, action_name):
+            counts[update_status] += 1
+    except Exception:
+        # Unexpected exception. Since the remaining modules weren't updated,
+        # count them as failed, which keeps the counts consistent.
+        TASK_LOG.exception("Module state update subtask %s for instructor task %d: failed unexpectedly!",
+                           current_task_id, entry_id)
+        counts[UPDATE_STATUS_FAILED] = len(module_ids) - counts[UPDATE_STATUS_SUCCEEDED] - counts[UPDATE_STATUS_SKIPPED]
+        record_status(FAILURE)
+        raise
+
+    record_status(SUCCESS)
+    return subtask_status.to_dict()
 
 
 def _get_task_id_from_xmodule_args(xmodule_instance_args):
@@ -470,105 +623,241 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     return UPDATE_STATUS_SUCCEEDED
 
 
-def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
+GRADE_REPORT_ERROR_HEADER = ["id", "username", "error_msg"]
+
+# Lock expiration for merging the parts of a grade report; long enough for a big merge to finish.
+GRADE_REPORT_MERGE_LOCK_EXPIRE = 60 * 60
+
+
+def push_grades_to_s3(subtask_class, entry_id, course_id, _task_input, action_name):
     """
     For a given `course_id`, generate a grades CSV file for all students that
     are enrolled, and store using a `ReportStore`. Once created, the files can
     be accessed by instantiating another `ReportStore` (via
-    `ReportStore.from_config()`) and calling `link_for()` on it. Writes are
-    buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
-    that are visible in ReportStore will be complete ones.
-
-    As we start to add more CSV downloads, it will probably be worthwhile to
-    make a more general CSVDoc class instead of building out the rows like we
-    do here.
+    `ReportStore.from_config()`) and calling `link_for()` on it.
+
+    The students are split into chunks, and each chunk is graded by a subtask
+    of `subtask_class` (see `push_grade_rows_for_students`), so big courses are
+    graded in parallel and no worker ever has the whole report in memory. Each
+    subtask stores its rows as a partial report, and the last one to finish
+    merges the parts into the report. Partial reports are kept in a
+    subdirectory that `links_for()` doesn't list, so any files that are
+    visible in ReportStore will be complete ones.
     """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    if len(entry.subtasks) > 0:
+        # This task was already run (e.g. celery lost its connection to the
+        # broker and requeued it), so its subtasks are already working on it.
+        TASK_LOG.warning("Task %s has already defined subtasks: %s", entry.task_id, entry.subtasks)
+        return json.loads(entry.task_output)
+
     start_time = datetime.now(UTC)
-    status_interval = 100
+    report_name = u"{}_grade_report_{}".format(
+        urllib.quote(course_id.replace("/", "_")),
+        start_time.strftime("%Y-%m-%d-%H%M")
+    )
 
     enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
-    num_total = enrolled_students.count()
-    num_attempted = 0
-    num_succeeded = 0
-    num_failed = 0
-    curr_step = "Calculating Grades"
-
-    def update_task_progress():
-        """Return a dict containing info about current task"""
-        current_time = datetime.now(UTC)
-        progress = {
+    if not enrolled_students.exists():
+        # Nothing to hand out to subtasks, so just write the (empty) report.
+        ReportStore.from_config().store_rows(course_id, u"{}.csv".format(report_name), [])
+        return {
             'action_name': action_name,
-            'attempted': num_attempted,
-            'succeeded': num_succeeded,
-            'failed': num_failed,
-            'total': num_total,
-            'duration_ms': int((current_time - start_time).total_seconds() * 1000),
-            'step': curr_step,
+            'attempted': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'total': 0,
+            'duration_ms': int((datetime.now(UTC) - start_time).total_seconds() * 1000),
         }
-        _get_current_task().update_state(state=PROGRESS, meta=progress)
 
-        return progress
+    part_numbers = count()
+
+    def _create_grades_subtask(student_list, initial_subtask_status):
+        """Creates a subtask to grade the given students."""
+        return subtask_class.subtask(
+            (
+                entry_id,
+                course_id,
+                report_name,
+                next(part_numbers),
+                [student['pk'] for student in student_list],
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+        )
 
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
-    err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
-        # Periodically update task status (this is a cache write)
-        if num_attempted % status_interval == 0:
-            update_task_progress()
-        num_attempted += 1
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_grades_subtask,
+        enrolled_students,
+        [],
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_QUERY,
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK,
+    )
 
-        if gradeset:
-            # We were able to successfully grade this student for this course.
-            num_succeeded += 1
-            if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
-
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
-
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
-        else:
-            # An empty gradeset means we failed to grade a student.
-            num_failed += 1
-            err_rows.append([student.id, student.username, err_msg])
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    curr_step = "Uploading CSVs"
-    update_task_progress()
+def _grade_report_part_name(report_name, part_number, suffix=''):
+    """
+    Name of the file holding the rows for one part of a grade report. Parts are
+    numbered in the order of the students they cover.
+    """
+    return u"parts/{}/{:06d}{}.csv".format(report_name, part_number, suffix)
+
+
+def push_grade_rows_for_students(entry_id, course_id, report_name, part_number, student_ids, subtask_status_dict):
+    """
+    Grade the students with the given `student_ids` and store their rows of the
+    grade report `report_name` as part `part_number` of it. Any students who
+    couldn't be graded are stored in an error part.
+
+    The subtask's progress is recorded in the InstructorTask `entry_id`, and
+    whichever subtask finishes last merges the parts into the report.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    TASK_LOG.info("Preparing to grade %d students as subtask %s for instructor task %d",
+                  len(student_ids), current_task_id, entry_id)
 
-    # Generate parts of the file name
-    timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
-    course_id_prefix = urllib.quote(course_id.replace("/", "_"))
+    # Fails this subtask immediately if it's unknown to the InstructorTask or already done.
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
 
-    # Perform the actual upload
     report_store = ReportStore.from_config()
-    report_store.store_rows(
-        course_id,
-        u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
-    )
+    try:
+        students = User.objects.filter(id__in=student_ids).order_by('id')
+        header = None
+        rows = []
+        err_rows = []
+        for student, gradeset, err_msg in iterate_grades_for(course_id, students):
+            if gradeset:
+                # We were able to successfully grade this student for this course.
+                if not header:
+                    # Encode the header row in utf-8 encoding in case there are unicode characters
+                    header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
+                    rows.append(["id", "email", "username", "grade"] + header)
+
+                percents = {
+                    section['label']: section.get('percent', 0.0)
+                    for section in gradeset[u'section_breakdown']
+                    if 'label' in section
+                }
+
+                # Not everybody has the same gradable items. If the item is not
+                # found in the user's gradeset, just assume it's a 0. The aggregated
+                # grades for their sections and overall course will be calculated
+                # without regard for the item they didn't have access to, so it's
+                # possible for a student to have a 0.0 show up in their row but
+                # still have 100% for the course.
+                row_percents = [percents.get(label, 0.0) for label in header]
+                rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
+            else:
+                # An empty gradeset means we failed to grade a student.
+                err_rows.append([student.id, student.username, err_msg])
+
+        report_store.store_rows(course_id, _grade_report_part_name(report_name, part_number), rows)
+        if err_rows:
+            report_store.store_rows(course_id, _grade_report_part_name(report_name, part_number, '_err'), err_rows)
+    except Exception:
+        # Unexpected exception. Record all the students as failed, so the
+        # counts stay consistent and the report still gets merged.
+        TASK_LOG.exception("Grade report subtask %s for instructor task %d: failed unexpectedly!",
+                           current_task_id, entry_id)
+        report_store.store_rows(
+            course_id,
+            _grade_report_part_name(report_name, part_number, '_err'),
+            ([student_id, "", "Grade report subtask failed"] for student_id in student_ids)
+        )
+        subtask_status.increment(failed=len(student_ids), state=FAILURE)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        merge_grade_report_if_done(entry_id, course_id, report_name)
+        raise
+
+    num_succeeded = max(len(rows) - 1, 0)
+    subtask_status.increment(succeeded=num_succeeded, failed=len(err_rows), state=SUCCESS)
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    merge_grade_report_if_done(entry_id, course_id, report_name)
+    return subtask_status.to_dict()
+
+
+def merge_grade_report_if_done(entry_id, course_id, report_name):
+    """
+    If all the subtasks of InstructorTask `entry_id` are done, merge the parts
+    of grade report `report_name` into the report (and error report, if any
+    students couldn't be graded) and delete the parts. Rows are streamed from
+    part to report, so the report never has to fit in memory.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    subtask_dict = json.loads(entry.subtasks)
+    if subtask_dict['succeeded'] + subtask_dict['failed'] < subtask_dict['total']:
+        return
+
+    # Subtasks finishing at the same time may each see that they're all done.
+    lock_key = 'instructor_task.grade_report_merge.{}'.format(entry_id)
+    if not cache.add(lock_key, 'true', GRADE_REPORT_MERGE_LOCK_EXPIRE):
+        return
+
+    TASK_LOG.info("Merging %d parts of grade report %s for instructor task %d",
+                  subtask_dict['total'], report_name, entry_id)
+    try:
+        report_store = ReportStore.from_config()
+        part_names = [_grade_report_part_name(report_name, number) for number in range(subtask_dict['total'])]
+        err_part_names = [
+            _grade_report_part_name(report_name, number, '_err') for number in range(subtask_dict['total'])
+        ]
 
-    # If there are any error rows (don't count the header), write them out as well
-    if len(err_rows) > 1:
         report_store.store_rows(
             course_id,
-            u"{}_grade_report_{}_err.csv".format(course_id_prefix, timestamp_str),
-            err_rows
+            u"{}.csv".format(report_name),
+            _merged_grade_rows(report_store, course_id, part_names)
         )
 
-    # One last update before we close out...
-    return update_task_progress()
+        err_parts = [report_store.rows_for(course_id, name) for name in err_part_names]
+        err_parts = [part for part in err_parts if part is not None]
+        if err_parts:
+            report_store.store_rows(
+                course_id,
+                u"{}_err.csv".format(report_name),
+                chain([GRADE_REPORT_ERROR_HEADER], *err_parts)
+            )
+
+        for name in part_names + err_part_names:
+            report_store.delete(course_id, name)
+    except Exception as exception:
+        # The last subtask already marked the task as succeeded, but without
+        # its report it hasn't; and the merge can be tried again right away.
+        TASK_LOG.exception("Failed to merge grade report %s for instructor task %d", report_name, entry_id)
+        cache.delete(lock_key)
+        entry = InstructorTask.objects.get(pk=entry_id)
+        entry.task_state = FAILURE
+        entry.task_output = InstructorTask.create_output_for_failure(exception, traceback.format_exc())
+        entry.save_now()
+        raise
+
+
+def _merged_grade_rows(report_store, course_id, part_names):
+    """
+    Yield the rows of the given grade report parts, in order, under a single
+    header row. Each part starts with its own header; since that's taken from
+    the first student graded by its subtask, a part whose columns differ from
+    the report's has its rows rearranged to fit.
+    """
+    header = None
+    for name in part_names:
+        rows = report_store.rows_for(course_id, name)
+        if rows is None:
+            continue
+        part_header = next(rows, None)
+        if part_header is None:
+            # none of this part's students could be graded
+            continue
+        if header is None:
+            header = part_header
+            yield header
+        if part_header == header:
+            for row in rows:
+                yield row
+        else:
+            columns = [part_header.index(label) if label in part_header else None for label in header]
+            for row in rows:
+                yield [row[column] if column is not None else 0.0 for column in columns]
@@ -6,22 +6,27 @@ paths actually work.
 
 """
 import json
+import shutil
+import tempfile
 from uuid import uuid4
 
 from mock import Mock, MagicMock, patch
 
 from celery.states import SUCCESS, FAILURE
+from django.core.cache import cache
+from django.test.utils import override_settings
 
 from xmodule.modulestore.exceptions import ItemNotFoundError
 
 from courseware.models import StudentModule
 from courseware.tests.factories import StudentModuleFactory
+from student.models import CourseEnrollment
 from student.tests.factories import UserFactory, CourseEnrollmentFactory
 
-from instructor_task.models import InstructorTask
+from instructor_task.models import InstructorTask, ReportStore
 from instructor_task.tests.test_base import InstructorTaskModuleTestCase
 from instructor_task.tests.factories import InstructorTaskFactory
-from instructor_task.tasks import rescore_problem, reset_problem_attempts, delete_problem_state
+from instructor_task.tasks import rescore_problem, reset_problem_attempts, delete_problem_state, calculate_grades_csv
 from instructor_task.tasks_helper import UpdateProblemModuleStateError
 
 PROBLEM_URL_NAME = "test_urlname"
@@ -334,6 +339,33 @@ class TestResetAttemptsInstructorTask(TestInstructorTasks):
         # check that entries were reset
         self._assert_num_attempts(students, 0)
 
+    @override_settings(INSTRUCTOR_TASK_MODULES_PER_TASK=3, INSTRUCTOR_TASK_MODULES_PER_QUERY=5)
+    def test_reset_in_subtasks(self):
+        num_students = 10
+        students = self._create_students_with_state(num_students, json.dumps({'attempts': 3}))
+        # leave some students with nothing to reset
+        for student in students[:4]:
+            module = StudentModule.objects.get(course_id=self.course.id,
+                                               student=student,
+                                               module_state_key=self.problem_url)
+            module.state = json.dumps({'attempts': 0})
+            module.save()
+
+        task_entry = self._create_input_entry()
+        self._run_task_with_mock_celery(reset_problem_attempts, task_entry.id, task_entry.task_id)
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        self.assertEquals(entry.task_state, SUCCESS)
+        subtasks = json.loads(entry.subtasks)
+        self.assertEquals(subtasks['total'], 4)
+        self.assertEquals(subtasks['succeeded'], 4)
+        output = json.loads(entry.task_output)
+        self.assertEquals(output['action_name'], 'reset')
+        self.assertEquals(output['total'], num_students)
+        self.assertEquals(output['attempted'], num_students)
+        self.assertEquals(output['succeeded'], 6)
+        self.assertEquals(output['skipped'], 4)
+        self._assert_num_attempts(students, 0)
+
     def test_reset_with_zero_attempts(self):
         initial_attempts = 0
         input_state = json.dumps({'attempts': initial_attempts})
@@ -437,3 +469,81 @@ class TestDeleteStateInstructorTask(TestInstructorTasks):
                 StudentModule.objects.get(course_id=self.course.id,
                                           student=student,
                                           module_state_key=self.problem_url)
+
+
+class TestGradeReportInstructorTask(TestInstructorTasks):
+    """Tests calculate_grades_csv, which grades students in subtasks and merges their reports."""
+
+    def setUp(self):
+        super(TestGradeReportInstructorTask, self).setUp()
+        self.report_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.report_dir)
+
+    def _fake_grades(self, course_id, students):
+        """Grade each student by their id, failing to grade the ones with `fail` in their username."""
+        for student in students:
+            if 'fail' in student.username:
+                yield student, {}, 'bad grader'
+            else:
+                yield student, {
+                    'percent': student.id / 100.0,
+                    'section_breakdown': [{'label': u'HW 01', 'percent': 0.5}],
+                }, None
+
+    def _run_grade_report(self):
+        """Run the grade report task and return the entry and the report store it wrote to."""
+        task_entry = self._create_input_entry(use_problem_url=False)
+        grades_download = {'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.report_dir}
+        with override_settings(GRADES_DOWNLOAD=grades_download,
+                               GRADES_DOWNLOAD_STUDENTS_PER_TASK=2,
+                               GRADES_DOWNLOAD_STUDENTS_PER_QUERY=3):
+            with patch('instructor_task.tasks_helper.iterate_grades_for', side_effect=self._fake_grades):
+                self._run_task_with_mock_celery(calculate_grades_csv, task_entry.id, task_entry.task_id)
+            report_store = ReportStore.from_config()
+        return InstructorTask.objects.get(id=task_entry.id), report_store
+
+    def test_grade_report_merged_from_subtasks(self):
+        for username in ['a', 'b', 'fail1', 'c', 'd']:
+            CourseEnrollmentFactory.create(course_id=self.course.id, user=UserFactory.create(username=username))
+        students = sorted(CourseEnrollment.users_enrolled_in(self.course.id), key=lambda student: student.id)
+        graded = [student for student in students if 'fail' not in student.username]
+        failed = [student for student in students if 'fail' in student.username]
+
+        entry, report_store = self._run_grade_report()
+        self.assertEquals(entry.task_state, SUCCESS)
+        subtasks = json.loads(entry.subtasks)
+        self.assertGreater(subtasks['total'], 1)
+        self.assertEquals(subtasks['succeeded'], subtasks['total'])
+        output = json.loads(entry.task_output)
+        self.assertEquals(output['succeeded'], len(graded))
+        self.assertEquals(output['failed'], len(failed))
+
+        links = report_store.links_for(self.course.id)
+        self.assertEquals(len(links), 2)
+        report_name, err_report_name = sorted(filename for filename, _url in links)
+        rows = list(report_store.rows_for(self.course.id, report_name))
+        self.assertEquals(rows[0], ['id', 'email', 'username', 'grade', 'HW 01'])
+        self.assertEquals([row[0] for row in rows[1:]], [str(student.id) for student in graded])
+        err_rows = list(report_store.rows_for(self.course.id, err_report_name))
+        self.assertEquals(err_rows, [['id', 'username', 'error_msg'], [str(failed[0].id), 'fail1', 'bad grader']])
+
+    def test_grade_report_without_students(self):
+        CourseEnrollment.objects.filter(course_id=self.course.id).delete()
+        entry, report_store = self._run_grade_report()
+        self.assertEquals(entry.task_state, SUCCESS)
+        links = report_store.links_for(self.course.id)
+        self.assertEquals(len(links), 1)
+        self.assertEquals(list(report_store.rows_for(self.course.id, links[0][0])), [])
+
+    def test_grade_report_merge_failure(self):
+        CourseEnrollmentFactory.create(course_id=self.course.id, user=UserFactory.create(username='a'))
+        with patch('instructor_task.tasks_helper._merged_grade_rows', side_effect=ValueError('merge failed')):
+            try:
+                self._run_grade_report()
+            except ValueError:
+                pass
+        entry = InstructorTask.objects.latest('id')
+        self.assertEquals(entry.task_state, FAILURE)
+        self.assertEquals(json.loads(entry.task_output)['message'], 'merge failed')
+        # the merge can be tried again
+        self.assertIsNone(cache.get('instructor_task.grade_report_merge.{}'.format(entry.id)))
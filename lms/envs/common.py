@@ -352,6 +352,18 @@ BOOK_URL = 'https://mitxstatic.s3.amazonaws.com/book_images/'  # For AWS deploys
 # PRESS_URL = r''
 RSS_TIMEOUT = 600
 
+# How many seconds the per-course parts of a student's dashboard are cached for (0 to not cache them)
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# How many seconds a user's course and org roles are cached for (0 to only remember them for a request)
+ROLE_CACHE_TIMEOUT = 300
+
+# How many seconds the summaries of the courses in the catalog are cached for (0 to not cache them)
+COURSE_CATALOG_CACHE_TIMEOUT = 300
+
+# How many FieldDataCache prefetch plans each process keeps (0 to plan on every request)
+FIELD_DATA_PREFETCH_PLAN_CACHE_SIZE = 1000
+
 # Configuration option for when we want to grab server error pages
 STATIC_GRAB = False
 DEV_CONTENT = True
@@ -467,6 +479,12 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Keep this many warm sandbox processes per server process to run code in,
+    # rather than starting a sandbox per execution.  0 means don't.
+    'worker_pool_size': 0,
+    # How many executions each warm sandbox process handles before it's replaced.
+    'worker_pool_max_jobs': 100,
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -1274,9 +1292,19 @@ REGISTRATION_EXTRA_FIELDS = {
 CERT_NAME_SHORT = "Certificate"
 CERT_NAME_LONG = "Certificate of Achievement"
 
+################### Problem rescoring, resetting and deleting ###################
+# Tasks updating the state of more StudentModules than this split the work into
+# subtasks of this many StudentModules each
+INSTRUCTOR_TASK_MODULES_PER_TASK = 1000
+INSTRUCTOR_TASK_MODULES_PER_QUERY = 10000
+
 ###################### Grade Downloads ######################
 GRADES_DOWNLOAD_ROUTING_KEY = HIGH_MEM_QUEUE
 
+# Students are graded for a grade report by subtasks of this many students each
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = 500
+GRADES_DOWNLOAD_STUDENTS_PER_QUERY = 5000
+
 GRADES_DOWNLOAD = {
     'STORAGE_TYPE': 'localfs',
     'BUCKET': 'edx-grades',
@@ -174,6 +174,18 @@ CACHES = {
 
 }
 
+# Tests change what the dashboard shows between requests, so don't cache it
+DASHBOARD_CACHE_TIMEOUT = 0
+
+# The test databases reuse user ids, so don't let roles outlive a request
+ROLE_CACHE_TIMEOUT = 0
+
+# Tests drop courses without telling the modulestore, so don't cache the catalog
+COURSE_CATALOG_CACHE_TIMEOUT = 0
+
+# Nor the prefetch plans of their course trees
+FIELD_DATA_PREFETCH_PLAN_CACHE_SIZE = 0
+
 # Dummy secret key for dev
 SECRET_KEY = '85920908f28904ed733fe576320db18cabd7b6cd'
 
@@ -29,6 +29,9 @@ def run():
     if settings.FEATURES.get('ENABLE_THIRD_PARTY_AUTH', False):
         enable_third_party_auth()
 
+    if settings.CODE_JAIL.get('worker_pool_size'):
+        enable_code_jail_worker_pool()
+
 
 def enable_theme():
     """
@@ -111,3 +114,15 @@ def enable_third_party_auth():
 
     from third_party_auth import settings as auth_settings
     auth_settings.apply_settings(settings.THIRD_PARTY_AUTH, settings)
+
+
+def enable_code_jail_worker_pool():
+    """
+    Run capa's sandboxed python in a pool of warm sandbox processes. See
+    CODE_JAIL in lms/envs/common.py.
+    """
+    from capa.safe_exec import configure_worker_pool
+    configure_worker_pool(
+        settings.CODE_JAIL['worker_pool_size'],
+        settings.CODE_JAIL.get('worker_pool_max_jobs', 100),
+    )